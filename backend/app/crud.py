@@ -1,13 +1,31 @@
+import asyncio
+import time
+from array import array
 from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import and_, delete, desc, func, insert, or_, select
 from app import models
+from app.database import PLAN_STORAGE, PLAN_DTYPE, PLAN_COMPRESSION, TRAJECTORY_INSERT_CHUNK
+from app.utils.packing import PackedColumns, PlanColumns, pack_columns, unpack_columns
+from app.utils.cache import SimpleCache, columns_cache
+from app.utils.logging import logger
+from app.utils.metrics import observe_insert
+from app.utils import retention
 
 
-def create_trajectories(db: Session, plan_id: str, points: list[dict]):
+def create_trajectories(
+    db: Session,
+    plan_id: str,
+    points: list[dict],
+    chunk_size: int = TRAJECTORY_INSERT_CHUNK,
+):
     """
     Inserts coverage path points into the database safely and reliably.
-    Commits once after all inserts and ensures timestamps are consistent.
+    Uses Core executemany inserts in chunks of `chunk_size` rows inside one
+    transaction, with a single created_at per batch and no ORM objects.
+    Commits once after all inserts and reports the achieved rows/second.
     """
 
     if not isinstance(points, list) or len(points) == 0:
@@ -21,88 +39,699 @@ def create_trajectories(db: Session, plan_id: str, points: list[dict]):
     if not clean_points:
         return {"status": "error", "message": "No valid points to insert"}
 
-    objs = []
-    for p in clean_points:
-        ts = p.get("timestamp")
-        if isinstance(ts, (int, float)):
-            ts = datetime.fromtimestamp(ts)
-        elif not isinstance(ts, datetime):
-            ts = datetime.utcnow()
-
-        objs.append(
-            models.Trajectory(
-                plan_id=plan_id,
-                x=float(p["x"]),
-                y=float(p["y"]),
-                timestamp=ts,
-                created_at=datetime.utcnow()
-            )
-        )
+    chunk_size = max(1, int(chunk_size))
+    table = models.Trajectory.__table__
+    start = time.perf_counter()
 
     try:
-        db.add_all(objs)
-        db.flush()   # ✅ ensures objects are actually written before commit
+        for offset in range(0, len(clean_points), chunk_size):
+            created_at = datetime.utcnow()
+            rows = []
+            for p in clean_points[offset:offset + chunk_size]:
+                ts = p.get("timestamp")
+                if isinstance(ts, (int, float)):
+                    ts = datetime.fromtimestamp(ts)
+                elif not isinstance(ts, datetime):
+                    ts = created_at
+                rows.append({
+                    "plan_id": plan_id,
+                    "x": float(p["x"]),
+                    "y": float(p["y"]),
+                    "timestamp": ts,
+                    "created_at": created_at,
+                })
+            db.execute(insert(table), rows)
         db.commit()  # ✅ persist changes
-        db.refresh(objs[-1])  # ✅ refresh last one to ensure visibility
-        return {"status": "success", "count": len(objs)}
 
     except Exception as e:
         db.rollback()
         return {"status": "error", "message": str(e)}
 
+    elapsed = time.perf_counter() - start
+    rows_per_sec = round(len(clean_points) / elapsed) if elapsed > 0 else None
+    logger.info(f"💾 Inserted {len(clean_points)} trajectory rows for {plan_id} ({rows_per_sec} rows/s)")
+    if rows_per_sec:
+        observe_insert(len(clean_points), rows_per_sec)
+    return {"status": "success", "count": len(clean_points), "rows_per_sec": rows_per_sec}
 
-def get_recent_trajectories(db: Session, limit: int = 50):
+
+def create_plan(
+    db: Session,
+    plan_id: str,
+    points: list[dict],
+    dtype: str = PLAN_DTYPE,
+    compression: Optional[str] = PLAN_COMPRESSION,
+    request_hash: Optional[str] = None,
+    request: Optional[str] = None,
+):
     """
-    Returns the most recent trajectories with float timestamps.
+    Stores a whole plan as a single `plans` row with packed x/y/t arrays.
+    Returns the same status dict as create_trajectories.
+    """
+
+    if not isinstance(points, list) or len(points) == 0:
+        return {"status": "error", "message": "Invalid points data"}
+
+    clean_points = [
+        p for p in points
+        if isinstance(p, dict) and "x" in p and "y" in p
+    ]
+
+    if not clean_points:
+        return {"status": "error", "message": "No valid points to insert"}
+
+    now = datetime.utcnow()
+
+    def epoch(p):
+        ts = p.get("timestamp")
+        if isinstance(ts, datetime):
+            return ts.timestamp()
+        return float(ts) if isinstance(ts, (int, float)) else now.timestamp()
+
+    start = time.perf_counter()
+    try:
+        packed = pack_columns(
+            (float(p["x"]) for p in clean_points),
+            (float(p["y"]) for p in clean_points),
+            (epoch(p) for p in clean_points),
+            dtype=dtype,
+            compression=compression,
+        )
+        add_packed_plan(db, plan_id, packed, request_hash=request_hash, request=request, created_at=now)
+        db.commit()
+        _observe_packed_write(packed.count, start)
+        return {"status": "success", "count": packed.count}
+
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "message": str(e)}
+
+
+def _observe_packed_write(count: int, start: float):
+    """Records a committed packed write in the same metrics as row inserts."""
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        observe_insert(count, count / elapsed, storage="packed")
+
+
+def add_packed_plan(
+    db: Session,
+    plan_id: str,
+    packed: PackedColumns,
+    request_hash: Optional[str] = None,
+    request: Optional[str] = None,
+    created_at: Optional[datetime] = None,
+) -> models.Plan:
+    """Adds an already packed plan to the session; the caller commits."""
+    plan = models.Plan(
+        plan_id=plan_id,
+        request_hash=request_hash,
+        request=request,
+        storage="packed",
+        point_count=packed.count,
+        dtype=packed.dtype,
+        compression=packed.compression,
+        xs=packed.xs,
+        ys=packed.ys,
+        ts=packed.ts,
+        created_at=created_at or datetime.utcnow(),
+    )
+    db.add(plan)
+    return plan
+
+
+def save_plan(
+    db: Session,
+    plan_id: str,
+    points: list[dict],
+    request_hash: Optional[str] = None,
+    request: Optional[str] = None,
+):
+    """
+    Persists a plan using the configured PLAN_STORAGE layout.
+    Row storage still records the plan's metadata in `plans`.
+    If another worker stored a plan for the same request_hash first, the
+    new plan is discarded and the status carries the existing plan_id.
+    """
+    if PLAN_STORAGE != "rows":
+        status = create_plan(db, plan_id, points, request_hash=request_hash, request=request)
+    else:
+        status = create_trajectories(db, plan_id, points)
+        if status.get("status") == "success":
+            try:
+                db.add(models.Plan(
+                    plan_id=plan_id,
+                    request_hash=request_hash,
+                    request=request,
+                    storage="rows",
+                    point_count=status["count"],
+                ))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                db.execute(delete(models.Trajectory).where(models.Trajectory.plan_id == plan_id))
+                db.commit()
+                status = {"status": "error", "message": str(e)}
+
+    return _resolve_duplicate(db, status, request_hash)
+
+
+def save_packed_plan(
+    db: Session,
+    plan_id: str,
+    packed: PackedColumns,
+    request_hash: Optional[str] = None,
+    request: Optional[str] = None,
+):
     """
-    rows = (
-        db.query(models.Trajectory)
+    Like save_plan, for a plan already packed elsewhere (e.g. by a planner
+    worker process), so packed storage never expands it to point dicts.
+    """
+    if PLAN_STORAGE == "rows":
+        cols = unpack_columns(packed.xs, packed.ys, packed.ts, packed.dtype, packed.compression)
+        points = [
+            {"x": x, "y": y, "timestamp": t}
+            for x, y, t in zip(cols.xs, cols.ys, cols.ts)
+        ]
+        return save_plan(db, plan_id, points, request_hash=request_hash, request=request)
+
+    start = time.perf_counter()
+    try:
+        add_packed_plan(db, plan_id, packed, request_hash=request_hash, request=request)
+        db.commit()
+        _observe_packed_write(packed.count, start)
+        status = {"status": "success", "count": packed.count}
+    except Exception as e:
+        db.rollback()
+        status = {"status": "error", "message": str(e)}
+    return _resolve_duplicate(db, status, request_hash)
+
+
+def save_packed_plans(db: Session, plans: list[dict]) -> dict:
+    """
+    Stores several packed plans ({plan_id, packed, request_hash, request})
+    in a single transaction. With row storage, or if the batch collides
+    with plans another worker stored meanwhile, falls back to saving them
+    one by one. Returns {plan_id: status} keyed by the requested plan_id.
+    """
+    if PLAN_STORAGE != "rows":
+        start = time.perf_counter()
+        try:
+            for item in plans:
+                add_packed_plan(
+                    db, item["plan_id"], item["packed"],
+                    request_hash=item.get("request_hash"), request=item.get("request"),
+                )
+            db.commit()
+            _observe_packed_write(sum(item["packed"].count for item in plans), start)
+            return {
+                item["plan_id"]: {"status": "success", "count": item["packed"].count}
+                for item in plans
+            }
+        except Exception:
+            db.rollback()
+
+    return {
+        item["plan_id"]: save_packed_plan(
+            db, item["plan_id"], item["packed"],
+            request_hash=item.get("request_hash"), request=item.get("request"),
+        )
+        for item in plans
+    }
+
+
+def _resolve_duplicate(db: Session, status: dict, request_hash: Optional[str]) -> dict:
+    """Turns a failed insert into success when the same request is already stored."""
+    if status.get("status") != "success" and request_hash:
+        existing = find_plan_by_hash(db, request_hash)
+        if existing:
+            return {"status": "success", "count": existing.point_count, "plan_id": existing.plan_id}
+    return status
+
+
+def get_plan(db: Session, plan_id: str) -> Optional[models.Plan]:
+    """Returns the plans row (metadata and, for packed storage, blobs)."""
+    return _load_plan(db, plan_id)
+
+
+def set_plan_lineage(db: Session, plan_id: str, parent_plan_id: str, version: int):
+    """Records that plan_id was derived from parent_plan_id by replanning."""
+    plan = db.get(models.Plan, plan_id)
+    if plan is not None and plan.parent_plan_id is None:
+        plan.parent_plan_id = parent_plan_id
+        plan.version = version
+        db.commit()
+
+
+def find_plan_by_hash(db: Session, request_hash: str) -> Optional[models.Plan]:
+    """Returns the stored plan for a canonical request hash, if any."""
+    return db.execute(
+        select(models.Plan).where(models.Plan.request_hash == request_hash)
+    ).scalar_one_or_none()
+
+
+def find_plans_by_hashes(db: Session, request_hashes: list[str]) -> dict:
+    """Returns {request_hash: (plan_id, point_count)} for the stored ones."""
+    if not request_hashes:
+        return {}
+    rows = db.execute(
+        select(models.Plan.request_hash, models.Plan.plan_id, models.Plan.point_count)
+        .where(models.Plan.request_hash.in_(request_hashes))
+    )
+    return {h: (plan_id, count) for h, plan_id, count in rows}
+
+
+def _to_epoch(ts) -> float:
+    return ts.timestamp() if hasattr(ts, "timestamp") else float(ts)
+
+
+# ---------- Plan loading (access tracking, archive restore) ----------
+
+def _load_plan(db: Session, plan_id: str) -> Optional[models.Plan]:
+    """
+    The plans row for a read: records the access for retention and brings
+    an archived plan's blobs back first. None when the plan does not exist
+    or its archive cannot be read.
+    """
+    plan = db.get(models.Plan, plan_id)
+    if plan is None:
+        return None
+    retention.touch(plan_id)
+    if plan.archive_file and not retention.restore_plan(db, plan):
+        return None
+    return plan
+
+
+async def _load_plan_async(db: AsyncSession, plan_id: str) -> Optional[models.Plan]:
+    """Async version of _load_plan; the archive is read off the event loop."""
+    plan = await db.get(models.Plan, plan_id)
+    if plan is None:
+        return None
+    retention.touch(plan_id)
+    if plan.archive_file:
+        try:
+            packed = await asyncio.to_thread(retention.read_archive, plan.archive_file, plan.compression)
+            name = retention.apply_restore(plan, packed)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            await db.refresh(plan)
+            if retention.restored_elsewhere(plan):
+                return plan
+            logger.error(f"🔥 Could not restore archived plan {plan_id}: {e}")
+            return None
+        retention.finish_restore(plan_id, name)
+    return plan
+
+
+# ---------- Cache hits (checked against the plans table) ----------
+#
+# Retention may purge a plan in another worker process, whose in-memory
+# caches this one cannot invalidate. A cached value only counts as a hit
+# while the plan's row still exists; otherwise it is dropped as a miss.
+
+def _plan_exists_stmt(plan_id: str):
+    return select(models.Plan.plan_id).where(models.Plan.plan_id == plan_id)
+
+
+def plan_exists(db: Session, plan_id: str) -> bool:
+    return db.execute(_plan_exists_stmt(plan_id)).first() is not None
+
+
+async def plan_exists_async(db: AsyncSession, plan_id: str) -> bool:
+    return (await db.execute(_plan_exists_stmt(plan_id))).first() is not None
+
+
+async def cached_plan_value_async(db: AsyncSession, cache: SimpleCache, plan_id: str):
+    """cache[plan_id] if the plan still exists (recording the access), else None."""
+    value = cache.get(plan_id)
+    if value is None:
+        return None
+    if not await plan_exists_async(db, plan_id):
+        cache.delete(plan_id)
+        return None
+    retention.touch(plan_id)
+    return value
+
+
+# ---------- Read helpers shared by the sync and async readers ----------
+
+def _plan_rows_stmt(plan_id: str):
+    return (
+        select(models.Trajectory.x, models.Trajectory.y, models.Trajectory.timestamp)
+        .where(models.Trajectory.plan_id == plan_id)
+        .order_by(models.Trajectory.id.asc())
+    )
+
+
+def _unpack_plan(plan: models.Plan) -> PlanColumns:
+    return unpack_columns(plan.xs, plan.ys, plan.ts, plan.dtype, plan.compression)
+
+
+def _columns_from_rows(rows) -> Optional[PlanColumns]:
+    xs, ys, ts = array("d"), array("d"), array("d")
+    for x, y, t in rows:
+        xs.append(x)
+        ys.append(y)
+        ts.append(_to_epoch(t))
+    if not xs:
+        return None
+    return PlanColumns(xs, ys, ts)
+
+
+def _columns_to_points(cols: Optional[PlanColumns]) -> Optional[list[dict]]:
+    if cols is None:
+        return None
+    return [
+        {"x": x, "y": y, "timestamp": t}
+        for x, y, t in zip(cols.xs, cols.ys, cols.ts)
+    ]
+
+
+def _row_dict(row: models.Trajectory) -> dict:
+    return {
+        "id": row.id,
+        "x": float(row.x),
+        "y": float(row.y),
+        "timestamp": _to_epoch(row.timestamp),
+        "plan_id": row.plan_id,
+        "created_at": row.created_at,
+    }
+
+
+def _recent_rows_stmt(limit: int):
+    return (
+        select(models.Trajectory)
         .order_by(desc(models.Trajectory.created_at))
         .limit(limit)
-        .all()
     )
 
-    result = []
-    for row in rows:
-        ts = (
-            row.timestamp.timestamp()
-            if hasattr(row.timestamp, "timestamp")
-            else float(row.timestamp)
-        )
 
-        result.append({
-            "id": row.id,
-            "x": float(row.x),
-            "y": float(row.y),
-            "timestamp": ts,
-            "plan_id": row.plan_id,
-            "created_at": row.created_at,
-        })
-    return result
+def _recent_packed_plans_stmt(limit: int):
+    # Every plan has at least one point, so `limit` plans always suffice.
+    return (
+        select(models.Plan.plan_id, models.Plan.point_count)
+        .where(models.Plan.storage == "packed")
+        .order_by(desc(models.Plan.created_at))
+        .limit(limit)
+    )
+
+
+def _plans_to_fill(plan_counts, limit: int) -> list[str]:
+    """The newest packed plans whose points are needed to fill `limit`."""
+    needed = []
+    remaining = limit
+    for plan_id, point_count in plan_counts:
+        needed.append(plan_id)
+        remaining -= point_count
+        if remaining <= 0:
+            break
+    return needed
+
+
+def _merge_recent(rows: list[dict], limit: int) -> list[dict]:
+    rows.sort(key=lambda r: r["created_at"] or datetime.min, reverse=True)
+    return rows[:limit]
+
+
+def _plan_rows_dicts_stmt(plan_id: str):
+    return (
+        select(models.Trajectory)
+        .where(models.Trajectory.plan_id == plan_id)
+        .order_by(models.Trajectory.id.asc())
+    )
+
+
+def _packed_point_dicts(plan: models.Plan, reverse: bool = False, limit: Optional[int] = None):
+    """Expands a packed plan into the same dicts the row-based readers return."""
+    cols = _unpack_plan(plan)
+    indices = range(len(cols) - 1, -1, -1) if reverse else range(len(cols))
+    if limit is not None:
+        indices = indices[:limit]
+    return [
+        {
+            "id": i + 1,
+            "x": cols.xs[i],
+            "y": cols.ys[i],
+            "timestamp": cols.ts[i],
+            "plan_id": plan.plan_id,
+            "created_at": plan.created_at,
+        }
+        for i in indices
+    ]
+
+
+# ---------- Sync readers ----------
+
+def get_plan_columns(db: Session, plan_id: str) -> Optional[PlanColumns]:
+    """
+    Returns a plan's coordinates as float buffers (xs, ys, ts).
+    Packed plans are decoded straight from their blobs; row-stored plans are
+    read as plain column tuples, so no ORM object is built per point.
+    Returns None when the plan does not exist.
+    """
+    plan = _load_plan(db, plan_id)
+    if plan is not None and plan.storage == "packed":
+        return _unpack_plan(plan)
+    return _columns_from_rows(db.execute(_plan_rows_stmt(plan_id)))
+
+
+def get_plan_points(db: Session, plan_id: str) -> Optional[list[dict]]:
+    """Returns a plan as [{x, y, timestamp}] (the coverage response shape), or None."""
+    return _columns_to_points(get_plan_columns(db, plan_id))
+
+
+def get_recent_trajectories(db: Session, limit: int = 50):
+    """
+    Returns the most recent trajectories with float timestamps.
+    Merges row-stored points with points of the newest packed plans
+    (packed points report their 1-based index within the plan as id).
+    """
+    result = [_row_dict(row) for row in db.execute(_recent_rows_stmt(limit)).scalars()]
+
+    # Only load blobs of the newest packed plans needed to fill `limit`.
+    for plan_id in _plans_to_fill(db.execute(_recent_packed_plans_stmt(limit)).all(), limit):
+        plan = _load_plan(db, plan_id)
+        if plan is not None:
+            result.extend(_packed_point_dicts(plan, reverse=True, limit=limit))
+
+    return _merge_recent(result, limit)
 
 
 def get_trajectories_by_plan(db: Session, plan_id: str):
     """Fetch all trajectory points for a given plan."""
-    rows = (
-        db.query(models.Trajectory)
-        .filter(models.Trajectory.plan_id == plan_id)
+    plan = _load_plan(db, plan_id)
+    if plan is not None and plan.storage == "packed":
+        return _packed_point_dicts(plan)
+    return [_row_dict(row) for row in db.execute(_plan_rows_dicts_stmt(plan_id)).scalars()]
+
+
+# ---------- Async readers (AsyncSession, used on the event loop) ----------
+
+async def get_plan_columns_async(db: AsyncSession, plan_id: str) -> Optional[PlanColumns]:
+    """Async version of get_plan_columns."""
+    plan = await _load_plan_async(db, plan_id)
+    if plan is not None and plan.storage == "packed":
+        return _unpack_plan(plan)
+    return _columns_from_rows(await db.execute(_plan_rows_stmt(plan_id)))
+
+
+async def get_plan_points_async(db: AsyncSession, plan_id: str) -> Optional[list[dict]]:
+    """Async version of get_plan_points."""
+    return _columns_to_points(await get_plan_columns_async(db, plan_id))
+
+
+async def get_recent_trajectories_async(db: AsyncSession, limit: int = 50):
+    """Async version of get_recent_trajectories."""
+    result = [_row_dict(row) for row in (await db.execute(_recent_rows_stmt(limit))).scalars()]
+
+    plan_counts = (await db.execute(_recent_packed_plans_stmt(limit))).all()
+    for plan_id in _plans_to_fill(plan_counts, limit):
+        plan = await _load_plan_async(db, plan_id)
+        if plan is not None:
+            result.extend(_packed_point_dicts(plan, reverse=True, limit=limit))
+
+    return _merge_recent(result, limit)
+
+
+async def get_trajectories_by_plan_async(db: AsyncSession, plan_id: str):
+    """Async version of get_trajectories_by_plan."""
+    plan = await _load_plan_async(db, plan_id)
+    if plan is not None and plan.storage == "packed":
+        return _packed_point_dicts(plan)
+    result = await db.execute(_plan_rows_dicts_stmt(plan_id))
+    return [_row_dict(row) for row in result.scalars()]
+
+
+async def get_plan_async(db: AsyncSession, plan_id: str) -> Optional[models.Plan]:
+    """Returns the plans row (metadata and, for packed storage, blobs)."""
+    return await _load_plan_async(db, plan_id)
+
+
+async def get_plan_rows_page_async(
+    db: AsyncSession,
+    plan_id: str,
+    limit: int,
+    after_id: Optional[int] = None,
+    offset: Optional[int] = None,
+) -> list[tuple]:
+    """
+    One page of a row-stored plan as (id, x, y, epoch) tuples in point order.
+    Continue with after_id (keyset, cheap); use offset only to seek.
+    """
+    stmt = (
+        select(models.Trajectory.id, models.Trajectory.x, models.Trajectory.y, models.Trajectory.timestamp)
+        .where(models.Trajectory.plan_id == plan_id)
         .order_by(models.Trajectory.id.asc())
-        .all()
+        .limit(limit)
     )
+    if after_id is not None:
+        stmt = stmt.where(models.Trajectory.id > after_id)
+    elif offset:
+        stmt = stmt.offset(offset)
+    result = await db.execute(stmt)
+    return [(row_id, x, y, _to_epoch(t)) for row_id, x, y, t in result]
 
-    result = []
-    for row in rows:
-        ts = (
-            row.timestamp.timestamp()
-            if hasattr(row.timestamp, "timestamp")
-            else float(row.timestamp)
-        )
-        result.append({
-            "id": row.id,
-            "x": float(row.x),
-            "y": float(row.y),
-            "timestamp": ts,
-            "plan_id": row.plan_id,
-            "created_at": row.created_at,
-        })
-    return result
+
+async def count_plan_rows_async(db: AsyncSession, plan_id: str) -> int:
+    result = await db.execute(
+        select(func.count(models.Trajectory.id)).where(models.Trajectory.plan_id == plan_id)
+    )
+    return result.scalar_one()
+
+
+# ---------- Keyset pages (cursor pagination, async) ----------
+#
+# The recent feed lists plans newest first by (created_at, plan_id) and each
+# plan's points in path order by id (packed points use index + 1 as id), so a
+# page is always a bounded index range scan however large the tables grow.
+
+def _plan_meta_stmt():
+    return select(
+        models.Plan.plan_id,
+        models.Plan.created_at,
+        models.Plan.storage,
+        models.Plan.point_count,
+    )
+
+
+def _older_plans_stmt(position: Optional[tuple], limit: int):
+    """Plans strictly older than position=(created_at, plan_id), newest first."""
+    stmt = (
+        _plan_meta_stmt()
+        .order_by(desc(models.Plan.created_at), desc(models.Plan.plan_id))
+        .limit(limit)
+    )
+    if position is not None:
+        created_at, plan_id = position
+        stmt = stmt.where(or_(
+            models.Plan.created_at < created_at,
+            and_(models.Plan.created_at == created_at, models.Plan.plan_id < plan_id),
+        ))
+    return stmt
+
+
+# Decoded columns stay cached between pages; plans are immutable, so entries
+# only leave the cache to free memory (or when retention removes the plan).
+COLUMNS_CACHE_TTL = 300.0
+
+
+async def _packed_columns_async(db: AsyncSession, plan_id: str) -> Optional[PlanColumns]:
+    """A packed plan's decoded columns, from columns_cache after the first page."""
+    cols = await cached_plan_value_async(db, columns_cache, plan_id)
+    if cols is not None:
+        return cols
+    plan = await _load_plan_async(db, plan_id)
+    if plan is None:
+        return None
+    cols = _unpack_plan(plan)
+    columns_cache.set(plan_id, cols, ttl_seconds=COLUMNS_CACHE_TTL)
+    return cols
+
+
+def _packed_slice_dicts(plan_id: str, created_at, cols: PlanColumns, after_id: int, limit: int) -> list[dict]:
+    """Points after_id+1 .. after_id+limit of a packed plan's decoded columns."""
+    end = after_id + limit
+    return [
+        {
+            "id": after_id + i + 1,
+            "x": x,
+            "y": y,
+            "timestamp": t,
+            "plan_id": plan_id,
+            "created_at": created_at,
+        }
+        for i, (x, y, t) in enumerate(zip(cols.xs[after_id:end], cols.ys[after_id:end], cols.ts[after_id:end]))
+    ]
+
+
+async def _plan_slice_async(
+    db: AsyncSession, plan_id: str, storage: str, after_id: int, limit: int, created_at=None,
+) -> list[dict]:
+    if limit <= 0:
+        return []
+    if storage == "packed":
+        cols = await _packed_columns_async(db, plan_id)
+        return _packed_slice_dicts(plan_id, created_at, cols, after_id, limit) if cols is not None else []
+    stmt = _plan_rows_dicts_stmt(plan_id).where(models.Trajectory.id > after_id).limit(limit)
+    return [_row_dict(row) for row in (await db.execute(stmt)).scalars()]
+
+
+async def get_recent_page_async(db: AsyncSession, limit: int, cursor: Optional[tuple] = None) -> dict:
+    """
+    One page of the recent feed: {total, trajectories, next_cursor}.
+    cursor is (plan created_at, plan_id, last id) from the previous page;
+    next_cursor is None once the feed is exhausted. total (points over all
+    plans) is only counted for the first page and is None after it.
+    """
+    total = None
+    if cursor is None:
+        total = (await db.execute(select(func.coalesce(func.sum(models.Plan.point_count), 0)))).scalar_one()
+    items = []
+    last = None
+    position = None
+
+    if cursor is not None:
+        created_at, plan_id, after_id = cursor
+        meta = (await db.execute(_plan_meta_stmt().where(models.Plan.plan_id == plan_id))).first()
+        if meta is not None:
+            items += await _plan_slice_async(db, plan_id, meta.storage, after_id, limit, meta.created_at)
+            last = meta
+        position = (created_at, plan_id)
+
+    while len(items) < limit:
+        plans = (await db.execute(_older_plans_stmt(position, limit))).all()
+        for meta in plans:
+            items += await _plan_slice_async(db, meta.plan_id, meta.storage, 0, limit - len(items), meta.created_at)
+            last = meta
+            if len(items) >= limit:
+                break
+        if len(plans) < limit or len(items) >= limit:
+            break
+        position = (last.created_at, last.plan_id)
+
+    next_cursor = None
+    if len(items) >= limit:
+        next_cursor = (last.created_at, last.plan_id, items[-1]["id"])
+    return {"total": total, "trajectories": items, "next_cursor": next_cursor}
+
+
+async def get_plan_page_async(db: AsyncSession, plan_id: str, limit: int, after_id: int = 0) -> Optional[dict]:
+    """
+    One page of a plan's points after id `after_id`: {total, trajectories,
+    next_cursor} with next_cursor the last id returned, or None when the
+    plan does not exist.
+    """
+    meta = (await db.execute(_plan_meta_stmt().where(models.Plan.plan_id == plan_id))).first()
+    if meta is not None:
+        storage, total, created_at = meta.storage, meta.point_count, meta.created_at
+    else:
+        storage, total, created_at = "rows", await count_plan_rows_async(db, plan_id), None
+        if not total:
+            return None
+
+    items = await _plan_slice_async(db, plan_id, storage, after_id, limit, created_at)
+    next_cursor = None
+    if len(items) >= limit and not (storage == "packed" and items[-1]["id"] >= total):
+        next_cursor = items[-1]["id"]
+    return {"total": total, "trajectories": items, "next_cursor": next_cursor}
@@ -1,9 +1,12 @@
 # backend/app/database.py
 
 import os
-from sqlalchemy import create_engine, text
+from threading import Lock
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 # ============================================================
 # 1️⃣ Database Path Configuration
@@ -19,54 +22,171 @@ DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_SQLITE_PATH}")
 # ============================================================
 # 2️⃣ SQLite Connection Settings + Pool Configuration
 # ============================================================
+# Engines are created on first use (get_engine / get_async_engine), so
+# importing this module opens no connection and touches no file.
 connect_args = {"check_same_thread": False, "timeout": 30} if DATABASE_URL.startswith("sqlite") else {}
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args=connect_args,
-    poolclass=QueuePool,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    pool_pre_ping=True,
-    echo=False,
-    future=True
-)
+_engine_lock = Lock()
+_engine = None
+_async_engine = None
+
+
+def _sqlite_connection_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite settings; journal_mode=WAL persists in the file."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=NORMAL;")
+    cursor.execute("PRAGMA busy_timeout=30000;")  # Wait 30s before "database locked"
+    cursor.close()
+
+
+def get_engine() -> Engine:
+    """The sync engine, created on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    DATABASE_URL,
+                    connect_args=connect_args,
+                    poolclass=QueuePool,
+                    pool_size=10,
+                    max_overflow=20,
+                    pool_timeout=30,
+                    pool_pre_ping=True,
+                    echo=False,
+                    future=True
+                )
+                if DATABASE_URL.startswith("sqlite"):
+                    _prepare_sqlite_file(engine)
+                    event.listen(engine, "connect", _sqlite_connection_pragmas)
+                _engine = engine
+    return _engine
 
 # ============================================================
 # 3️⃣ Ensure Database Directory and WAL Mode for SQLite
 # ============================================================
-if DATABASE_URL.startswith("sqlite"):
-    db_dir = os.path.dirname(DEFAULT_SQLITE_PATH)
-    os.makedirs(db_dir, exist_ok=True)  # Ensure /app exists
+def _prepare_sqlite_file(engine: Engine):
+    db_path = engine.url.database
+    if db_path and db_path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
 
-    # ✅ Create database file if missing
-    if not os.path.exists(DEFAULT_SQLITE_PATH):
-        open(DEFAULT_SQLITE_PATH, "a").close()
 
-    # ✅ Apply SQLite optimizations
-    with engine.begin() as conn:
-        conn.execute(text("PRAGMA journal_mode=WAL;"))
-        conn.execute(text("PRAGMA synchronous=NORMAL;"))
-        conn.execute(text("PRAGMA busy_timeout=30000;"))  # Wait 30s before "database locked"
+def init_sqlite(engine: Engine):
+    """
+    File-level SQLite settings, applied once at startup (see app.migrations).
+    auto_vacuum only takes effect on a new, empty file; existing files are
+    converted with `python -m app.utils.retention --vacuum`.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL;")
 
 # ============================================================
-# 4️⃣ Session Factory Setup
+# 4️⃣ Plan Storage Settings
+# ============================================================
+# "packed" stores each plan as one `plans` row with binary coordinate arrays,
+# "rows" keeps the legacy one-row-per-point `trajectories` layout.
+PLAN_STORAGE = os.getenv("PLAN_STORAGE", "packed")
+PLAN_DTYPE = os.getenv("PLAN_DTYPE", "f8")  # "f8" or "f4" for x/y
+PLAN_COMPRESSION = os.getenv("PLAN_COMPRESSION", "zlib").lower()  # "zlib" or "none"
+if PLAN_COMPRESSION in ("", "none"):
+    PLAN_COMPRESSION = None
+
+# Rows per executemany batch when writing row-stored trajectories
+TRAJECTORY_INSERT_CHUNK = int(os.getenv("TRAJECTORY_INSERT_CHUNK", "5000"))
+
 # ============================================================
-SessionLocal = sessionmaker(
-    bind=engine,
+# 5️⃣ Session Factory Setup
+# ============================================================
+class _LazySessionFactory:
+    """Called like a sessionmaker; binds to its engine on first use."""
+
+    def __init__(self, build):
+        self._build = build
+        self._factory = None
+
+    def __call__(self, **kwargs):
+        if self._factory is None:
+            self._factory = self._build()
+        return self._factory(**kwargs)
+
+
+SessionLocal = _LazySessionFactory(lambda: sessionmaker(
+    bind=get_engine(),
     autoflush=False,
     autocommit=False,
     expire_on_commit=False,
-)
+))
+
+# ============================================================
+# 6️⃣ Async Engine + Session Factory (aiosqlite)
+# ============================================================
+# Used by the read routes and the WebSocket player so DB access never
+# blocks the event loop. The sync engine above stays for scripts,
+# migrations and the sync write routes.
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+
+def get_async_engine() -> AsyncEngine:
+    """The async engine, created on first call."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                engine = create_async_engine(
+                    ASYNC_DATABASE_URL,
+                    connect_args={"timeout": 30} if ASYNC_DATABASE_URL.startswith("sqlite") else {},
+                    poolclass=AsyncAdaptedQueuePool,  # aiosqlite defaults to NullPool; reuse connections
+                    pool_size=10,
+                    max_overflow=20,
+                    pool_timeout=30,
+                    pool_pre_ping=True,
+                    echo=False,
+                )
+                if ASYNC_DATABASE_URL.startswith("sqlite"):
+                    event.listen(engine.sync_engine, "connect", _sqlite_connection_pragmas)
+                _async_engine = engine
+    return _async_engine
+
+
+async def dispose_engines():
+    """Closes pooled connections of whichever engines were created."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+
+
+AsyncSessionLocal = _LazySessionFactory(lambda: async_sessionmaker(
+    bind=get_async_engine(),
+    autoflush=False,
+    expire_on_commit=False,
+))
+
+
+def __getattr__(name):
+    # ✅ `from app.database import engine` still works; it creates the engine
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ============================================================
-# 5️⃣ Base Model for SQLAlchemy ORM
+# 7️⃣ Base Model for SQLAlchemy ORM
 # ============================================================
 Base = declarative_base()
 
 # ============================================================
-# 6️⃣ Dependency for FastAPI Routes
+# 8️⃣ Dependency for FastAPI Routes
 # ============================================================
 def get_db() -> Session:
     """
@@ -82,3 +202,17 @@ def get_db() -> Session:
         raise
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncSession:
+    """
+    Async counterpart of get_db for async routes.
+    Rolls back on error and closes after use.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
@@ -1,17 +1,61 @@
 # backend/app/main.py
 
-from fastapi import FastAPI, Request, WebSocket
-from fastapi.middleware.cors import CORSMiddleware  # ✅ use FastAPI’s version for full OPTIONS support
 import time
-from app.database import Base, engine
+from app.utils.boot import STARTUP_TIMING, boot_timer
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from threading import Thread
+from fastapi import FastAPI, Request, Response, WebSocket
+from fastapi.middleware.cors import CORSMiddleware  # ✅ use FastAPI’s version for full OPTIONS support
+from app.database import dispose_engines, get_async_engine, get_engine
 from app.routes import coverage, trajectory, player
-from app.utils.logging import logger
+from app.migrations import DB_MIGRATE_ON_STARTUP, ensure_schema
+from app.utils.jobs import job_manager
+from app.utils.retention import retention_worker
+from app.utils.logging import logger, setup_logging, should_log_access
+from app.utils import metrics, optional
 
-# ✅ Initialize FastAPI app
-app = FastAPI(title="Wall Finishing Planner API")
 
-# ✅ Create all database tables at startup
-Base.metadata.create_all(bind=engine)
+# ✅ Startup and shutdown; nothing touches the DB or the filesystem at import time
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with boot_timer.phase("logging"):
+        setup_logging()
+
+    # ✅ Create tables and run migrations, once per schema (see app.migrations)
+    with boot_timer.phase("schema"):
+        if DB_MIGRATE_ON_STARTUP:
+            ensure_schema()
+
+    # ✅ Pool gauges for /metrics
+    with boot_timer.phase("engines"):
+        metrics.instrument_pool(get_engine(), "sync")
+        metrics.instrument_pool(get_async_engine().sync_engine, "async")
+
+    # ✅ Background retention: access flushes, expiry purge, archival, compaction
+    with boot_timer.phase("retention"):
+        retention_worker.start()
+
+    if STARTUP_TIMING:
+        logger.info(f"⏱️ Startup phases:\n{boot_timer.report()}")
+    if optional.PRELOAD_OPTIONAL_IMPORTS:
+        # ✅ Import numpy after the app serves, not on the first request that needs it
+        Thread(target=optional.preload, name="preload-imports", daemon=True).start()
+
+    yield
+
+    # ✅ Stop background work and close DB connections on shutdown
+    with boot_timer.phase("shutdown"):
+        retention_worker.stop()
+        job_manager.shutdown()
+        await dispose_engines()
+        metrics.mark_process_dead()
+
+
+# ✅ Initialize FastAPI app
+app = FastAPI(title="Wall Finishing Planner API", lifespan=lifespan)
 
 # ✅ Define allowed frontend origins (local + deployed)
 ALLOWED_ORIGINS = [
@@ -31,7 +75,7 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers (Content-Type, Authorization, etc.)
 )
 
-# ✅ Logging middleware (added AFTER CORS)
+# ✅ Timing, metrics and access-log middleware (added AFTER CORS)
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
@@ -40,9 +84,15 @@ async def add_process_time_header(request: Request, call_next):
     except Exception as e:
         logger.error(f"🔥 Exception while processing {request.url.path}: {e}")
         raise
-    duration = round(time.time() - start_time, 4)
+    elapsed = time.time() - start_time
+    route = request.scope.get("route")
+    route_path = route.path if route else "unmatched"
+    metrics.REQUEST_LATENCY.labels(request.method, route_path, response.status_code).observe(elapsed)
+    duration = round(elapsed, 4)
     response.headers["X-Response-Time"] = str(duration)
-    logger.info(f"{request.method} {request.url.path} - {duration}s - {response.status_code}")
+    # ✅ Access line, sampled per route (LOG_ACCESS_SAMPLE / LOG_ACCESS_SAMPLE_ROUTES)
+    if should_log_access(route_path, response.status_code):
+        logger.info(f"{request.method} {request.url.path} - {duration}s - {response.status_code}")
     return response
 
 # ✅ Register REST API routers
@@ -50,6 +100,12 @@ app.include_router(coverage.router, prefix="/api/coverage", tags=["Coverage"])
 app.include_router(trajectory.router, prefix="/api/trajectory", tags=["Trajectory"])
 app.include_router(player.router, prefix="/api/player", tags=["Player"])
 
+# ✅ Prometheus metrics (all workers when PROMETHEUS_MULTIPROC_DIR is set)
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 # ✅ Health check endpoint
 @app.get("/")
 async def root():
@@ -84,3 +140,5 @@ async def websocket_test(websocket: WebSocket):
     })
     logger.info(f"✅ WebSocket connection established from {origin}")
     await websocket.close()
+
+boot_timer.record("import app.main", time.perf_counter() - _import_started)
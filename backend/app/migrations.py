@@ -0,0 +1,202 @@
+# backend/app/migrations.py
+"""
+Schema creation and idempotent data migrations.
+
+ensure_schema() runs once per schema, not once per worker: the schema's
+fingerprint is recorded in `schema_versions` after create_all and the data
+migrations, so later starts only read one row. Workers starting together
+serialize on a lock file and the later ones find the work done. Set
+DB_MIGRATE_ON_STARTUP=0 when a release step runs `python -m app.migrations`
+instead.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import func, select, delete, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app import models
+from app.database import (
+    Base, DATABASE_URL, SessionLocal, get_engine, init_sqlite, PLAN_STORAGE, PLAN_DTYPE, PLAN_COMPRESSION,
+)
+from app.utils.packing import pack_columns
+from app.utils.logging import logger, setup_logging
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: concurrent workers may each migrate, which is still safe
+    fcntl = None
+
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "1").lower() not in ("0", "false", "no")
+
+# Bump when a data migration is added, so existing databases run it once
+MIGRATIONS_VERSION = 1
+
+
+def add_missing_columns(bind: Engine) -> list[str]:
+    """
+    create_all only creates missing tables, so columns and indexes added to
+    existing models are applied here (nullable columns via ALTER TABLE ADD,
+    indexes with IF NOT EXISTS semantics). Returns the columns added.
+    """
+    inspector = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                added.append(f"{table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    if added:
+        logger.info(f"🛠️ Added columns: {', '.join(added)}")
+    return added
+
+
+def migrate_trajectories_to_plans(db: Session) -> int:
+    """
+    Gives every legacy plan in `trajectories` a `plans` row.
+    With packed storage the points are packed into the plan and their rows
+    deleted; with row storage only the metadata row is added.
+    Each plan is committed on its own so a large backlog never holds one
+    long write lock. Returns the number of plans migrated.
+    """
+    legacy = db.execute(
+        select(
+            models.Trajectory.plan_id,
+            func.count(models.Trajectory.id),
+            func.min(models.Trajectory.created_at),
+        )
+        .where(~models.Trajectory.plan_id.in_(select(models.Plan.plan_id)))
+        .group_by(models.Trajectory.plan_id)
+    ).all()
+
+    for plan_id, count, created_at in legacy:
+        created_at = created_at or datetime.utcnow()
+        if PLAN_STORAGE == "rows":
+            db.add(models.Plan(plan_id=plan_id, storage="rows", point_count=count, created_at=created_at))
+            db.commit()
+            continue
+
+        rows = db.execute(
+            select(models.Trajectory.x, models.Trajectory.y, models.Trajectory.timestamp)
+            .where(models.Trajectory.plan_id == plan_id)
+            .order_by(models.Trajectory.id.asc())
+        ).all()
+        packed = pack_columns(
+            (r.x for r in rows),
+            (r.y for r in rows),
+            (r.timestamp.timestamp() if hasattr(r.timestamp, "timestamp") else float(r.timestamp) for r in rows),
+            dtype=PLAN_DTYPE,
+            compression=PLAN_COMPRESSION,
+        )
+        db.add(
+            models.Plan(
+                plan_id=plan_id,
+                storage="packed",
+                point_count=packed.count,
+                dtype=packed.dtype,
+                compression=packed.compression,
+                xs=packed.xs,
+                ys=packed.ys,
+                ts=packed.ts,
+                created_at=created_at,
+            )
+        )
+        db.execute(delete(models.Trajectory).where(models.Trajectory.plan_id == plan_id))
+        db.commit()
+
+    if legacy:
+        logger.info(f"📦 Migrated {len(legacy)} legacy plans to the plans table ({PLAN_STORAGE} storage).")
+    return len(legacy)
+
+
+def run_migrations():
+    add_missing_columns(get_engine())
+    db = SessionLocal()
+    try:
+        migrate_trajectories_to_plans(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"🔥 Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def schema_fingerprint() -> str:
+    """Hash of the tables, columns and indexes the models declare."""
+    parts = [f"migrations:{MIGRATIONS_VERSION}"]
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type!r}:{c.nullable}" for c in table.columns)
+        parts.extend(sorted(f"index:{i.name}" for i in table.indexes))
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _is_applied(bind: Engine, fingerprint: str) -> bool:
+    try:
+        with bind.connect() as conn:
+            return conn.execute(
+                select(models.SchemaVersion.fingerprint).where(models.SchemaVersion.fingerprint == fingerprint)
+            ).first() is not None
+    except SQLAlchemyError:  # new database: no schema_versions table yet
+        return False
+
+
+@contextmanager
+def _migration_lock():
+    """Exclusive lock shared by the workers of this host for DATABASE_URL."""
+    if fcntl is None:
+        yield
+        return
+    key = hashlib.sha256(DATABASE_URL.encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(tempfile.gettempdir(), f"wall-planner-migrate-{key}.lock")
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ensure_schema(force: bool = False) -> bool:
+    """
+    Creates tables, applies column/index additions and data migrations,
+    unless the current schema was already applied. Returns True if it ran.
+    """
+    bind = get_engine()
+    fingerprint = schema_fingerprint()
+    if not force and _is_applied(bind, fingerprint):
+        return False
+    with _migration_lock():
+        if not force and _is_applied(bind, fingerprint):
+            return False  # another worker finished while we waited
+        if DATABASE_URL.startswith("sqlite"):
+            init_sqlite(bind)
+        Base.metadata.create_all(bind=bind)
+        run_migrations()
+        with bind.begin() as conn:
+            if not conn.execute(
+                select(models.SchemaVersion.fingerprint).where(models.SchemaVersion.fingerprint == fingerprint)
+            ).first():
+                conn.execute(models.SchemaVersion.__table__.insert().values(
+                    fingerprint=fingerprint, applied_at=datetime.utcnow(),
+                ))
+    logger.info(f"🛠️ Schema {fingerprint[:12]} applied")
+    return True
+
+
+if __name__ == "__main__":
+    setup_logging()
+    ensure_schema(force=True)
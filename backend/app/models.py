@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import Column, Integer, Float, String, DateTime, LargeBinary, Text, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import datetime
@@ -12,4 +12,60 @@ class Trajectory(Base):
     x = Column(Float, nullable=False)
     y = Column(Float, nullable=False)
     timestamp = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        # ✅ Keyset paging of a plan's points (WHERE plan_id = ? AND id > ? ORDER BY id)
+        Index("ix_trajectories_plan_id_id", "plan_id", "id"),
+    )
+
+
+class Plan(Base):
+    """
+    One row per coverage plan.
+    With packed storage the coordinates live in xs/ys/ts as little-endian
+    float arrays (see app.utils.packing); with row storage they stay in
+    `trajectories` and the blobs are NULL.
+    request_hash is the canonical hash of the CoverageRequest that produced
+    the plan (see app.utils.hashing), so identical requests reuse it.
+    Replanned plans point back to their parent and carry a version number.
+    Retention (see app.utils.retention) expires plans some time after their
+    last access and may move the blobs of idle plans to an archive file.
+    """
+    __tablename__ = "plans"
+
+    plan_id = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=True, unique=True, index=True)
+    request = Column(Text, nullable=True)  # canonical request JSON
+    storage = Column(String, nullable=False, default="packed")  # "packed" | "rows"
+    point_count = Column(Integer, nullable=False, default=0)
+    dtype = Column(String, nullable=False, default="f8")
+    compression = Column(String, nullable=True)
+    xs = Column(LargeBinary, nullable=True)
+    ys = Column(LargeBinary, nullable=True)
+    ts = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, nullable=False)
+    # Set on plans derived by incremental replanning: the plan they were derived from
+    parent_plan_id = Column(String, nullable=True, index=True)
+    version = Column(Integer, nullable=True)  # NULL for original plans (version 1)
+    # Retention: last read (flushed in batches), TTL override and the resulting expiry
+    last_accessed_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, nullable=True)
+    ttl_seconds = Column(Integer, nullable=True)  # NULL: PLAN_TTL default, 0: never expires
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+    archive_file = Column(String, nullable=True)  # set while the blobs live in PLAN_ARCHIVE_DIR
+
+    __table_args__ = (
+        # ✅ Newest-first listing and keyset paging over (created_at, plan_id)
+        Index("ix_plans_created_at_plan_id", "created_at", "plan_id"),
+        # ✅ Retention scans: expired plans, and idle plans not yet archived
+        Index("ix_plans_expires_at_plan_id", "expires_at", "plan_id"),
+        Index("ix_plans_last_accessed_at_archive_file", "last_accessed_at", "archive_file", "plan_id"),
+    )
+
+
+class SchemaVersion(Base):
+    """Schemas already created and migrated, by fingerprint (see app.migrations.ensure_schema)."""
+    __tablename__ = "schema_versions"
+
+    fingerprint = Column(String, primary_key=True)
+    applied_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, nullable=False)
@@ -1,17 +1,38 @@
 # backend/app/routes/coverage.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from uuid import uuid4
 from app import schemas, crud
-from app.database import SessionLocal
-from app.utils.coverage_planner import generate_coverage_path
-from app.utils import cache
+from app.database import SessionLocal, PLAN_DTYPE, PLAN_COMPRESSION
+from app.utils.coverage_planner import (
+    generate_cell_decomposition_path,
+    generate_coverage_path,
+    generate_coverage_segments,
+    iter_segment_points,
+    path_metrics,
+    plan_packed,
+    replan_columns,
+)
+from app.utils import cache, retention
+from app.utils.encoding import VARY, columns_response, negotiate
+from app.utils.hashing import canonical_obstacle, canonical_request, canonical_request_hash
+from app.utils.packing import pack_columns
+from app.utils.singleflight import SingleFlight
+from app.utils.jobs import job_manager, JobQueueFull
+from starlette.concurrency import run_in_threadpool
 from app.utils.logging import logger
+from app.utils.metrics import observe_planner
 from datetime import datetime
+import asyncio
+import json
+import time
 
 router = APIRouter(tags=["Coverage"])
 
+# ✅ Concurrent identical requests share one planning run
+planning_flight = SingleFlight()
+
 
 # ✅ Database Dependency
 def get_db():
@@ -22,26 +43,68 @@ def get_db():
         db.close()
 
 
+def _load_stored_plan(db: Session, request_hash: str):
+    """Returns {plan_id, points} of the stored plan for request_hash, or None."""
+    plan = crud.find_plan_by_hash(db, request_hash)
+    if plan is None:
+        return None
+    points = crud.get_plan_points(db, plan.plan_id)
+    if not points:
+        return None
+    return {"plan_id": plan.plan_id, "points": points}
+
+
 @router.post("/", response_model=schemas.CoverageResponse)
-def plan_coverage(payload: schemas.CoverageRequest, db: Session = Depends(get_db)):
+def plan_coverage(
+    payload: schemas.CoverageRequest, request: Request, response: Response, db: Session = Depends(get_db),
+):
     """
     Generates a new coverage plan, stores trajectories in DB,
     and returns plan_id + points (normalized).
+    Compact encodings (columnar JSON, MessagePack, raw float64) are served
+    when the Accept header asks for them; see app.utils.encoding.
     """
+    media_type = negotiate(request.headers.get("accept"))
+    response.headers["Vary"] = VARY  # the JSON fallback varies on Accept too
 
-    # ✅ Create unique cache key
-    key = (
-        payload.wall_width,
-        payload.wall_height,
-        tuple((o.x, o.y, o.width, o.height) for o in payload.obstacles),
-        payload.step,
-    )
+    # ✅ Content-addressed key: identical requests share one stored plan
+    key = canonical_request_hash(payload)
 
     # ✅ Use cached result if exists
-    cached = cache.cache.get(key)
-    if cached:
+    result = cache.cache.get(key)
+    if result and not crud.plan_exists(db, result["plan_id"]):
+        # ✅ Purged by retention, possibly in another worker: treat as a miss
+        cache.cache.delete(key)
+        result = None
+    if result:
+        retention.touch(result["plan_id"])
         logger.info("♻️ Returning cached coverage result")
-        return cached
+    else:
+        # ✅ First caller plans; concurrent duplicates wait for its result
+        result = planning_flight.do(key, lambda: _plan_and_store(payload, key, db))
+
+    if media_type:
+        points = result["points"]
+        return columns_response(
+            media_type,
+            result["plan_id"],
+            [p["x"] for p in points],
+            [p["y"] for p in points],
+            [p["timestamp"] for p in points],
+            request.headers.get("accept-encoding"),
+        )
+    return result
+
+
+def _plan_and_store(payload: schemas.CoverageRequest, key: str, db: Session):
+    """Reuses the stored plan for key, or plans, stores and caches a new one."""
+
+    # ✅ Reuse a plan any worker already stored for this request
+    existing = _load_stored_plan(db, key)
+    if existing:
+        cache.cache.set(key, existing, ttl_seconds=60.0)
+        logger.info(f"♻️ Reusing stored coverage plan {existing['plan_id']}")
+        return existing
 
     # ✅ Build obstacle list
     obstacles = [
@@ -51,9 +114,12 @@ def plan_coverage(payload: schemas.CoverageRequest, db: Session = Depends(get_db
 
     try:
         # ✅ Generate coverage path
+        start = time.perf_counter()
         raw_result = generate_coverage_path(
             payload.wall_width, payload.wall_height, obstacles, payload.step
         )
+        if isinstance(raw_result, dict) and isinstance(raw_result.get("points"), list):
+            observe_planner("zigzag", time.perf_counter() - start, len(raw_result["points"]))
 
         # Normalize response structure
         if isinstance(raw_result, dict) and "points" in raw_result:
@@ -82,10 +148,19 @@ def plan_coverage(payload: schemas.CoverageRequest, db: Session = Depends(get_db
             raise HTTPException(status_code=400, detail="No valid coverage path generated.")
 
         # ✅ Store trajectories in DB
-        insert_status = crud.create_trajectories(db, plan_id, clean_points)
+        insert_status = crud.save_plan(
+            db, plan_id, clean_points,
+            request_hash=key, request=json.dumps(canonical_request(payload)),
+        )
         if insert_status.get("status") != "success":
             raise HTTPException(status_code=500, detail=insert_status.get("message"))
 
+        # ✅ Another worker stored the same request first: return its plan
+        if insert_status.get("plan_id", plan_id) != plan_id:
+            response = _load_stored_plan(db, key)
+            cache.cache.set(key, response, ttl_seconds=60.0)
+            return response
+
         # ✅ Build final response
         response = {"plan_id": plan_id, "points": clean_points}
         cache.cache.set(key, response, ttl_seconds=60.0)
@@ -97,3 +172,434 @@ def plan_coverage(payload: schemas.CoverageRequest, db: Session = Depends(get_db
         db.rollback()
         logger.error(f"🔥 Error in plan_coverage: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate plan: {e}")
+
+
+@router.post("/segments", response_model=schemas.SegmentPlanResponse)
+def plan_coverage_segments(
+    payload: schemas.CoverageRequest,
+    expand: bool = Query(False, description="Also return the expanded points"),
+    db: Session = Depends(get_db),
+):
+    """
+    Plans the wall with the scanline planner and returns compact row segments
+    (y, x_start, x_end, direction, count). Points are only expanded in the
+    response when expand=true; the stored trajectory is the same as /api/coverage/.
+    """
+    obstacles = [
+        {"x": o.x, "y": o.y, "width": o.width, "height": o.height}
+        for o in payload.obstacles
+    ]
+
+    try:
+        start = time.perf_counter()
+        plan = generate_coverage_segments(
+            payload.wall_width, payload.wall_height, obstacles, payload.step
+        )
+        observe_planner("segments", time.perf_counter() - start, plan["point_count"])
+        if plan["point_count"] == 0:
+            logger.warning("⚠️ No valid segments generated for wall plan.")
+            raise HTTPException(status_code=400, detail="No valid coverage path generated.")
+
+        # ✅ Segments are cheap to recompute; the stored points are shared with /api/coverage/
+        key = canonical_request_hash(payload)
+        stored = crud.find_plan_by_hash(db, key)
+        if stored is not None:
+            plan["plan_id"] = stored.plan_id
+            if expand:
+                plan["points"] = crud.get_plan_points(db, stored.plan_id)
+            return plan
+
+        points = list(iter_segment_points(plan["segments"], payload.wall_width, payload.step))
+
+        # ✅ Store trajectories in DB so the plan works with the trajectory/player routes
+        insert_status = crud.save_plan(
+            db, plan["plan_id"], points,
+            request_hash=key, request=json.dumps(canonical_request(payload)),
+        )
+        if insert_status.get("status") != "success":
+            raise HTTPException(status_code=500, detail=insert_status.get("message"))
+        plan["plan_id"] = insert_status.get("plan_id", plan["plan_id"])
+
+        if expand:
+            plan["points"] = points
+
+        logger.info(
+            f"✅ Segment plan {plan['plan_id']} created with {len(plan['segments'])} segments "
+            f"({plan['point_count']} points)."
+        )
+        return plan
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"🔥 Error in plan_coverage_segments: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate plan: {e}")
+
+
+@router.post("/cells", response_model=schemas.CellPlanResponse)
+def plan_coverage_cells(
+    payload: schemas.CoverageRequest,
+    expand: bool = Query(False, description="Also return the expanded points"),
+    db: Session = Depends(get_db),
+):
+    """
+    Plans the wall with the boustrophedon cell decomposition planner: one
+    serpentine per obstacle-free cell, cells ordered to minimise transit.
+    Returns the segments in travel order with path and transit lengths,
+    next to those of the zig-zag plan for the same wall. The plan is stored
+    like /api/coverage/ (under its own request hash) for the trajectory and
+    player routes.
+    """
+    obstacles = [
+        {"x": o.x, "y": o.y, "width": o.width, "height": o.height}
+        for o in payload.obstacles
+    ]
+
+    try:
+        start = time.perf_counter()
+        plan = generate_cell_decomposition_path(
+            payload.wall_width, payload.wall_height, obstacles, payload.step
+        )
+        observe_planner("cells", time.perf_counter() - start, plan["point_count"])
+        if plan["point_count"] == 0:
+            logger.warning("⚠️ No valid cells generated for wall plan.")
+            raise HTTPException(status_code=400, detail="No valid coverage path generated.")
+
+        zigzag = generate_coverage_segments(
+            payload.wall_width, payload.wall_height, obstacles, payload.step
+        )
+        zigzag_metrics = path_metrics(zigzag["segments"], payload.step)
+        plan["zigzag_path_length"] = zigzag_metrics["path_length"]
+        plan["zigzag_transit_length"] = zigzag_metrics["transit_length"]
+
+        points = plan.pop("points")
+        key = canonical_request_hash(payload, mode="cells")
+        stored = crud.find_plan_by_hash(db, key)
+        if stored is not None:
+            plan["plan_id"] = stored.plan_id
+            if expand:
+                plan["points"] = crud.get_plan_points(db, stored.plan_id)
+            return plan
+
+        insert_status = crud.save_plan(
+            db, plan["plan_id"], points,
+            request_hash=key, request=json.dumps({**canonical_request(payload), "mode": "cells"}),
+        )
+        if insert_status.get("status") != "success":
+            raise HTTPException(status_code=500, detail=insert_status.get("message"))
+        plan["plan_id"] = insert_status.get("plan_id", plan["plan_id"])
+
+        if expand:
+            plan["points"] = points
+
+        logger.info(
+            f"✅ Cell plan {plan['plan_id']} created with {plan['cells']} cells "
+            f"({plan['point_count']} points, transit {plan['transit_length']} m "
+            f"vs {plan['zigzag_transit_length']} m zig-zag)."
+        )
+        return plan
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"🔥 Error in plan_coverage_cells: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate plan: {e}")
+
+
+def _obstacle_dicts(obstacles: list[tuple]) -> list[dict]:
+    return [{"x": x, "y": y, "width": w, "height": h} for x, y, w, h in obstacles]
+
+
+@router.post("/{plan_id}/replan", response_model=schemas.ReplanResponse)
+def replan_coverage(plan_id: str, delta: schemas.ObstacleDelta, db: Session = Depends(get_db)):
+    """
+    Applies an obstacle delta to a stored plan. Only the rows crossing an
+    added or removed obstacle are replanned; the rest are copied from the
+    stored plan. The result is stored as a new plan (content-addressed like
+    POST /api/coverage/, with parent_plan_id/version lineage) and the
+    response lists the changed rows so clients can patch their view.
+    Timestamps follow point order as in a fresh plan, so points after a
+    changed row shift by 0.01 s per point added or removed before them.
+    """
+    parent = crud.get_plan(db, plan_id)
+    if parent is None:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    if not parent.request:
+        raise HTTPException(status_code=409, detail="Plan has no stored request to replan from")
+
+    request = json.loads(parent.request)
+    if request.get("mode", "zigzag") != "zigzag":
+        raise HTTPException(status_code=409, detail="Only zig-zag plans can be replanned incrementally")
+    obstacles = [tuple(o) for o in request["obstacles"]]
+
+    # ✅ Obstacles are matched in canonical form, like the request hash
+    changed = []
+    for o in delta.remove:
+        removed = canonical_obstacle(o)
+        if removed not in obstacles:
+            raise HTTPException(status_code=400, detail=f"Obstacle to remove is not in the plan: {o}")
+        obstacles.remove(removed)
+        changed.append(removed)
+    for o in delta.add:
+        obstacles.append(canonical_obstacle(o))
+        changed.append(canonical_obstacle(o))
+
+    payload = schemas.CoverageRequest(
+        wall_width=request["wall_width"],
+        wall_height=request["wall_height"],
+        step=request["step"],
+        obstacles=[schemas.Obstacle(x=x, y=y, width=w, height=h) for x, y, w, h in obstacles],
+    )
+    try:
+        cols = crud.get_plan_columns(db, plan_id)
+        if cols is None:  # purged by retention since the lookup above
+            raise HTTPException(status_code=404, detail="Plan not found")
+        start = time.perf_counter()
+        result = replan_columns(
+            payload.wall_width, payload.wall_height, payload.step,
+            _obstacle_dicts(obstacles), _obstacle_dicts(changed),
+            cols.xs, cols.ys, cols.ts[0] if len(cols) else None,
+        )
+        observe_planner("replan", time.perf_counter() - start, len(result["xs"]))
+        if not result["xs"]:
+            raise HTTPException(status_code=400, detail="No valid coverage path generated.")
+
+        packed = pack_columns(result["xs"], result["ys"], result["ts"], dtype=PLAN_DTYPE, compression=PLAN_COMPRESSION)
+        new_id = str(uuid4())
+        status = crud.save_packed_plan(
+            db, new_id, packed,
+            request_hash=canonical_request_hash(payload), request=json.dumps(canonical_request(payload)),
+        )
+        if status.get("status") != "success":
+            raise HTTPException(status_code=500, detail=status.get("message"))
+
+        # ✅ An identical request may already be stored (e.g. a delta that undoes an earlier one)
+        stored_id = status.get("plan_id", new_id)
+        if stored_id == new_id:
+            crud.set_plan_lineage(db, new_id, plan_id, (parent.version or 1) + 1)
+        stored = crud.get_plan(db, stored_id)
+
+        rows = []
+        for row in result["rows"]:
+            start, end = row["new_start"], row["new_start"] + row["new_count"]
+            row["points"] = [
+                {"x": x, "y": y, "timestamp": t}
+                for x, y, t in zip(result["xs"][start:end], result["ys"][start:end], result["ts"][start:end])
+            ]
+            rows.append(row)
+
+        logger.info(
+            f"✅ Replanned {plan_id} → {stored_id}: {len(rows)} rows changed, {packed.count} points."
+        )
+        return {
+            "plan_id": stored_id,
+            "parent_plan_id": plan_id,
+            "version": stored.version or 1,
+            "point_count": packed.count,
+            "rows": rows,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"🔥 Error in replan_coverage: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to replan: {e}")
+
+
+def _stored_plan_summary(request_hash: str):
+    db = SessionLocal()
+    try:
+        plan = crud.find_plan_by_hash(db, request_hash)
+        return (plan.plan_id, plan.point_count) if plan else None
+    finally:
+        db.close()
+
+
+def _store_job_result(packed, request_hash: str, request: str):
+    """Finish step of a planning job: persists the packed plan from the worker."""
+    if packed.count == 0:
+        raise ValueError("No valid coverage path generated.")
+    db = SessionLocal()
+    try:
+        plan_id = str(uuid4())
+        status = crud.save_packed_plan(db, plan_id, packed, request_hash=request_hash, request=request)
+        if status.get("status") != "success":
+            raise RuntimeError(status.get("message"))
+        return {"plan_id": status.get("plan_id", plan_id), "point_count": status["count"]}
+    finally:
+        db.close()
+
+
+@router.post("/jobs", response_model=schemas.JobResponse, status_code=202)
+async def submit_coverage_job(payload: schemas.CoverageRequest):
+    """
+    Queues a coverage plan for a worker process and returns a job id at once.
+    Poll GET /jobs/{job_id} for progress and the resulting plan_id.
+    """
+    key = canonical_request_hash(payload)
+    stored = await run_in_threadpool(_stored_plan_summary, key)
+    if stored:
+        return job_manager.add_completed(key, *stored).to_dict()
+
+    obstacles = [
+        {"x": o.x, "y": o.y, "width": o.width, "height": o.height}
+        for o in payload.obstacles
+    ]
+    request = json.dumps(canonical_request(payload))
+    try:
+        job = job_manager.submit(
+            key,
+            plan_packed,
+            (payload.wall_width, payload.wall_height, obstacles, payload.step, PLAN_DTYPE, PLAN_COMPRESSION),
+            finish=lambda packed: _store_job_result(packed, key, request),
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    logger.info(f"📥 Coverage job {job.job_id} queued")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobResponse)
+async def get_coverage_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}", response_model=schemas.JobResponse)
+async def cancel_coverage_job(job_id: str):
+    """
+    Cancels a queued or running job. A job already saving its plan is not
+    cancelled; it is returned once saved, with status "done".
+    """
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+def _find_stored_plans(request_hashes: list):
+    db = SessionLocal()
+    try:
+        return crud.find_plans_by_hashes(db, request_hashes)
+    finally:
+        db.close()
+
+
+def _store_batch(plans: list):
+    db = SessionLocal()
+    try:
+        return crud.save_packed_plans(db, plans)
+    finally:
+        db.close()
+
+
+@router.post("/batch", response_model=schemas.BatchCoverageResponse)
+async def plan_coverage_batch(payload: schemas.BatchCoverageRequest):
+    """
+    Plans many walls in one call. Identical walls are planned once, walls
+    already stored are reused, the rest are planned in parallel in the
+    planner process pool and written in a single transaction.
+    Failing walls are reported per item unless fail_on_error is set.
+    """
+    keys = [canonical_request_hash(w) for w in payload.walls]
+    first_index = {}
+    for i, key in enumerate(keys):
+        first_index.setdefault(key, i)
+
+    stored = await run_in_threadpool(_find_stored_plans, list(first_index))
+    to_plan = [i for key, i in first_index.items() if key not in stored]
+
+    async def plan_one(i: int):
+        wall = payload.walls[i]
+        obstacles = [
+            {"x": o.x, "y": o.y, "width": o.width, "height": o.height}
+            for o in wall.obstacles
+        ]
+        # ✅ Timed from when a worker picks the wall up, not from batch start
+        started = []
+        packed = await job_manager.run(
+            plan_packed, wall.wall_width, wall.wall_height, obstacles, wall.step,
+            PLAN_DTYPE, PLAN_COMPRESSION,
+            on_start=lambda: started.append(time.perf_counter()),
+        )
+        if packed.count == 0:
+            raise ValueError("No valid coverage path generated.")
+        return packed, round((time.perf_counter() - started[0]) * 1000, 2)
+
+    outcomes = await asyncio.gather(*(plan_one(i) for i in to_plan), return_exceptions=True)
+
+    results = {}
+    new_plans = []
+    for i, outcome in zip(to_plan, outcomes):
+        if isinstance(outcome, BaseException):
+            error = f"Planning exceeded {job_manager.timeout}s" if isinstance(outcome, asyncio.TimeoutError) else str(outcome)
+            results[i] = {"index": i, "status": "error", "error": error}
+            continue
+        packed, duration_ms = outcome
+        plan_id = str(uuid4())
+        results[i] = {"index": i, "status": "created", "plan_id": plan_id,
+                      "point_count": packed.count, "duration_ms": duration_ms}
+        new_plans.append({
+            "plan_id": plan_id,
+            "packed": packed,
+            "request_hash": keys[i],
+            "request": json.dumps(canonical_request(payload.walls[i])),
+        })
+
+    failed = [r for r in results.values() if r["status"] == "error"]
+    if failed and payload.fail_on_error:
+        raise HTTPException(status_code=422, detail={"failed": failed})
+
+    if new_plans:
+        statuses = await run_in_threadpool(_store_batch, new_plans)
+        for i in to_plan:
+            item = results[i]
+            if item["status"] != "created":
+                continue
+            status = statuses[item["plan_id"]]
+            if status.get("status") != "success":
+                results[i] = {"index": i, "status": "error", "error": status.get("message")}
+            elif status.get("plan_id", item["plan_id"]) != item["plan_id"]:
+                item.update(status="existing", plan_id=status["plan_id"], point_count=status["count"])
+
+    for key, i in first_index.items():
+        if key in stored:
+            plan_id, point_count = stored[key]
+            results[i] = {"index": i, "status": "existing", "plan_id": plan_id, "point_count": point_count}
+
+    items = []
+    for i, key in enumerate(keys):
+        first = results[first_index[key]]
+        if first_index[key] == i:
+            items.append(first)
+        else:
+            items.append({**first, "index": i, "status": "duplicate" if first["status"] != "error" else "error"})
+
+    summary = {
+        "created": sum(1 for r in items if r["status"] == "created"),
+        "reused": sum(1 for r in items if r["status"] in ("existing", "duplicate")),
+        "failed": sum(1 for r in items if r["status"] == "error"),
+        "items": items,
+    }
+    logger.info(
+        f"✅ Batch of {len(items)} walls: {summary['created']} created, "
+        f"{summary['reused']} reused, {summary['failed']} failed."
+    )
+    return summary
+
+
+@router.get("/stats")
+def coverage_stats():
+    """Plan cache, request coalescing, job and retention counters for capacity sizing."""
+    return {
+        "cache": cache.cache.stats(),
+        "coalescing": planning_flight.stats(),
+        "jobs": job_manager.stats(),
+        "retention": retention.retention_worker.stats(),
+    }
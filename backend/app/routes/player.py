@@ -1,9 +1,19 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app import crud
+from app.utils.broadcast import hub
 from app.utils.logging import logger
+from app.utils.metrics import WS_PLAYBACK
+from app.utils.playback import (
+    MAX_BATCH,
+    MAX_SPEED,
+    POINT_INTERVAL,
+    PlanStream,
+    PlaybackState,
+    encode_binary_frame,
+    encode_json_frame,
+)
 import asyncio
+import json
+from typing import Optional
 
 router = APIRouter(tags=["Player"])
 
@@ -13,12 +23,14 @@ ALLOWED_ORIGINS = {
     "http://127.0.0.1:5173",
 }
 
-@router.websocket("/ws/play/{plan_id}")
-async def websocket_play(websocket: WebSocket, plan_id: str):
-    """
-    Streams trajectory points for a given plan_id over WebSocket.
-    Compatible with Vercel frontend + Render backend.
-    """
+# ✅ Open /ws/play sessions (each runs its own playback loop)
+active_sessions = 0
+play_gauge = WS_PLAYBACK.labels("play")
+watch_gauge = WS_PLAYBACK.labels("watch")
+
+
+async def _accept(websocket: WebSocket, batch: int, encoding: str, speed: float) -> bool:
+    """Origin check, accept and option validation shared by the player sockets."""
     origin = websocket.headers.get("origin")
     logger.info(f"🌐 WebSocket request from: {origin}")
 
@@ -26,40 +38,87 @@ async def websocket_play(websocket: WebSocket, plan_id: str):
     if origin not in ALLOWED_ORIGINS:
         await websocket.close(code=1008)
         logger.warning(f"❌ WebSocket rejected from invalid origin: {origin}")
-        return
+        return False
 
     await websocket.accept()
-    db: Session = SessionLocal()
 
-    try:
-        rows = crud.get_trajectories_by_plan(db, plan_id)
+    if not 1 <= batch <= MAX_BATCH or encoding not in ("json", "binary") or not 0 < speed <= MAX_SPEED:
+        await websocket.send_json({
+            "error": f"invalid playback options: batch 1..{MAX_BATCH}, encoding json|binary, speed (0, {MAX_SPEED}]"
+        })
+        await websocket.close(code=1003)
+        return False
+    return True
 
-        if not rows:
+
+@router.websocket("/ws/play/{plan_id}")
+async def websocket_play(
+    websocket: WebSocket,
+    plan_id: str,
+    batch: int = 1,
+    encoding: str = "json",
+    speed: float = 1.0,
+):
+    """
+    Streams trajectory points for a given plan_id over WebSocket.
+    Compatible with Vercel frontend + Render backend.
+
+    Query params: batch (points per frame), encoding ("json" or "binary":
+    packed little-endian float64 frames, see app.utils.playback) and speed
+    (1.0 = 20 points/s). While playing, the client may send JSON controls:
+    {"action": "pause"}, {"action": "resume"},
+    {"action": "speed", "value": 4}, {"action": "seek", "index": 1200}.
+    Points are read from the DB slice by slice as playback advances.
+    """
+    global active_sessions
+    if not await _accept(websocket, batch, encoding, speed):
+        return
+
+    receiver = None
+    active_sessions += 1
+    play_gauge.inc()
+    try:
+        stream = PlanStream(plan_id)
+        if not await stream.open():
             await websocket.send_json({"error": "plan_not_found"})
             await websocket.close()
             logger.warning(f"⚠️ Plan '{plan_id}' not found.")
             return
 
-        total = len(rows)
-        logger.info(f"🎬 Streaming {total} points for plan_id={plan_id}")
-
-        for i, row in enumerate(rows):
-            ts = (
-                row.timestamp.timestamp()
-                if hasattr(row.timestamp, "timestamp")
-                else row.timestamp
-            )
-            await websocket.send_json({
-                "x": float(row.x),
-                "y": float(row.y),
-                "index": i,
-                "total": total,
-                "timestamp": ts,
-            })
-            await asyncio.sleep(0.05)
-
-        logger.info(f"✅ Completed playback for plan {plan_id}")
-        await websocket.close()
+        total = stream.total
+        logger.info(f"🎬 Streaming {total} points for plan_id={plan_id} (batch={batch}, {encoding})")
+
+        state = PlaybackState(speed)
+        receiver = asyncio.create_task(_receive_controls(websocket, state, total))
+
+        index = 0
+        while index < total and not state.closed:
+            await state.running.wait()
+            if state.seek_to is not None:
+                index, state.seek_to = state.seek_to, None
+
+            xs, ys, ts = await stream.read(index, batch)
+            if not xs:
+                break
+            if encoding == "binary":
+                await websocket.send_bytes(encode_binary_frame(index, total, xs, ys, ts))
+            else:
+                await websocket.send_text(encode_json_frame(index, total, xs, ys, ts, batch))
+            index += len(xs)
+
+            # ✅ Sleep for the frame's share of playback time; controls cut it short
+            state.changed.clear()
+            try:
+                await asyncio.wait_for(state.changed.wait(), timeout=POINT_INTERVAL * len(xs) / state.speed)
+            except asyncio.TimeoutError:
+                pass
+
+        if receiver.done() and receiver.result() is not None:
+            # ✅ The control reader failed: the client can no longer steer playback
+            await websocket.close(code=1011)
+        elif not state.closed:
+            logger.info(f"✅ Completed playback for plan {plan_id}")
+            await websocket.close()
 
     except WebSocketDisconnect:
         logger.info(f"🔌 Client disconnected from /ws/play/{plan_id}")
@@ -71,4 +130,105 @@ async def websocket_play(websocket: WebSocket, plan_id: str):
             pass
         await websocket.close()
     finally:
-        db.close()
+        active_sessions -= 1
+        play_gauge.dec()
+        if receiver is not None:
+            receiver.cancel()
+
+
+@router.websocket("/ws/watch/{plan_id}")
+async def websocket_watch(
+    websocket: WebSocket,
+    plan_id: str,
+    batch: int = 1,
+    encoding: str = "json",
+    speed: float = 1.0,
+):
+    """
+    Joins the shared playback of a plan. All viewers with the same
+    plan_id/batch/encoding/speed receive the same frames from one producer,
+    so each frame is read and encoded once however many are watching.
+    Viewers joining late start at the current frame; playback controls are
+    not available on a shared stream. A viewer that falls more than a
+    queue's worth of frames behind skips the oldest ones.
+    """
+    if not await _accept(websocket, batch, encoding, speed):
+        return
+
+    sub = await hub.subscribe(plan_id, batch, encoding, speed)
+    if sub is None:
+        await websocket.send_json({"error": "plan_not_found"})
+        await websocket.close()
+        logger.warning(f"⚠️ Plan '{plan_id}' not found.")
+        return
+
+    # ✅ Watch for the client going away even while no frames are due
+    disconnected = asyncio.create_task(_wait_disconnect(websocket))
+    watch_gauge.inc()
+    try:
+        while True:
+            next_frame = asyncio.create_task(sub.queue.get())
+            done, _ = await asyncio.wait({next_frame, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_frame.cancel()
+                break
+            frame = next_frame.result()
+            if frame is None:
+                await websocket.close()
+                break
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+    except WebSocketDisconnect:
+        logger.info(f"🔌 Client disconnected from /ws/watch/{plan_id}")
+    except Exception as e:
+        logger.error(f"🔥 WebSocket error for {plan_id}: {e}")
+    finally:
+        watch_gauge.dec()
+        disconnected.cancel()
+        await hub.unsubscribe(sub)
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    """Discards incoming messages until the client disconnects."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@router.get("/stats")
+def player_stats():
+    """Open playback connections and per-stream broadcast queue depths."""
+    return {"sessions": active_sessions, "broadcast": hub.stats()}
+
+
+async def _receive_controls(websocket: WebSocket, state: PlaybackState, total: int) -> Optional[Exception]:
+    """
+    Applies client control messages until the socket closes, then ends the
+    playback. Returns the error that stopped it, if any.
+    """
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_json({"error": "controls must be JSON objects"})
+                continue
+            error = state.apply(message, total)
+            if error:
+                await websocket.send_json({"error": error})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ Playback control reader stopped: {e!r}")
+        return e
+    finally:
+        # ✅ Without a reader the session can't be paused or closed; end it
+        state.closed = True
+        state.running.set()
+        state.changed.set()
@@ -1,79 +1,329 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app import crud
-from app.database import get_db
-from datetime import datetime
+from app import crud, schemas
+from app.database import get_async_db, get_db
+from app.utils.cache import lod_cache, spatial_cache
+from app.utils.encoding import VARY, columns_response, negotiate
 from app.utils.logging import logger
+from app.utils.pagination import decode_cursor, encode_cursor, parse_datetime
+from app.utils import retention
+from app.utils.playback import PlanStream
+from app.utils.simplify import LodPyramid
+from app.utils.spatial import GridIndex
+import json
+import os
 
 router = APIRouter(tags=["Trajectory"])
 
+# Points fetched and encoded per chunk when streaming a plan
+STREAM_BATCH = int(os.getenv("TRAJECTORY_STREAM_BATCH", "5000"))
+
+# Plans are immutable, so pyramids and spatial indexes only leave the cache to free memory
+LOD_CACHE_TTL = float(os.getenv("LOD_CACHE_TTL", "3600"))
+SPATIAL_CACHE_TTL = float(os.getenv("SPATIAL_CACHE_TTL", "3600"))
+
 # ✅ GET all trajectories (recent)
 @router.get("/")
-def get_all(limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
-    rows = crud.get_recent_trajectories(db, limit=limit)
+async def get_all(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    paged: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if paged or cursor:
+        return await _recent_page(db, limit, cursor)
+    rows = await crud.get_recent_trajectories_async(db, limit=limit)
     return rows or []
 
 
 # ✅ GET recent trajectories
 @router.get("/recent")
-def get_recent(limit: int = Query(50, ge=1, le=1000), db: Session = Depends(get_db)):
-    rows = crud.get_recent_trajectories(db, limit=limit)
+async def get_recent(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    paged: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Newest trajectory points. With paged=true (or a cursor) returns a
+    TrajectoryListResponse: plans newest first, each plan's points in path
+    order, plus the total point count (first page only) and a next_cursor
+    for the next page.
+    """
+    if paged or cursor:
+        return await _recent_page(db, limit, cursor)
+    rows = await crud.get_recent_trajectories_async(db, limit=limit)
     return rows or []
 
 
+async def _recent_page(db: AsyncSession, limit: int, cursor: Optional[str]) -> schemas.TrajectoryListResponse:
+    position = None
+    if cursor:
+        try:
+            created_at, plan_id, after_id = decode_cursor(cursor, 3)
+            position = (parse_datetime(created_at), str(plan_id), int(after_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    page = await crud.get_recent_page_async(db, limit, position)
+    next_cursor = page["next_cursor"]
+    return schemas.TrajectoryListResponse(
+        total=page["total"],
+        trajectories=page["trajectories"],
+        next_cursor=encode_cursor(*next_cursor) if next_cursor else None,
+    )
+
+
+# ✅ GET a simplified (level-of-detail) version of a plan
+@router.get("/{plan_id}/lod")
+async def get_lod(
+    plan_id: str,
+    request: Request,
+    response: Response,
+    points: Optional[int] = Query(None, ge=2),
+    tolerance: Optional[float] = Query(None, ge=0),
+    level: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Returns the plan simplified for display: collinear runs collapsed and
+    Ramer–Douglas–Peucker applied, either to at most `points` points, to a
+    `tolerance` (max deviation in metres) or to a precomputed pyramid
+    `level` (0 = coarsest). Without any of them the lossless collapse is
+    returned. `levels` in the response describes the pyramid.
+    Compact encodings are available via Accept like the full plan route.
+    """
+    response.headers["Vary"] = VARY
+    pyramid = await get_pyramid(db, plan_id)
+    if pyramid is None:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    levels = pyramid.levels()
+    if level is not None:
+        if level >= len(levels):
+            raise HTTPException(status_code=400, detail=f"level must be below {len(levels)}")
+        points = levels[level]["points"]
+    selected = pyramid.select(points=points, tolerance=tolerance)
+    xs = [pyramid.xs[i] for i in selected]
+    ys = [pyramid.ys[i] for i in selected]
+    ts = [pyramid.ts[i] for i in selected]
+
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type:
+        return columns_response(media_type, plan_id, xs, ys, ts, request.headers.get("accept-encoding"))
+    return {
+        "plan_id": plan_id,
+        "total": pyramid.total,
+        "count": len(selected),
+        "levels": levels,
+        "points": [{"x": x, "y": y, "timestamp": t} for x, y, t in zip(xs, ys, ts)],
+    }
+
+
+async def get_pyramid(db: AsyncSession, plan_id: str) -> Optional[LodPyramid]:
+    """The plan's cached LodPyramid, built on first use off the event loop."""
+    pyramid = await crud.cached_plan_value_async(db, lod_cache, plan_id)
+    if pyramid is None:
+        cols = await crud.get_plan_columns_async(db, plan_id)
+        if cols is None:
+            return None
+        pyramid = await run_in_threadpool(LodPyramid, plan_id, cols.xs, cols.ys, cols.ts)
+        lod_cache.set(plan_id, pyramid, ttl_seconds=LOD_CACHE_TTL)
+        logger.info(f"🔺 Built LOD pyramid for {plan_id}: {pyramid.total} → {pyramid.max_points} points")
+    return pyramid
+
+
+# ✅ GET the points of a plan inside a bounding box
+@router.get("/{plan_id}/region")
+async def get_region(
+    plan_id: str,
+    request: Request,
+    response: Response,
+    min_x: float,
+    min_y: float,
+    max_x: float,
+    max_y: float,
+    pixels: Optional[int] = Query(None, ge=1, le=16384),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Returns the plan's points inside [min_x, max_x] × [min_y, max_y], in path
+    order, each with its index in the full plan. Backed by a per-plan grid
+    index built on first use and cached.
+
+    pixels (the viewport size in pixels along its longer side) applies the
+    matching level of detail: points are simplified to a tolerance of one
+    pixel before clipping to the box.
+    """
+    response.headers["Vary"] = VARY
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(status_code=400, detail="min_x/min_y must not exceed max_x/max_y")
+
+    if pixels:
+        pyramid = await get_pyramid(db, plan_id)
+        if pyramid is None:
+            raise HTTPException(status_code=404, detail="Plan not found")
+        tolerance = max(max_x - min_x, max_y - min_y) / pixels
+        source = pyramid
+        selected = [
+            i for i in pyramid.select(tolerance=tolerance)
+            if min_x <= pyramid.xs[i] <= max_x and min_y <= pyramid.ys[i] <= max_y
+        ]
+    else:
+        index = await get_spatial_index(db, plan_id)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Plan not found")
+        source = index
+        selected = index.query(min_x, min_y, max_x, max_y)
+
+    xs = [source.xs[i] for i in selected]
+    ys = [source.ys[i] for i in selected]
+    ts = [source.ts[i] for i in selected]
+
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type:
+        return columns_response(media_type, plan_id, xs, ys, ts, request.headers.get("accept-encoding"))
+    return {
+        "plan_id": plan_id,
+        "total": source.total,
+        "count": len(selected),
+        "points": [
+            {"index": i, "x": x, "y": y, "timestamp": t}
+            for i, x, y, t in zip(selected, xs, ys, ts)
+        ],
+    }
+
+
+async def get_spatial_index(db: AsyncSession, plan_id: str) -> Optional[GridIndex]:
+    """The plan's cached GridIndex, built on first use off the event loop."""
+    index = await crud.cached_plan_value_async(db, spatial_cache, plan_id)
+    if index is None:
+        cols = await crud.get_plan_columns_async(db, plan_id)
+        if cols is None:
+            return None
+        index = await run_in_threadpool(GridIndex, plan_id, cols.xs, cols.ys, cols.ts)
+        spatial_cache.set(plan_id, index, ttl_seconds=SPATIAL_CACHE_TTL)
+        logger.info(f"🗺️ Built spatial index for {plan_id}: {index.total} points, {index.nx}×{index.ny} cells")
+    return index
+
+
+# ✅ PUT a plan's retention TTL
+@router.put("/{plan_id}/retention", response_model=schemas.PlanRetentionResponse)
+def set_retention(plan_id: str, payload: schemas.PlanRetentionUpdate, db: Session = Depends(get_db)):
+    """
+    Overrides how long the plan is kept after its last access
+    (ttl_seconds=0 keeps it until changed, null goes back to PLAN_TTL).
+    """
+    plan = retention.set_ttl(db, plan_id, payload.ttl_seconds)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return {
+        "plan_id": plan.plan_id,
+        "ttl_seconds": plan.ttl_seconds,
+        "last_accessed_at": plan.last_accessed_at,
+        "expires_at": plan.expires_at,
+        "archived": plan.archive_file is not None,
+    }
+
+
 # ✅ GET trajectories by plan_id (frontend simplified response)
 @router.get("/{plan_id}")
-def get_by_plan(plan_id: str, db: Session = Depends(get_db)):
+async def get_by_plan(
+    plan_id: str,
+    request: Request,
+    response: Response,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|array)$"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Returns simplified trajectory points for a given plan_id
     (x, y, timestamp) only — for frontend visualization.
-    Works with both ORM objects and dicts.
+    Reads the plan's coordinate columns directly (packed or row storage).
+
+    stream=ndjson (one point object per line) or stream=array (the same JSON
+    array, sent in chunks) streams the plan STREAM_BATCH points at a time
+    instead of building it in memory.
+
+    limit (and cursor) switch to paged mode: a TrajectoryListResponse with
+    `limit` points in path order, the plan's point count as total and a
+    next_cursor for the following page.
+
+    Otherwise the Accept header may select a compact encoding (columnar
+    JSON, MessagePack, raw float64), built straight from the plan columns.
     """
-    rows = crud.get_trajectories_by_plan(db, plan_id)
-    if not rows:
+    response.headers["Vary"] = VARY  # every mode of this URL, the JSON fallback included
+    if stream:
+        return await _stream_plan(plan_id, stream)
+    if limit is not None or cursor:
+        return await _plan_page(db, plan_id, limit or 1000, cursor)
+
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type:
+        cols = await crud.get_plan_columns_async(db, plan_id)
+        if cols is None:
+            raise HTTPException(status_code=404, detail="Plan not found")
+        return columns_response(
+            media_type, plan_id, cols.xs, cols.ys, cols.ts, request.headers.get("accept-encoding")
+        )
+
+    formatted = await crud.get_plan_points_async(db, plan_id)
+    if formatted is None:
         raise HTTPException(status_code=404, detail="Plan not found")
 
-    formatted = []
-    for idx, r in enumerate(rows):
-        # ✅ Handle both dict and ORM
-        x = r["x"] if isinstance(r, dict) else getattr(r, "x", None)
-        y = r["y"] if isinstance(r, dict) else getattr(r, "y", None)
-        ts_raw = r["timestamp"] if isinstance(r, dict) else getattr(r, "timestamp", None)
+    logger.info(f"✅ Returned {len(formatted)} simplified points for plan_id={plan_id}")
+    return formatted
+
 
-        ts_value = None
+async def _plan_page(db: AsyncSession, plan_id: str, limit: int, cursor: Optional[str]) -> schemas.TrajectoryListResponse:
+    after_id = 0
+    if cursor:
         try:
-            if hasattr(ts_raw, "timestamp"):  # datetime
-                ts_value = ts_raw.timestamp()
-            elif isinstance(ts_raw, (int, float)):
-                ts_value = float(ts_raw)
-            elif isinstance(ts_raw, str):
-                try:
-                    ts_value = datetime.fromisoformat(ts_raw).timestamp()
-                except Exception:
-                    ts_value = float(idx)
-            elif isinstance(ts_raw, dict):
-                inner = ts_raw.get("value") or ts_raw.get("timestamp")
-                if isinstance(inner, (int, float)):
-                    ts_value = float(inner)
-                elif isinstance(inner, str):
-                    try:
-                        ts_value = datetime.fromisoformat(inner).timestamp()
-                    except Exception:
-                        ts_value = float(idx)
-            else:
-                ts_value = float(idx)
-        except Exception as e:
-            logger.warning(f"⚠️ Invalid timestamp for point {idx}: {e}")
-            ts_value = float(idx)
+            (after_id,) = decode_cursor(cursor, 1)
+            after_id = int(after_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    page = await crud.get_plan_page_async(db, plan_id, limit, after_id)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    next_cursor = page["next_cursor"]
+    return schemas.TrajectoryListResponse(
+        total=page["total"],
+        trajectories=page["trajectories"],
+        next_cursor=encode_cursor(next_cursor) if next_cursor else None,
+    )
 
-        if x is None or y is None:
-            continue
 
-        formatted.append({
-            "x": float(x),
-            "y": float(y),
-            "timestamp": ts_value,
-        })
+async def _stream_plan(plan_id: str, mode: str) -> StreamingResponse:
+    # The reader opens its own short-lived sessions: the request's session is
+    # closed before a streaming body is sent.
+    reader = PlanStream(plan_id)
+    if not await reader.open():
+        raise HTTPException(status_code=404, detail="Plan not found")
 
-    logger.info(f"✅ Returned {len(formatted)} simplified points for plan_id={plan_id}")
-    return formatted
+    async def body():
+        index = 0
+        if mode == "array":
+            yield "["
+        while index < reader.total:
+            xs, ys, ts = await reader.read(index, STREAM_BATCH)
+            if not xs:
+                break
+            points = [{"x": x, "y": y, "timestamp": t} for x, y, t in zip(xs, ys, ts)]
+            if mode == "ndjson":
+                yield "".join(json.dumps(p) + "\n" for p in points)
+            else:
+                yield ("," if index else "") + json.dumps(points)[1:-1]
+            index += len(xs)
+        if mode == "array":
+            yield "]"
+        logger.info(f"✅ Streamed {index} points for plan_id={plan_id} ({mode})")
+
+    media_type = "application/x-ndjson" if mode == "ndjson" else "application/json"
+    return StreamingResponse(body(), media_type=media_type, headers={"Vary": VARY})
@@ -29,6 +29,91 @@ class CoverageResponse(BaseModel):
     points: List[Point]
 
 
+class Segment(BaseModel):
+    """A free run of one zig-zag row, in travel order."""
+    y: float
+    x_start: float
+    x_end: float
+    direction: int
+    count: int
+
+
+class SegmentPlanResponse(BaseModel):
+    plan_id: str
+    step: float
+    point_count: int
+    segments: List[Segment]
+    points: Optional[List[Point]] = None
+
+
+class CellPlanResponse(SegmentPlanResponse):
+    """Cell decomposition plan with travel metrics, next to the zig-zag plan's."""
+    cells: int
+    path_length: float
+    transit_length: float
+    zigzag_path_length: float
+    zigzag_transit_length: float
+
+
+class BatchCoverageRequest(BaseModel):
+    walls: List[CoverageRequest] = Field(..., min_length=1, max_length=500, description="Walls to plan")
+    fail_on_error: bool = Field(False, description="Reject the whole batch if any wall fails")
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str  # "created" | "existing" | "duplicate" | "error"
+    plan_id: Optional[str] = None
+    point_count: Optional[int] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchCoverageResponse(BaseModel):
+    created: int
+    reused: int
+    failed: int
+    items: List[BatchItemResult]
+
+
+class JobResponse(BaseModel):
+    """Status of an asynchronous coverage planning job."""
+    job_id: str
+    status: str
+    progress: float
+    plan_id: Optional[str] = None
+    point_count: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class ObstacleDelta(BaseModel):
+    """Obstacle changes for an incremental replan; resize = remove old + add new."""
+    add: List[Obstacle] = Field(default_factory=list, description="Obstacles to add")
+    remove: List[Obstacle] = Field(default_factory=list, description="Obstacles to remove (must match exactly)")
+
+
+class RowDiff(BaseModel):
+    """One replanned row: replaces old points [old_start, old_start + old_count)."""
+    y: float
+    direction: int
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    points: List[Point]
+
+
+class ReplanResponse(BaseModel):
+    plan_id: str
+    parent_plan_id: str
+    version: int
+    point_count: int
+    rows: List[RowDiff]
+
+
 # ---------- Trajectory Schemas ----------
 
 class TrajectoryBase(BaseModel):
@@ -57,5 +142,21 @@ class TrajectoryResponse(TrajectoryBase):
 
 class TrajectoryListResponse(BaseModel):
     """Response for a paginated list of trajectories."""
-    total: int
+    total: Optional[int] = None  # recent feed: first page only
     trajectories: List[TrajectoryResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+
+# ---------- Retention Schemas ----------
+
+class PlanRetentionUpdate(BaseModel):
+    """Per-plan TTL override: seconds after the last access, 0 keeps the plan, null restores the default."""
+    ttl_seconds: Optional[int] = Field(None, ge=0)
+
+
+class PlanRetentionResponse(BaseModel):
+    plan_id: str
+    ttl_seconds: Optional[int] = None
+    last_accessed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # null: no TTL applies; 9999-12-31: pinned
+    archived: bool
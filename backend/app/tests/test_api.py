@@ -0,0 +1,949 @@
+# backend/app/tests/test_api.py
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# ✅ A throwaway SQLite file; must be set before app.database is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='wall-tests-'), 'test.db')}"
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+from app.main import app
+from app.migrations import ensure_schema, migrate_trajectories_to_plans
+from app.routes import coverage as coverage_routes
+from app.routes import trajectory as trajectory_routes
+from app.utils import broadcast as broadcast_utils
+from app.utils import cache
+from app.utils.broadcast import BroadcastHub
+from app.utils.cache import SimpleCache
+from app.utils.coverage_planner import (
+    frange,
+    generate_cell_decomposition_path,
+    generate_coverage_path,
+    generate_coverage_segments,
+    iter_segment_points,
+    replan_columns,
+)
+from app.utils.hashing import canonical_request, canonical_request_hash
+from app.utils.jobs import JobManager
+from app.utils.metrics import DB_POOL_CHECKED_OUT, instrument_pool
+from app.utils.packing import pack_columns, unpack_columns
+from app.utils.playback import BINARY_HEADER, MAX_SPEED
+from app.utils.singleflight import SingleFlight
+
+
+@pytest.fixture(scope="module")
+def client():
+    # ✅ Schema only; the full lifespan would also start logging to logs/app.log
+    ensure_schema(force=True)
+    return TestClient(app)
+
+
+def _obstacle(x, y, width, height):
+    return {"x": x, "y": y, "width": width, "height": height}
+
+
+def _random_obstacles(rng, wall_width, wall_height, count):
+    return [
+        _obstacle(
+            round(rng.uniform(0, wall_width - 0.5), 2),
+            round(rng.uniform(0, wall_height - 0.5), 2),
+            round(rng.uniform(0.2, 1.5), 2),
+            round(rng.uniform(0.2, 1.5), 2),
+        )
+        for _ in range(count)
+    ]
+
+
+def _full_columns(wall_width, wall_height, obstacles, step, dtype):
+    points = generate_coverage_path(wall_width, wall_height, obstacles, step, engine="python")["points"]
+    packed = pack_columns(
+        (p["x"] for p in points), (p["y"] for p in points), (p["timestamp"] for p in points),
+        dtype=dtype,
+    )
+    return unpack_columns(packed.xs, packed.ys, packed.ts, dtype=packed.dtype, compression=packed.compression)
+
+
+def _store_plan(plan_id, body, dtype):
+    """Stores a planned request directly, bypassing the PLAN_DTYPE default."""
+    payload = schemas.CoverageRequest(**body)
+    cols = _full_columns(body["wall_width"], body["wall_height"], body["obstacles"], body["step"], dtype)
+    db = SessionLocal()
+    try:
+        status = crud.save_packed_plan(
+            db, plan_id, pack_columns(cols.xs, cols.ys, cols.ts, dtype=dtype),
+            request_hash=canonical_request_hash(payload), request=json.dumps(canonical_request(payload)),
+        )
+    finally:
+        db.close()
+    assert status["status"] == "success", status
+    return status.get("plan_id", plan_id)
+
+
+def _xy(points):
+    return [(p["x"], p["y"]) for p in points]
+
+
+# Inverted and zero-size obstacles: the zig-zag test x <= px <= x + width
+# never matches a negative extent, and a zero one blocks a single line.
+DEGENERATE_OBSTACLES = [
+    [_obstacle(2, 0, -1, 1)],
+    [_obstacle(0.5, 2, 1, -1)],
+    [_obstacle(1, 1, -0.5, -0.5), _obstacle(0.5, 0.5, 1, 1)],
+    [_obstacle(0.5, 0.5, 0, 0)],
+    [_obstacle(1.5, 0, 0, 3)],
+]
+
+
+def _planner_cases(seed, count):
+    rng = random.Random(seed)
+    for _ in range(count):
+        wall_width, wall_height = rng.uniform(1, 8), rng.uniform(1, 6)
+        step = rng.choice([0.05, 0.1, 0.2, 0.25, 0.3])
+        yield wall_width, wall_height, _random_obstacles(rng, wall_width, wall_height, rng.randint(0, 6)), step
+
+
+# ------------------------------------------------------------
+# NumPy planner engine (user-001)
+# ------------------------------------------------------------
+def test_numpy_planner_matches_python():
+    pytest.importorskip("numpy")
+    for wall_width, wall_height, obstacles, step in _planner_cases(1, 40):
+        python = generate_coverage_path(wall_width, wall_height, obstacles, step, engine="python")["points"]
+        vectorized = generate_coverage_path(wall_width, wall_height, obstacles, step, engine="numpy")["points"]
+        assert _xy(vectorized) == _xy(python)
+        assert [p["timestamp"] - vectorized[0]["timestamp"] for p in vectorized] == pytest.approx(
+            [p["timestamp"] - python[0]["timestamp"] for p in python]
+        )
+
+
+# ------------------------------------------------------------
+# Scanline segment planner (user-002)
+# ------------------------------------------------------------
+def test_segment_planner_matches_python():
+    cases = list(_planner_cases(2, 40)) + [(3, 3, obstacles, 0.5) for obstacles in DEGENERATE_OBSTACLES]
+    for wall_width, wall_height, obstacles, step in cases:
+        python = generate_coverage_path(wall_width, wall_height, obstacles, step, engine="python")["points"]
+        plan = generate_coverage_segments(wall_width, wall_height, obstacles, step)
+        points = list(iter_segment_points(plan["segments"], wall_width, step, start_time=0.0))
+        assert plan["point_count"] == len(python)
+        assert _xy(points) == _xy(python)
+
+
+def test_segments_endpoint_stores_the_zigzag_points(client):
+    # ✅ /segments and /api/coverage/ share one stored plan per request hash
+    body = {"wall_width": 3.5, "wall_height": 3, "step": 0.5, "obstacles": [_obstacle(2, 0, -1, 1)]}
+    plan = client.post("/api/coverage/segments", json=body).json()
+    expected = generate_coverage_path(3.5, 3, body["obstacles"], 0.5, engine="python")["points"]
+    assert plan["point_count"] == len(expected)
+    assert _xy(client.get(f"/api/trajectory/{plan['plan_id']}").json()) == _xy(expected)
+    assert client.post("/api/coverage/", json=body).json()["plan_id"] == plan["plan_id"]
+
+
+# ------------------------------------------------------------
+# Packed plan storage (user-003)
+# ------------------------------------------------------------
+@pytest.mark.parametrize("dtype", ["f8", "f4"])
+@pytest.mark.parametrize("compression", ["zlib", None])
+def test_pack_columns_round_trip(dtype, compression):
+    xs, ys, ts = [0.0, 0.25, 1.125, 3.5], [0.0, 0.0, 0.5, 0.5], [1.0e9, 1.0e9 + 0.01, 1.0e9 + 0.02, 1.0e9 + 0.03]
+    packed = pack_columns(xs, ys, ts, dtype=dtype, compression=compression)
+    cols = unpack_columns(packed.xs, packed.ys, packed.ts, dtype=packed.dtype, compression=packed.compression)
+    assert packed.count == len(cols) == 4
+    assert list(cols.xs) == xs and list(cols.ys) == ys
+    assert list(cols.ts) == ts  # timestamps always stay float64
+
+
+def test_legacy_rows_migrate_to_packed_plan(client):
+    plan_id = f"legacy-{uuid.uuid4()}"
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    legacy = [(round(i * 0.25, 3), round((i // 4) * 0.25, 3)) for i in range(10)]
+    db = SessionLocal()
+    try:
+        db.add_all(
+            models.Trajectory(plan_id=plan_id, x=x, y=y, timestamp=start + timedelta(seconds=i * 0.01))
+            for i, (x, y) in enumerate(legacy)
+        )
+        db.commit()
+        assert migrate_trajectories_to_plans(db) >= 1
+        plan = db.get(models.Plan, plan_id)
+        assert plan.storage == "packed"
+        assert plan.point_count == len(legacy)
+        assert db.query(models.Trajectory).filter_by(plan_id=plan_id).count() == 0
+    finally:
+        db.close()
+
+    points = client.get(f"/api/trajectory/{plan_id}").json()
+    assert _xy(points) == legacy
+    assert points[1]["timestamp"] - points[0]["timestamp"] == pytest.approx(0.01)
+
+
+# ------------------------------------------------------------
+# Chunked row inserts (user-004)
+# ------------------------------------------------------------
+def test_create_trajectories_inserts_in_chunks(client, monkeypatch):
+    plan_id = f"rows-{uuid.uuid4()}"
+    points = [{"x": i * 0.25, "y": 0.5, "timestamp": 1.0e9 + i * 0.01} for i in range(10)]
+    db = SessionLocal()
+    try:
+        executes = []
+        execute = db.execute
+
+        def counting_execute(*args, **kwargs):
+            executes.append(args)
+            return execute(*args, **kwargs)
+
+        monkeypatch.setattr(db, "execute", counting_execute)
+        # ✅ The chunk size TRAJECTORY_INSERT_CHUNK sets by default, made small
+        status = crud.create_trajectories(db, plan_id, points + [{"x": 1.0}, "bad"], chunk_size=3)
+        monkeypatch.undo()
+        assert status["status"] == "success"
+        assert status["count"] == 10
+        assert status["rows_per_sec"] > 0
+        assert len(executes) == 4  # 3 + 3 + 3 + 1 rows
+        stored = db.query(models.Trajectory).filter_by(plan_id=plan_id).order_by(models.Trajectory.id).all()
+        assert [(t.x, t.y) for t in stored] == [(p["x"], p["y"]) for p in points]
+        assert len({t.created_at for t in stored}) <= 4  # one created_at per chunk
+    finally:
+        db.close()
+
+
+def test_create_trajectories_rejects_empty_input(client):
+    db = SessionLocal()
+    try:
+        assert crud.create_trajectories(db, "empty", [])["status"] == "error"
+        assert crud.create_trajectories(db, "empty", [{"y": 1.0}])["status"] == "error"
+    finally:
+        db.close()
+
+
+# ------------------------------------------------------------
+# Plan cache (user-005)
+# ------------------------------------------------------------
+class _Sized:
+    """A cached value with a known estimate_size()."""
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_cache_evicts_least_recently_used_at_max_entries():
+    lru = SimpleCache(max_entries=2, shards=1, sweep_interval=0, name="test-entries")
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # a is now the most recently used
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+
+def test_cache_evicts_by_estimated_bytes():
+    item = sys.getsizeof(_Sized(0)) + 1000
+    lru = SimpleCache(max_entries=100, max_bytes=int(item * 2.5), shards=1, sweep_interval=0, name="test-bytes")
+    lru.set("a", _Sized(1000))
+    lru.set("b", _Sized(1000))
+    lru.set("c", _Sized(1000))
+    assert lru.get("a") is None
+    assert lru.get("b") is not None and lru.get("c") is not None
+    lru.set("huge", _Sized(item * 10))  # larger than the whole cache: not stored, nothing evicted
+    assert lru.get("huge") is None
+    stats = lru.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 2 * item, 1)
+
+
+def test_cache_sweeper_drops_expired_entries():
+    lru = SimpleCache(shards=2, sweep_interval=0.05, name="test-sweep")
+    try:
+        lru.set("short", 1, ttl_seconds=0.05)
+        lru.set("long", 2, ttl_seconds=60)
+        deadline = time.time() + 2
+        while lru.stats()["entries"] > 1 and time.time() < deadline:
+            time.sleep(0.05)
+        stats = lru.stats()
+        # ✅ Removed by the sweep thread, without a get() touching it
+        assert (stats["entries"], stats["expirations"], stats["misses"]) == (1, 1, 0)
+        assert lru.get("long") == 2
+    finally:
+        lru.close()
+
+
+def test_cache_counts_hits_misses_and_expirations():
+    lru = SimpleCache(shards=4, sweep_interval=0, name="test-counters")
+    lru.set("a", 1)
+    lru.set("gone", 2, ttl_seconds=-1)
+    lru.get("a")
+    lru.get("a")
+    lru.get("missing")
+    lru.get("gone")  # expired on access: a miss and an expiration
+    stats = lru.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (2, 2, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+# ------------------------------------------------------------
+# Stored plan reuse (user-006)
+# ------------------------------------------------------------
+def test_stored_plan_is_reused_after_cache_expiry(client):
+    body = {"wall_width": 2.75, "wall_height": 1.25, "step": 0.25, "obstacles": [_obstacle(1, 0.25, 0.5, 0.5)]}
+    first = client.post("/api/coverage/", json=body).json()
+    cache.cache.clear()  # as if the in-memory entry had expired (or another worker planned it)
+    second = client.post("/api/coverage/", json=body).json()
+    assert second["plan_id"] == first["plan_id"]
+    assert _xy(second["points"]) == _xy(first["points"])
+
+    db = SessionLocal()
+    try:
+        key = canonical_request_hash(schemas.CoverageRequest(**body))
+        assert db.query(models.Plan).filter_by(request_hash=key).count() == 1
+    finally:
+        db.close()
+
+
+# ------------------------------------------------------------
+# Request coalescing (user-007)
+# ------------------------------------------------------------
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_singleflight_runs_concurrent_calls_once():
+    flight, callers = SingleFlight(), 8
+
+    def work():
+        # ✅ Keep the first call running until every other caller has joined it
+        assert _wait_for(lambda: flight.stats()["coalesced"] == callers - 1)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(lambda _: flight.do("key", work), range(callers)))
+
+    assert len({id(r) for r in results}) == 1
+    assert flight.stats() == {"executed": 1, "coalesced": callers - 1, "in_flight": 0}
+
+
+def test_singleflight_shares_the_error():
+    flight, callers = SingleFlight(), 4
+
+    def work():
+        _wait_for(lambda: flight.stats()["coalesced"] == callers - 1)
+        raise ValueError("planner failed")
+
+    def call(_):
+        try:
+            flight.do("key", work)
+        except ValueError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        assert list(pool.map(call, range(callers))) == ["planner failed"] * callers
+    assert flight.stats()["executed"] == 1
+
+
+def test_concurrent_identical_coverage_requests_plan_once(client, monkeypatch):
+    flight, callers = SingleFlight(), 6
+    plan_and_store = coverage_routes._plan_and_store
+
+    def slow_plan_and_store(*args):
+        _wait_for(lambda: flight.stats()["coalesced"] == callers - 1)
+        return plan_and_store(*args)
+
+    monkeypatch.setattr(coverage_routes, "planning_flight", flight)
+    monkeypatch.setattr(coverage_routes, "_plan_and_store", slow_plan_and_store)
+    body = {"wall_width": 4.25, "wall_height": 1.75, "step": 0.25, "obstacles": []}
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        responses = list(pool.map(lambda _: client.post("/api/coverage/", json=body), range(callers)))
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()["plan_id"] for r in responses}) == 1
+    assert flight.stats()["executed"] == 1
+    assert flight.stats()["coalesced"] == callers - 1
+
+
+# ------------------------------------------------------------
+# Playback protocol (user-011)
+# ------------------------------------------------------------
+WS_ORIGIN = {"origin": "http://localhost:5173"}
+
+
+def _play_plan(client, wall_width):
+    body = {"wall_width": wall_width, "wall_height": 1.0, "step": 0.25, "obstacles": []}
+    plan_id = client.post("/api/coverage/", json=body).json()["plan_id"]
+    points = client.get(f"/api/trajectory/{plan_id}").json()
+    return plan_id, [[p["x"], p["y"], p["timestamp"]] for p in points]
+
+
+def _frames_until_close(ws):
+    frames = []
+    try:
+        while True:
+            frames.append(ws.receive_json())
+    except WebSocketDisconnect:
+        return frames
+
+
+def test_play_batches_json_frames(client):
+    plan_id, points = _play_plan(client, 2.25)
+    with client.websocket_connect(f"/api/player/ws/play/{plan_id}?batch=7&speed=1000", headers=WS_ORIGIN) as ws:
+        frames = _frames_until_close(ws)
+    assert [f["index"] for f in frames] == list(range(0, len(points), 7))
+    assert all(f["total"] == len(points) for f in frames)
+    assert [p for f in frames for p in f["points"]] == points
+
+
+def test_play_binary_frames_carry_a_header(client):
+    plan_id, points = _play_plan(client, 2.5)
+    received = []
+    with client.websocket_connect(f"/api/player/ws/play/{plan_id}?batch=8&encoding=binary&speed=1000", headers=WS_ORIGIN) as ws:
+        while len(received) < len(points):
+            frame = ws.receive_bytes()
+            start, count, total = BINARY_HEADER.unpack_from(frame)
+            values = array("d", frame[BINARY_HEADER.size:])
+            assert (start, total) == (len(received), len(points))
+            assert len(values) == 3 * count
+            received += [list(values[i:i + 3]) for i in range(0, len(values), 3)]
+    assert received == points
+
+
+def test_play_seek_jumps_to_the_index(client):
+    plan_id, points = _play_plan(client, 2.75)
+    with client.websocket_connect(f"/api/player/ws/play/{plan_id}?speed=0.5", headers=WS_ORIGIN) as ws:
+        assert ws.receive_json()["index"] == 0
+        ws.send_json({"action": "seek", "index": len(points) - 3})
+        ws.send_json({"action": "speed", "value": 1000})
+        indices = [f["index"] for f in _frames_until_close(ws)]
+    # ✅ At most the frame already due slips out before the jump
+    assert indices[-3:] == list(range(len(points) - 3, len(points)))
+    assert len(indices) <= 4
+
+
+def test_play_pause_and_resume(client):
+    plan_id, points = _play_plan(client, 3.25)
+    with client.websocket_connect(f"/api/player/ws/play/{plan_id}?speed=0.5", headers=WS_ORIGIN) as ws:
+        frames = [ws.receive_json()]
+        ws.send_json({"action": "pause"})
+        ws.send_json({"action": "bogus"})
+        while "error" not in (message := ws.receive_json()):
+            frames.append(message)
+        assert message == {"error": "unknown action: bogus"}
+        # ✅ Paused: the one frame that may have been in flight, then nothing
+        assert len(frames) <= 2
+        time.sleep(0.3)
+        ws.send_json({"action": "speed", "value": 1000})
+        ws.send_json({"action": "speed", "value": -1})
+        assert ws.receive_json() == {"error": f"speed must be in (0, {MAX_SPEED}]"}
+        ws.send_json({"action": "resume"})
+        frames += _frames_until_close(ws)
+    assert [f["index"] for f in frames] == list(range(len(points)))
+
+
+def test_play_ends_when_the_control_reader_fails(client):
+    plan_id, points = _play_plan(client, 3.5)
+    with client.websocket_connect(f"/api/player/ws/play/{plan_id}?speed=0.5", headers=WS_ORIGIN) as ws:
+        ws.receive_json()
+        # ✅ A binary control message stops the reader; playback must not run on unsteerable
+        ws.send_bytes(b"\x00")
+        frames = []
+        with pytest.raises(WebSocketDisconnect) as closed:
+            while True:
+                frames.append(ws.receive_json())
+    assert closed.value.code == 1011
+    assert len(frames) < len(points) - 1
+
+
+# ------------------------------------------------------------
+# Shared playback (user-012)
+# ------------------------------------------------------------
+class _FakePlanStream:
+    """Stands in for PlanStream: "missing" has no points, "slow-*" takes a while to open."""
+    opened = []
+
+    def __init__(self, plan_id):
+        self.plan_id = plan_id
+        self.total = 0
+
+    async def open(self):
+        _FakePlanStream.opened.append(self.plan_id)
+        if self.plan_id.startswith("slow"):
+            await asyncio.sleep(0.3)
+        self.total = 0 if self.plan_id == "missing" else 40
+        return self.total > 0
+
+    async def read(self, start, count):
+        xs = array("d", range(start, min(start + count, self.total)))
+        return xs, xs, xs
+
+
+async def _drain(sub):
+    frames = []
+    while (frame := await sub.queue.get()) is not None:
+        frames.append(frame)
+    return frames
+
+
+def test_watchers_share_one_stream_opened_outside_the_hub_lock(monkeypatch):
+    monkeypatch.setattr(broadcast_utils, "PlanStream", _FakePlanStream)
+    _FakePlanStream.opened = []
+    hub = BroadcastHub()
+
+    async def timed(plan_id):
+        start = time.perf_counter()
+        sub = await hub.subscribe(plan_id, 1, "json", 50.0)
+        return sub, time.perf_counter() - start
+
+    async def watch():
+        (a, _), (b, _), (fast, fast_wait), (missing, _) = await asyncio.gather(
+            timed("slow-plan"), timed("slow-plan"), timed("fast-plan"), timed("missing"),
+        )
+        stats = hub.stats()
+        frames = await asyncio.gather(_drain(a), _drain(b), _drain(fast))
+        for sub in (a, b, fast):
+            await hub.unsubscribe(sub)
+        return a, b, missing, fast_wait, stats, frames
+
+    a, b, missing, fast_wait, stats, (frames_a, frames_b, frames_fast) = asyncio.run(watch())
+    # ✅ One open and one producer for both viewers of the slow plan
+    assert _FakePlanStream.opened.count("slow-plan") == 1
+    assert a.broadcast is b.broadcast
+    assert (stats["streams"], stats["subscribers"]) == (2, 3)
+    assert frames_a == frames_b and len(frames_a) == 40 and len(frames_fast) == 40
+    # ✅ The slow open did not hold up another plan's viewer
+    assert fast_wait < 0.2
+    assert missing is None
+    assert hub.stats()["streams"] == 0
+
+
+def test_slow_watcher_drops_frames_instead_of_stalling(monkeypatch):
+    monkeypatch.setattr(broadcast_utils, "PlanStream", _FakePlanStream)
+    hub = BroadcastHub(queue_size=4)
+
+    async def watch():
+        fast = await hub.subscribe("plan", 1, "json", 50.0)
+        slow = await hub.subscribe("plan", 1, "json", 50.0)
+        frames = await asyncio.wait_for(_drain(fast), timeout=5)
+        backlog = [slow.queue.get_nowait() for _ in range(slow.queue.qsize())]
+        await hub.unsubscribe(fast)
+        await hub.unsubscribe(slow)
+        return frames, slow, backlog
+
+    frames, slow, backlog = asyncio.run(watch())
+    assert [json.loads(f)["index"] for f in frames] == list(range(40))
+    # ✅ The unread viewer kept only the newest frames and the end marker
+    assert slow.dropped == 41 - 4
+    assert backlog[-1] is None
+    assert [json.loads(f)["index"] for f in backlog[:-1]] == [37, 38, 39]
+
+
+# ------------------------------------------------------------
+# Streaming responses (user-013)
+# ------------------------------------------------------------
+@pytest.mark.parametrize("mode", ["ndjson", "array"])
+def test_streamed_plan_equals_the_full_plan(client, monkeypatch, mode):
+    monkeypatch.setattr(trajectory_routes, "STREAM_BATCH", 7)
+    body = {"wall_width": 4.25, "wall_height": 2.0, "step": 0.25, "obstacles": [_obstacle(1, 0.5, 1, 0.75)]}
+    packed_id = client.post("/api/coverage/", json=body).json()["plan_id"]
+    rows_id = f"rows-{uuid.uuid4()}"
+    db = SessionLocal()
+    try:
+        crud.create_trajectories(db, rows_id, [{"x": i * 0.5, "y": 1.0, "timestamp": 1.0e9 + i} for i in range(30)])
+    finally:
+        db.close()
+
+    for plan_id in (packed_id, rows_id):
+        full = client.get(f"/api/trajectory/{plan_id}").json()
+        response = client.get(f"/api/trajectory/{plan_id}", params={"stream": mode})
+        assert response.status_code == 200
+        if mode == "ndjson":
+            assert response.headers["content-type"] == "application/x-ndjson"
+            streamed = [json.loads(line) for line in response.text.splitlines()]
+        else:
+            streamed = response.json()
+        # ✅ Several STREAM_BATCH chunks join into exactly the unstreamed body
+        assert len(full) > 7 * 3
+        assert streamed == full
+    assert client.get("/api/trajectory/no-such-plan", params={"stream": mode}).status_code == 404
+
+
+# ------------------------------------------------------------
+# Paged trajectories (user-014)
+# ------------------------------------------------------------
+def test_plan_pages_return_every_point_once(client):
+    body = {"wall_width": 3, "wall_height": 2, "step": 0.25, "obstacles": [_obstacle(1, 0.5, 0.5, 0.5)]}
+    plan = client.post("/api/coverage/", json=body).json()
+
+    ids, points, cursor = [], [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/api/trajectory/{plan['plan_id']}", params=params).json()
+        assert page["total"] == len(plan["points"])
+        ids += [p["id"] for p in page["trajectories"]]
+        points += page["trajectories"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert ids == list(range(1, len(plan["points"]) + 1))
+    assert _xy(points) == _xy(plan["points"])
+
+
+def test_recent_feed_pages_return_every_point_once(client):
+    for width in (2, 2.5, 3):
+        client.post("/api/coverage/", json={"wall_width": width, "wall_height": 1, "step": 0.25, "obstacles": []})
+
+    seen, cursor, total = [], None, None
+    while True:
+        params = {"paged": "true", "limit": 13, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/trajectory/recent", params=params).json()
+        if cursor is None:
+            total = page["total"]
+        else:
+            assert page["total"] is None  # counted on the first page only
+        seen += [(p["plan_id"], p["id"]) for p in page["trajectories"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == total
+
+
+# ------------------------------------------------------------
+# Accept negotiation (user-015)
+# ------------------------------------------------------------
+@pytest.mark.parametrize("accept", [None, "application/json", "application/vnd.wallplan.columnar+json"])
+def test_negotiated_routes_always_send_vary(client, accept):
+    headers = {"accept": accept} if accept else {}
+    body = {"wall_width": 3, "wall_height": 2, "step": 0.25, "obstacles": []}
+    r = client.post("/api/coverage/", json=body, headers=headers)
+    plan_id = r.json()["plan_id"] if accept != "application/vnd.wallplan.columnar+json" else r.headers["X-Plan-Id"]
+    responses = [
+        r,
+        client.get(f"/api/trajectory/{plan_id}", headers=headers),
+        client.get(f"/api/trajectory/{plan_id}/lod", params={"points": 10}, headers=headers),
+        client.get(f"/api/trajectory/{plan_id}/region", params={"min_x": 0, "min_y": 0, "max_x": 1, "max_y": 1}, headers=headers),
+    ]
+    for response in responses:
+        assert response.status_code == 200
+        assert response.headers["vary"] == "Accept, Accept-Encoding"
+
+
+# ------------------------------------------------------------
+# Planning jobs (user-008)
+# ------------------------------------------------------------
+def test_job_timeout_excludes_time_queued():
+    manager = JobManager(max_workers=1, timeout=1.0)
+
+    async def run_all():
+        return await asyncio.gather(*(manager.run(time.sleep, 0.4) for _ in range(4)), return_exceptions=True)
+
+    try:
+        # ✅ Four jobs take ~1.6 s on one worker, but none runs longer than 1 s
+        assert asyncio.run(run_all()) == [None] * 4
+    finally:
+        manager.shutdown()
+
+
+def test_cancel_while_persisting_keeps_the_stored_plan():
+    manager = JobManager(max_workers=1, timeout=5.0)
+
+    def finish(_):
+        time.sleep(0.3)
+        return {"plan_id": "stored-plan", "point_count": 1}
+
+    async def cancel_while_persisting():
+        job = manager.submit(None, time.sleep, (0,), finish)
+        while job.status != "persisting":
+            await asyncio.sleep(0.01)
+        return await manager.cancel(job.job_id)
+
+    try:
+        # ✅ The plan is already being saved, so the job finishes instead
+        job = asyncio.run(cancel_while_persisting())
+        assert job.status == "done"
+        assert job.plan_id == "stored-plan"
+    finally:
+        manager.shutdown()
+
+
+# ------------------------------------------------------------
+# Batch planning (user-009)
+# ------------------------------------------------------------
+def test_batch_dedups_and_reports_errors_per_item(client):
+    wall = {"wall_width": 3.25, "wall_height": 2.0, "step": 0.5, "obstacles": []}
+    blocked = {"wall_width": 2.0, "wall_height": 2.0, "step": 0.5, "obstacles": [_obstacle(0, 0, 2, 2)]}
+    body = {"walls": [wall, blocked, dict(wall)]}
+
+    first = client.post("/api/coverage/batch", json=body).json()
+    created, error, duplicate = first["items"]
+    assert (first["created"], first["reused"], first["failed"]) == (1, 1, 1)
+    assert created["status"] == "created"
+    assert error == {**error, "status": "error", "error": "No valid coverage path generated."}
+    assert duplicate["status"] == "duplicate" and duplicate["plan_id"] == created["plan_id"]
+
+    # ✅ A second batch reuses the stored plan instead of planning again
+    second = client.post("/api/coverage/batch", json=body).json()
+    assert second["items"][0]["status"] == "existing"
+    assert second["items"][0]["plan_id"] == created["plan_id"]
+
+
+def test_batch_fail_on_error_rejects_the_batch(client):
+    wall = {"wall_width": 3.5, "wall_height": 2.0, "step": 0.5, "obstacles": []}
+    blocked = {"wall_width": 2.0, "wall_height": 2.0, "step": 0.5, "obstacles": [_obstacle(0, 0, 2, 2)]}
+    response = client.post("/api/coverage/batch", json={"walls": [wall, blocked], "fail_on_error": True})
+    assert response.status_code == 422
+    assert [f["index"] for f in response.json()["detail"]["failed"]] == [1]
+    # ✅ Nothing from a rejected batch is stored
+    retry = client.post("/api/coverage/batch", json={"walls": [wall]}).json()
+    assert retry["items"][0]["status"] == "created"
+
+
+def test_batch_durations_exclude_time_queued(client, monkeypatch):
+    manager = JobManager(max_workers=1)
+    monkeypatch.setattr(coverage_routes, "job_manager", manager)
+    walls = [{"wall_width": 3 + i / 10, "wall_height": 3, "step": 0.01, "obstacles": []} for i in range(4)]
+    try:
+        start = time.perf_counter()
+        items = client.post("/api/coverage/batch", json={"walls": walls}).json()["items"]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        manager.shutdown()
+    # ✅ One worker runs the walls back to back, so their own durations fit in the call
+    assert all(item["status"] == "created" for item in items)
+    assert sum(item["duration_ms"] for item in items) <= elapsed_ms
+
+
+# ------------------------------------------------------------
+# Level of detail (user-016)
+# ------------------------------------------------------------
+def _max_deviation(full, kept):
+    """Largest distance from a full-path point to the kept polyline segment spanning it."""
+    positions, j = [], 0
+    for i, p in enumerate(full):
+        if j < len(kept) and p == kept[j]:
+            positions.append(i)
+            j += 1
+    assert len(positions) == len(kept)  # kept is a subsequence of the full path
+    worst = 0.0
+    for a, b in zip(positions, positions[1:]):
+        (ax, ay), (bx, by) = full[a][:2], full[b][:2]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        for px, py, _ in full[a + 1:b]:
+            t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq)) if length_sq else 0.0
+            worst = max(worst, ((px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2) ** 0.5)
+    return worst
+
+
+def test_lod_levels_stay_within_tolerance(client):
+    rng = random.Random(16)
+    body = {"wall_width": 6, "wall_height": 16, "step": 0.05, "obstacles": _random_obstacles(rng, 6, 16, 60)}
+    plan_id = client.post("/api/coverage/", json=body).json()["plan_id"]
+    full = [(p["x"], p["y"], p["timestamp"]) for p in client.get(f"/api/trajectory/{plan_id}").json()]
+
+    def kept(params):
+        lod = client.get(f"/api/trajectory/{plan_id}/lod", params=params).json()
+        assert lod["count"] == len(lod["points"])
+        return lod, [(p["x"], p["y"], p["timestamp"]) for p in lod["points"]]
+
+    levels = kept({})[0]["levels"]
+    assert len(levels) >= 2
+    assert levels[-1]["tolerance"] == 0.0
+    for level in levels:
+        lod, points = kept({"level": level["level"]})
+        assert lod["count"] == level["points"]
+        assert points[0] == full[0] and points[-1] == full[-1]
+        assert _max_deviation(full, points) <= level["tolerance"] + 1e-9
+    # ✅ Coarser levels keep fewer points and allow more deviation
+    assert [lv["points"] for lv in levels] == sorted(lv["points"] for lv in levels)
+    assert [lv["tolerance"] for lv in levels] == sorted((lv["tolerance"] for lv in levels), reverse=True)
+
+    for tolerance in (0.01, 0.15, 0.5, 2.0):
+        _, points = kept({"tolerance": tolerance})
+        assert _max_deviation(full, points) <= tolerance + 1e-9
+
+
+# ------------------------------------------------------------
+# Region queries (user-017)
+# ------------------------------------------------------------
+def test_region_matches_a_brute_force_filter(client):
+    rng = random.Random(17)
+    body = {"wall_width": 5, "wall_height": 4, "step": 0.1, "obstacles": _random_obstacles(rng, 5, 4, 6)}
+    plan_id = client.post("/api/coverage/", json=body).json()["plan_id"]
+    full = client.get(f"/api/trajectory/{plan_id}").json()
+
+    boxes = [
+        (0, 0, 5, 4),  # the whole wall
+        (1.0, 1.0, 2.0, 1.5),  # edges on sample lines
+        (2.5, 2.5, 2.5, 2.5),  # a single point
+        (-3, -3, -1, -1),  # outside the wall
+        (4.95, -1, 9, 9),  # past the right edge
+    ]
+    for _ in range(25):
+        x0, x1 = sorted(round(rng.uniform(-0.5, 5.5), 2) for _ in range(2))
+        y0, y1 = sorted(round(rng.uniform(-0.5, 4.5), 2) for _ in range(2))
+        boxes.append((x0, y0, x1, y1))
+
+    for min_x, min_y, max_x, max_y in boxes:
+        params = {"min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y}
+        region = client.get(f"/api/trajectory/{plan_id}/region", params=params).json()
+        expected = [
+            {"index": i, **p}
+            for i, p in enumerate(full)
+            if min_x <= p["x"] <= max_x and min_y <= p["y"] <= max_y
+        ]
+        assert region["total"] == len(full)
+        assert region["count"] == len(expected)
+        assert region["points"] == expected
+
+    inverted = {"min_x": 2, "min_y": 0, "max_x": 1, "max_y": 1}
+    assert client.get(f"/api/trajectory/{plan_id}/region", params=inverted).status_code == 400
+
+
+# ------------------------------------------------------------
+# Cell decomposition planner (user-019)
+# ------------------------------------------------------------
+def test_cell_decomposition_covers_every_free_point_once():
+    cases = list(_planner_cases(19, 40)) + [(3, 3, obstacles, 0.5) for obstacles in DEGENERATE_OBSTACLES]
+    for wall_width, wall_height, obstacles, step in cases:
+        plan = generate_cell_decomposition_path(wall_width, wall_height, obstacles, step, start_time=0.0)
+        # ✅ The zig-zag's own obstacle test, so inverted obstacles block nothing
+        free = [
+            (round(x, 3), round(y, 3))
+            for y in frange(0.0, wall_height, step)
+            for x in frange(0.0, wall_width, step)
+            if not any(
+                o["x"] <= round(x, 3) <= o["x"] + o["width"] and o["y"] <= y <= o["y"] + o["height"]
+                for o in obstacles
+            )
+        ]
+        covered = _xy(plan["points"])
+        assert len(covered) == len(set(covered)) == plan["point_count"]
+        assert set(covered) == set(free)
+
+
+# ------------------------------------------------------------
+# Metrics (user-020)
+# ------------------------------------------------------------
+def test_packed_writes_record_insert_metrics(client):
+    def written():
+        return REGISTRY.get_sample_value("trajectory_rows_inserted_total", {"storage": "packed"}) or 0.0
+
+    before = written()
+    body = {"wall_width": 4.75, "wall_height": 1.5, "step": 0.25, "obstacles": []}
+    single = len(client.post("/api/coverage/", json=body).json()["points"])
+    assert written() == before + single
+
+    walls = [{"wall_width": 2 + i / 4, "wall_height": 1.25, "step": 0.25, "obstacles": []} for i in range(7, 10)]
+    batch = client.post("/api/coverage/batch", json={"walls": walls}).json()
+    assert batch["created"] == 3
+    assert written() == before + single + sum(i["point_count"] for i in batch["items"])
+
+
+def test_instrument_pool_is_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    checked_out = DB_POOL_CHECKED_OUT.labels("idempotence-test")
+    try:
+        # ✅ A second startup in the same process must not stack listeners
+        instrument_pool(engine, "idempotence-test")
+        instrument_pool(engine, "idempotence-test")
+        with engine.connect():
+            assert checked_out._value.get() == 1
+        assert checked_out._value.get() == 0
+    finally:
+        engine.dispose()
+
+
+# ------------------------------------------------------------
+# Retention (user-024)
+# ------------------------------------------------------------
+def test_plan_purged_by_another_worker_is_not_served_from_cache(client):
+    body = {"wall_width": 3.75, "wall_height": 1.5, "step": 0.25, "obstacles": []}
+    plan_id = client.post("/api/coverage/", json=body).json()["plan_id"]
+    region = {"min_x": 0, "min_y": 0, "max_x": 1, "max_y": 1}
+    # ✅ Warm every per-plan cache in this process
+    assert client.post("/api/coverage/", json=body).json()["plan_id"] == plan_id
+    assert client.get(f"/api/trajectory/{plan_id}/lod").status_code == 200
+    assert client.get(f"/api/trajectory/{plan_id}/region", params=region).status_code == 200
+    assert client.get(f"/api/trajectory/{plan_id}", params={"limit": 5}).status_code == 200
+
+    # ✅ Another worker's purge: the row goes, this process's caches are not told
+    db = SessionLocal()
+    try:
+        db.query(models.Plan).filter_by(plan_id=plan_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get(f"/api/trajectory/{plan_id}/lod").status_code == 404
+    assert client.get(f"/api/trajectory/{plan_id}/region", params=region).status_code == 404
+    assert client.get(f"/api/trajectory/{plan_id}", params={"limit": 5}).status_code == 404
+    replanned = client.post("/api/coverage/", json=body).json()["plan_id"]
+    assert replanned != plan_id
+    assert client.get(f"/api/trajectory/{replanned}").status_code == 200
+
+
+# ------------------------------------------------------------
+# Incremental replan (user-018)
+# ------------------------------------------------------------
+@pytest.mark.parametrize("dtype", ["f8", "f4"])
+def test_replan_matches_full_plan(dtype):
+    rng = random.Random(18)
+    for _ in range(60):
+        wall_width, wall_height = rng.uniform(2, 6), rng.uniform(2, 5)
+        step = rng.choice([0.1, 0.2, 0.25])
+        obstacles = _random_obstacles(rng, wall_width, wall_height, rng.randint(0, 3))
+        added = _random_obstacles(rng, wall_width, wall_height, rng.randint(0, 2))
+        removed = [o for o in obstacles if rng.random() < 0.5]
+        new_obstacles = [o for o in obstacles if o not in removed] + added
+
+        old = _full_columns(wall_width, wall_height, obstacles, step, dtype)
+        expected = _full_columns(wall_width, wall_height, new_obstacles, step, dtype)
+        result = replan_columns(
+            wall_width, wall_height, step, new_obstacles, removed + added,
+            old.xs, old.ys, start_time=expected.ts[0] if len(expected) else 0.0,
+        )
+        packed = pack_columns(result["xs"], result["ys"], result["ts"], dtype=dtype)
+        got = unpack_columns(packed.xs, packed.ys, packed.ts, dtype=dtype, compression=packed.compression)
+
+        assert list(got.xs) == list(expected.xs)
+        assert list(got.ys) == list(expected.ys)
+        assert list(got.ts) == pytest.approx(list(expected.ts))
+
+
+def test_replan_endpoint_with_f4_storage(client, monkeypatch):
+    monkeypatch.setattr(coverage_routes, "PLAN_DTYPE", "f4")
+    body = {"wall_width": 4.5, "wall_height": 3, "step": 0.25, "obstacles": [_obstacle(1, 1, 0.5, 0.5)]}
+    plan_id = _store_plan(str(uuid.uuid4()), body, "f4")
+
+    added = _obstacle(2.5, 0.5, 0.5, 1.0)
+    r = client.post(f"/api/coverage/{plan_id}/replan", json={"add": [added], "remove": []})
+    assert r.status_code == 200, r.text
+    replanned = r.json()
+    assert replanned["parent_plan_id"] == plan_id
+    assert replanned["rows"]
+
+    expected = _full_columns(4.5, 3, body["obstacles"] + [added], 0.25, "f4")
+    points = client.get(f"/api/trajectory/{replanned['plan_id']}").json()
+    assert [(p["x"], p["y"]) for p in points] == pytest.approx(list(zip(expected.xs, expected.ys)))
+
+
+def test_replan_of_purged_plan_is_404(client, monkeypatch):
+    body = {"wall_width": 2, "wall_height": 2, "step": 0.5, "obstacles": []}
+    plan_id = client.post("/api/coverage/", json=body).json()["plan_id"]
+    # ✅ The plan disappears between the request lookup and the column read
+    monkeypatch.setattr(crud, "get_plan_columns", lambda db, plan_id: None)
+    r = client.post(f"/api/coverage/{plan_id}/replan", json={"add": [_obstacle(0.5, 0.5, 0.5, 0.5)], "remove": []})
+    assert r.status_code == 404
@@ -0,0 +1,104 @@
+# backend/app/utils/boot.py
+"""
+Startup timing.
+
+The app lifespan records each startup phase here. With STARTUP_TIMING=1
+the breakdown is logged once the app is ready to serve.
+
+`python -m app.utils.boot` measures a cold start end to end: the slowest
+imports of `app.main` (from `python -X importtime` in a fresh interpreter),
+then the import and every lifespan phase in this process. --fresh-db runs
+against a temporary SQLite file so schema creation is included.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+STARTUP_TIMING = os.getenv("STARTUP_TIMING", "0").lower() in ("1", "true", "yes")
+
+
+class BootTimer:
+    """Named startup phases and their durations, in order."""
+
+    def __init__(self):
+        self.phases = []  # (name, seconds)
+
+    def record(self, name: str, seconds: float):
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self) -> str:
+        total = sum(seconds for _, seconds in self.phases)
+        lines = [f"{name:<28}{seconds * 1000:10.1f} ms" for name, seconds in self.phases]
+        lines.append(f"{'total':<28}{total * 1000:10.1f} ms")
+        return "\n".join(lines)
+
+
+boot_timer = BootTimer()
+
+
+def import_profile(module: str = "app.main", top: int = 15) -> list:
+    """
+    (module, self µs, cumulative µs) for the `top` slowest imports of
+    `module` in a fresh interpreter, by cumulative time.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        rows.append((fields[2].rstrip(), int(fields[0]), int(fields[1])))
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows[:top]
+
+
+def _measure_boot():
+    """Imports app.main and runs its lifespan once; returns the phase report."""
+    import asyncio
+    from app.main import app
+    # ✅ Under `python -m` this file is __main__; the app records into app.utils.boot
+    from app.utils.boot import boot_timer as app_timer
+
+    async def run_lifespan():
+        async with app.router.lifespan_context(app):
+            pass
+
+    asyncio.run(run_lifespan())
+    return app_timer.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure where import and startup time goes.")
+    parser.add_argument("--fresh-db", action="store_true", help="use a temporary SQLite database")
+    parser.add_argument("--top", type=int, default=15, help="number of imports to list")
+    args = parser.parse_args()
+
+    if args.fresh_db:
+        import tempfile
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='wall-boot-'), 'boot.db')}"
+
+    print(f"Slowest imports of app.main (fresh interpreter, top {args.top}):")
+    print(f"  {'cumulative':>12}{'self':>10}  module")
+    for name, self_us, cumulative_us in import_profile(top=args.top):
+        print(f"  {cumulative_us / 1000:9.1f} ms{self_us / 1000:7.1f} ms  {name.strip()}")
+
+    report = _measure_boot()
+    print("\nImport and lifespan phases (this process):")
+    print(report)
@@ -0,0 +1,162 @@
+# backend/app/utils/broadcast.py
+
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from app.utils.logging import logger
+from app.utils.playback import POINT_INTERVAL, PlanStream, encode_binary_frame, encode_json_frame
+
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+class Subscriber:
+    """One viewer: a bounded queue of encoded frames (None marks the end)."""
+    def __init__(self, key: Tuple, queue_size: int):
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.broadcast: Optional["PlanBroadcast"] = None
+
+    def offer(self, frame):
+        """Enqueues without blocking; a full queue drops its oldest frame."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class PlanBroadcast:
+    """
+    One producer for a plan and playback format: reads and encodes each
+    frame once and fans it out to every subscriber. Viewers joining late
+    pick up from the current frame.
+    """
+    def __init__(self, key: Tuple, stream: PlanStream, batch: int, encoding: str, speed: float):
+        self.key = key
+        self.stream = stream
+        self.batch = batch
+        self.encoding = encoding
+        self.speed = speed
+        self.subscribers = set()
+        self.index = 0
+        self.frames_sent = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        total = self.stream.total
+        try:
+            while self.index < total and self.subscribers:
+                xs, ys, ts = await self.stream.read(self.index, self.batch)
+                if not xs:
+                    break
+                if self.encoding == "binary":
+                    frame = encode_binary_frame(self.index, total, xs, ys, ts)
+                else:
+                    frame = encode_json_frame(self.index, total, xs, ys, ts, self.batch)
+                for sub in list(self.subscribers):
+                    sub.offer(frame)
+                self.frames_sent += 1
+                self.index += len(xs)
+                await asyncio.sleep(POINT_INTERVAL * len(xs) / self.speed)
+        except Exception as e:
+            logger.error(f"🔥 Broadcast error for {self.stream.plan_id}: {e}")
+        finally:
+            for sub in list(self.subscribers):
+                sub.offer(None)
+
+
+class BroadcastHub:
+    """
+    Registry of live PlanBroadcasts keyed by (plan_id, batch, encoding, speed).
+    The lock only guards the registry; opening a plan reads the DB, so it
+    runs in a per-key task that concurrent viewers of that plan share.
+    """
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._broadcasts: Dict[Tuple, PlanBroadcast] = {}
+        self._opening: Dict[Tuple, asyncio.Task] = {}
+        self._lock = asyncio.Lock()
+
+    def _join(self, broadcast: PlanBroadcast) -> Subscriber:
+        sub = Subscriber(broadcast.key, self.queue_size)
+        sub.broadcast = broadcast
+        broadcast.subscribers.add(sub)
+        return sub
+
+    @staticmethod
+    async def _open(plan_id: str) -> Optional[PlanStream]:
+        stream = PlanStream(plan_id)
+        return stream if await stream.open() else None
+
+    async def subscribe(self, plan_id: str, batch: int, encoding: str, speed: float) -> Optional[Subscriber]:
+        """Joins (or starts) the broadcast. Returns None if the plan does not exist."""
+        key = (plan_id, batch, encoding, speed)
+        while True:
+            async with self._lock:
+                broadcast = self._broadcasts.get(key)
+                if broadcast is not None and not broadcast.task.done():
+                    return self._join(broadcast)
+                opening = self._opening.get(key)
+                if opening is None:
+                    opening = self._opening[key] = asyncio.create_task(self._open(plan_id))
+
+            try:
+                stream = await asyncio.shield(opening)
+            except Exception:
+                async with self._lock:
+                    if self._opening.get(key) is opening:
+                        del self._opening[key]
+                raise
+
+            async with self._lock:
+                if self._opening.get(key) is opening:
+                    # ✅ First viewer back starts the broadcast; the rest join it above
+                    del self._opening[key]
+                    if stream is None:
+                        return None
+                    broadcast = PlanBroadcast(key, stream, batch, encoding, speed)
+                    self._broadcasts[key] = broadcast
+                    sub = self._join(broadcast)
+                    broadcast.task = asyncio.create_task(broadcast.run())
+                    logger.info(f"📡 Started broadcast for plan {plan_id}")
+                    return sub
+            if stream is None:
+                return None
+
+    async def unsubscribe(self, sub: Subscriber):
+        async with self._lock:
+            broadcast = sub.broadcast
+            broadcast.subscribers.discard(sub)
+            if broadcast.subscribers:
+                return
+            if not broadcast.task.done():
+                broadcast.task.cancel()
+            if self._broadcasts.get(sub.key) is broadcast:
+                del self._broadcasts[sub.key]
+                logger.info(f"📴 Stopped broadcast for plan {sub.key[0]}")
+
+    def stats(self) -> dict:
+        streams = []
+        for (plan_id, batch, encoding, speed), broadcast in self._broadcasts.items():
+            depths = [sub.queue.qsize() for sub in broadcast.subscribers]
+            streams.append({
+                "plan_id": plan_id,
+                "batch": batch,
+                "encoding": encoding,
+                "speed": speed,
+                "subscribers": len(depths),
+                "index": broadcast.index,
+                "total": broadcast.stream.total,
+                "frames_sent": broadcast.frames_sent,
+                "max_queue_depth": max(depths, default=0),
+                "dropped_frames": sum(sub.dropped for sub in broadcast.subscribers),
+            })
+        return {
+            "streams": len(streams),
+            "subscribers": sum(s["subscribers"] for s in streams),
+            "details": streams,
+        }
+
+
+# ✅ Global broadcast hub instance
+hub = BroadcastHub()
@@ -1,33 +1,192 @@
 # backend/app/utils/cache.py
 
+import os
+import sys
 import time
-from threading import Lock
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+
+from app.utils.metrics import CACHE_LOOKUPS
+
+# Rough in-memory cost of one {x, y, timestamp} point dict (dict + 3 floats + refs)
+POINT_BYTES = 300
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_SHARDS = int(os.getenv("CACHE_SHARDS", "8"))
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "30"))
+LOD_CACHE_ENTRIES = int(os.getenv("LOD_CACHE_ENTRIES", "64"))
+COLUMNS_CACHE_ENTRIES = int(os.getenv("COLUMNS_CACHE_ENTRIES", "32"))
+COLUMNS_CACHE_BYTES = int(os.getenv("COLUMNS_CACHE_BYTES", str(64 * 1024 * 1024)))
+SPATIAL_CACHE_ENTRIES = int(os.getenv("SPATIAL_CACHE_ENTRIES", "32"))
+
+
+def estimate_size(value) -> int:
+    """Estimates the memory held by a cached value from its point count."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return sys.getsizeof(value) + nbytes
+    if isinstance(value, dict):
+        points = value.get("points")
+        if isinstance(points, list):
+            return sys.getsizeof(value) + sys.getsizeof(points) + len(points) * POINT_BYTES
+    return sys.getsizeof(value)
+
+
+class _Shard:
+    """One LRU segment of the cache with its own lock and counters."""
+    __slots__ = ("lock", "store", "bytes", "hits", "misses", "evictions", "expirations")
 
-class SimpleCache:
-    """A basic in-memory cache with TTL expiration."""
     def __init__(self):
-        self._store = {}
-        self._lock = Lock()
+        self.lock = Lock()
+        self.store = OrderedDict()  # key -> (value, expire_time, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class SimpleCache:
+    """
+    An in-memory LRU cache with TTL expiration, bounded by entry count and
+    estimated byte size.
+    Keys are spread over independently locked shards so concurrent requests
+    rarely contend; each shard gets an equal share of the limits. Expired
+    entries are dropped on access and by a background sweep thread.
+    """
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        shards: int = CACHE_SHARDS,
+        sweep_interval: float = CACHE_SWEEP_INTERVAL,
+        name: str = "plans",
+    ):
+        shards = max(1, shards)
+        self._shards = [_Shard() for _ in range(shards)]
+        self._max_entries = max(1, -(-max_entries // shards))
+        self._max_bytes = max(1, -(-max_bytes // shards))
+        self._sweep_interval = sweep_interval
+        self._sweeper = None
+        self._stop = Event()
+        self._start_lock = Lock()
+        self._hit_metric = CACHE_LOOKUPS.labels(name, "hit")
+        self._miss_metric = CACHE_LOOKUPS.labels(name, "miss")
+
+    def _shard(self, key) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _remove(self, shard: _Shard, key):
+        _, _, size = shard.store.pop(key)
+        shard.bytes -= size
 
     def set(self, key, value, ttl_seconds: float = 60.0):
+        self._ensure_sweeper()
         expire_time = time.time() + ttl_seconds
-        with self._lock:
-            self._store[key] = (value, expire_time)
+        size = estimate_size(value)
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.store:
+                self._remove(shard, key)
+            if size > self._max_bytes:
+                return  # larger than a whole shard; caching it would evict everything
+            shard.store[key] = (value, expire_time, size)
+            shard.bytes += size
+            while len(shard.store) > self._max_entries or shard.bytes > self._max_bytes:
+                oldest = next(iter(shard.store))
+                self._remove(shard, oldest)
+                shard.evictions += 1
 
     def get(self, key):
-        with self._lock:
-            item = self._store.get(key)
+        shard = self._shard(key)
+        with shard.lock:
+            item = shard.store.get(key)
             if not item:
+                shard.misses += 1
+                self._miss_metric.inc()
                 return None
-            value, expire_time = item
+            value, expire_time, _ = item
             if time.time() > expire_time:
-                del self._store[key]
+                self._remove(shard, key)
+                shard.expirations += 1
+                shard.misses += 1
+                self._miss_metric.inc()
                 return None
+            shard.store.move_to_end(key)
+            shard.hits += 1
+            self._hit_metric.inc()
             return value
 
+    def delete(self, key):
+        """Drops one entry if present."""
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.store:
+                self._remove(shard, key)
+
     def clear(self):
-        with self._lock:
-            self._store.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.store.clear()
+                shard.bytes = 0
+
+    def sweep(self) -> int:
+        """Drops all expired entries. Returns how many were removed."""
+        removed = 0
+        now = time.time()
+        for shard in self._shards:
+            with shard.lock:
+                expired = [k for k, (_, exp, _) in shard.store.items() if now > exp]
+                for key in expired:
+                    self._remove(shard, key)
+                shard.expirations += len(expired)
+                removed += len(expired)
+        return removed
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current size, summed over shards."""
+        totals = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "entries": 0, "bytes": 0}
+        for shard in self._shards:
+            with shard.lock:
+                totals["hits"] += shard.hits
+                totals["misses"] += shard.misses
+                totals["evictions"] += shard.evictions
+                totals["expirations"] += shard.expirations
+                totals["entries"] += len(shard.store)
+                totals["bytes"] += shard.bytes
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+        totals["max_entries"] = self._max_entries * len(self._shards)
+        totals["max_bytes"] = self._max_bytes * len(self._shards)
+        return totals
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None or self._sweep_interval <= 0:
+            return
+        with self._start_lock:
+            if self._sweeper is None:
+                self._sweeper = Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self._sweep_interval):
+            self.sweep()
+
+    def close(self):
+        """Stops the background sweep thread."""
+        self._stop.set()
 
 # ✅ Global cache instance
 cache = SimpleCache()
+
+# ✅ Level-of-detail pyramids per plan_id (see app.utils.simplify)
+lod_cache = SimpleCache(max_entries=LOD_CACHE_ENTRIES, shards=1, name="lod")
+
+# ✅ Spatial grid indexes per plan_id (see app.utils.spatial)
+spatial_cache = SimpleCache(max_entries=SPATIAL_CACHE_ENTRIES, shards=1, name="spatial")
+
+# ✅ Decoded packed columns per plan_id, so paging a plan decodes it once
+columns_cache = SimpleCache(
+    max_entries=COLUMNS_CACHE_ENTRIES, max_bytes=COLUMNS_CACHE_BYTES, shards=1, name="columns"
+)
@@ -1,19 +1,40 @@
 # backend/app/utils/coverage_planner.py
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Optional, Iterator
+from bisect import bisect_left, bisect_right
+import heapq
+import math
+from array import array
 import uuid
 import time
+from app.utils.optional import numpy, numpy_installed
+from app.utils.packing import PackedColumns, pack_columns
+
+if TYPE_CHECKING:  # numpy stays optional at runtime (see app.utils.optional)
+    import numpy as np
+
+# Grids with at least this many sample points are planned with the NumPy engine
+# when engine="auto". Below it, array setup costs more than the Python loop.
+NUMPY_MIN_GRID_POINTS = 20_000
+
 
 def generate_coverage_path(
     wall_width: float,
     wall_height: float,
     obstacles: List[Dict[str, float]],
-    step: float = 0.25
+    step: float = 0.25,
+    engine: str = "auto",
 ) -> Dict[str, any]:
     """
     Generate a boustrophedon (zig-zag) coverage path avoiding rectangular obstacles.
     Merges adjacent rows to avoid unreachable islands.
     Returns { plan_id, points: [{x, y, timestamp}] }
+
+    engine: "python", "numpy" or "auto" (NumPy once the grid reaches
+    NUMPY_MIN_GRID_POINTS samples). Both engines produce identical points.
     """
+    engine = _select_engine(wall_width, wall_height, step, engine)
+    if engine == "numpy":
+        return _generate_coverage_path_numpy(wall_width, wall_height, obstacles, step)
 
     def is_inside_obstacle(x, y):
         """Check if point lies inside any rectangular obstacle."""
@@ -52,6 +73,529 @@ def generate_coverage_path(
     return {"plan_id": plan_id, "points": points}
 
 
+def _select_engine(wall_width: float, wall_height: float, step: float, engine: str) -> str:
+    """Resolve engine="auto" from the grid size and NumPy availability."""
+    if engine not in ("auto", "python", "numpy"):
+        raise ValueError(f"Unknown planner engine: {engine}")
+    if engine == "numpy" and not numpy_installed():
+        raise ValueError("The numpy planner engine requires numpy to be installed.")
+    if engine != "auto":
+        return engine
+    if step <= 0:
+        return "python"
+    grid_points = (wall_width / step + 1) * (wall_height / step + 1)
+    # ✅ Small grids never import numpy at all
+    return "numpy" if grid_points >= NUMPY_MIN_GRID_POINTS and numpy_installed() else "python"
+
+
+def _frange_array(start: float, stop: float, step: float) -> "np.ndarray":
+    """
+    Array equivalent of frange().
+    np.cumsum adds sequentially, so every value carries the same rounding
+    error as the repeated `x += step` of the generator.
+    """
+    if step == 0:
+        raise ValueError("Step cannot be zero.")
+    np = numpy()
+    count = int(abs(stop - start) / abs(step)) + 3
+    values = np.full(count, step, dtype=np.float64)
+    values[0] = start
+    values = np.cumsum(values)
+    keep = values <= stop if step > 0 else values >= stop
+    return values[keep]
+
+
+def _round3(values: "np.ndarray") -> "np.ndarray":
+    """Round with Python's round() so results match the Python engine exactly."""
+    np = numpy()
+    return np.array([round(v, 3) for v in values.tolist()], dtype=np.float64)
+
+
+def _generate_coverage_path_numpy(
+    wall_width: float,
+    wall_height: float,
+    obstacles: List[Dict[str, float]],
+    step: float,
+    start_time: Optional[float] = None,
+) -> Dict[str, any]:
+    """
+    NumPy engine for generate_coverage_path.
+    Builds the row/column grid, the obstacle mask and the serpentine ordering
+    as whole-array operations instead of testing every point in Python.
+    """
+    np = numpy()
+    plan_id = str(uuid.uuid4())
+    timestamp = time.time() if start_time is None else start_time
+
+    ys = _frange_array(0.0, wall_height, step)
+    if ys.size == 0:
+        return {"plan_id": plan_id, "points": []}
+
+    # Even rows run left→right, odd rows right→left; each direction has its own columns.
+    cols_fwd = _round3(_frange_array(0.0, wall_width, step))
+    cols_rev = _round3(_frange_array(wall_width, 0.0, -step))
+    n_cols = max(cols_fwd.size, cols_rev.size)
+
+    grid_x = np.full((ys.size, n_cols), np.nan)
+    grid_x[0::2, :cols_fwd.size] = cols_fwd
+    grid_x[1::2, :cols_rev.size] = cols_rev
+    keep = ~np.isnan(grid_x)
+
+    # Obstacles are tested against the raw row y, only the output y is rounded.
+    for obs in obstacles:
+        ox, oy = obs["x"], obs["y"]
+        ox2, oy2 = ox + obs["width"], oy + obs["height"]
+        rows = np.nonzero((oy <= ys) & (ys <= oy2))[0]
+        if rows.size == 0:
+            continue
+        row_x = grid_x[rows]
+        keep[rows] &= ~((ox <= row_x) & (row_x <= ox2))
+
+    out_x = grid_x[keep]
+    out_y = np.broadcast_to(_round3(ys)[:, None], grid_x.shape)[keep]
+
+    # Timestamps advance by 0.01 per emitted point, accumulated like the Python loop.
+    out_t = np.full(out_x.size, 0.01, dtype=np.float64)
+    if out_t.size:
+        out_t[0] = timestamp
+        out_t = np.cumsum(out_t)
+
+    points = [
+        {"x": x, "y": y, "timestamp": t}
+        for x, y, t in zip(out_x.tolist(), out_y.tolist(), out_t.tolist())
+    ]
+    return {"plan_id": plan_id, "points": points}
+
+
+def generate_coverage_segments(
+    wall_width: float,
+    wall_height: float,
+    obstacles: List[Dict[str, float]],
+    step: float = 0.25,
+) -> Dict[str, any]:
+    """
+    Scanline variant of generate_coverage_path that returns free row segments
+    instead of sampled points.
+    A sweep line moves up the rows keeping a heap of the obstacles whose
+    vertical extent covers the current row, so each row only looks at the
+    obstacles crossing it. The free column runs between them become segments
+    {y, x_start, x_end, direction, count}; x_start/x_end are the first and last
+    sampled x of the run in travel order. iter_segment_points() expands them to
+    exactly the points generate_coverage_path would produce.
+    Returns { plan_id, step, point_count, segments }
+    """
+    plan_id = str(uuid.uuid4())
+    cols_fwd = [round(x, 3) for x in frange(0.0, wall_width, step)]
+    # Right→left columns, stored ascending so both directions share the bisect logic.
+    cols_rev = [round(x, 3) for x in frange(wall_width, 0.0, -step)][::-1]
+
+    segments = []
+    point_count = 0
+    direction = 1
+    for y, blocked in _blocked_by_row(obstacles, wall_height, step):
+        cols = cols_fwd if direction == 1 else cols_rev
+        runs = _free_column_runs(cols, blocked)
+        if direction == -1:
+            runs = [(hi, lo) for lo, hi in reversed(runs)]
+
+        for first, last in runs:
+            count = abs(last - first) + 1
+            segments.append({
+                "y": round(y, 3),
+                "x_start": cols[first],
+                "x_end": cols[last],
+                "direction": direction,
+                "count": count,
+            })
+            point_count += count
+        direction *= -1
+
+    return {"plan_id": plan_id, "step": step, "point_count": point_count, "segments": segments}
+
+
+def _blocked_by_row(
+    obstacles: List[Dict[str, float]],
+    wall_height: float,
+    step: float,
+) -> Iterator[tuple]:
+    """
+    Sweeps the rows bottom to top, yielding (y, blocked) where blocked lists
+    the x-intervals (left, right) of the obstacles crossing row y, sorted.
+    Obstacles are indexed by bottom edge and a heap drops them past their
+    top edge, so each row only looks at the obstacles crossing it.
+    Obstacles with a negative width or height contain no point under the
+    zig-zag planner's test (x <= px <= x + width) and are skipped.
+    """
+    edges = sorted(
+        (o["y"], o["y"] + o["height"], o["x"], o["x"] + o["width"])
+        for o in obstacles
+        if o["width"] >= 0 and o["height"] >= 0
+    )
+    next_edge = 0
+    active = []
+    for y in frange(0.0, wall_height, step):
+        while next_edge < len(edges) and edges[next_edge][0] <= y:
+            bottom, top, left, right = edges[next_edge]
+            heapq.heappush(active, (top, left, right))
+            next_edge += 1
+        while active and active[0][0] < y:
+            heapq.heappop(active)
+        yield y, sorted((left, right) for _, left, right in active)
+
+
+def _free_column_runs(cols: List[float], blocked: List[tuple]) -> List[tuple]:
+    """
+    Index runs (first, last) of the ascending columns not covered by any of the
+    closed x-intervals in blocked (sorted by left edge).
+    """
+    runs = []
+    start = 0
+    for left, right in blocked:
+        lo = bisect_left(cols, left)
+        hi = bisect_right(cols, right)
+        if lo > start:
+            runs.append((start, lo - 1))
+        start = max(start, hi)
+    if start < len(cols):
+        runs.append((start, len(cols) - 1))
+    return runs
+
+
+def iter_segment_points(
+    segments: List[Dict[str, float]],
+    wall_width: float,
+    step: float,
+    start_time: Optional[float] = None,
+) -> Iterator[Dict[str, float]]:
+    """
+    Lazily expand segments from generate_coverage_segments into the
+    {x, y, timestamp} points of the equivalent sampled plan.
+    """
+    cols_fwd = [round(x, 3) for x in frange(0.0, wall_width, step)]
+    cols_rev = [round(x, 3) for x in frange(wall_width, 0.0, -step)]
+    index_fwd = {x: i for i, x in enumerate(cols_fwd)}
+    index_rev = {x: i for i, x in enumerate(cols_rev)}
+
+    timestamp = time.time() if start_time is None else start_time
+    for seg in segments:
+        if seg["direction"] == 1:
+            cols, first = cols_fwd, index_fwd[seg["x_start"]]
+        else:
+            cols, first = cols_rev, index_rev[seg["x_start"]]
+        for x in cols[first:first + seg["count"]]:
+            yield {"x": x, "y": seg["y"], "timestamp": timestamp}
+            timestamp += 0.01
+
+
+def generate_cell_decomposition_path(
+    wall_width: float,
+    wall_height: float,
+    obstacles: List[Dict[str, float]],
+    step: float = 0.25,
+    start_time: Optional[float] = None,
+) -> Dict[str, any]:
+    """
+    Boustrophedon cell decomposition planner.
+    The free space is split into cells: consecutive rows' free runs belong
+    to the same cell while they overlap one to one, and an obstacle's top or
+    bottom edge (a run splitting or two runs merging) starts new cells. Each
+    cell is covered by its own serpentine, and the cells are ordered by a
+    nearest-neighbour tour from the origin improved with 2-opt, where
+    reversing part of the tour also reverses each cell's serpentine.
+    Samples the same left→right column grid as a forward zig-zag row, with
+    the same obstacle test.
+    Returns { plan_id, step, point_count, cells, segments, points,
+    path_length, transit_length }
+    """
+    plan_id = str(uuid.uuid4())
+    cols = [round(x, 3) for x in frange(0.0, wall_width, step)]
+
+    rows = [
+        (round(y, 3), _free_column_runs(cols, blocked))
+        for y, blocked in _blocked_by_row(obstacles, wall_height, step)
+    ]
+    cells = _decompose_cells(rows)
+    tour = _order_cells([_cell_serpentine(cell) for cell in cells], cols)
+
+    segments = []
+    for runs in tour:
+        for y, first, last in runs:
+            segments.append({
+                "y": y,
+                "x_start": cols[first],
+                "x_end": cols[last],
+                "direction": 1 if last >= first else -1,
+                "count": abs(last - first) + 1,
+            })
+
+    points = []
+    timestamp = time.time() if start_time is None else start_time
+    for runs in tour:
+        for y, first, last in runs:
+            indices = range(first, last + 1) if last >= first else range(first, last - 1, -1)
+            for i in indices:
+                points.append({"x": cols[i], "y": y, "timestamp": timestamp})
+                timestamp += 0.01
+
+    return {
+        "plan_id": plan_id,
+        "step": step,
+        "point_count": len(points),
+        "cells": len(cells),
+        "segments": segments,
+        "points": points,
+        **path_metrics(segments, step),
+    }
+
+
+def _decompose_cells(rows: List[tuple]) -> List[List[tuple]]:
+    """
+    Groups the free runs of consecutive rows into cells. rows holds
+    (y, [(first, last), ...]) with ascending column index runs; a run
+    continues the cell of the previous row's run only if each overlaps
+    nothing else. Returns the cells as lists of (y, first, last), bottom up.
+    """
+    cells = []
+    active = []  # (cell index, (first, last)) of the previous row
+    for y, runs in rows:
+        prev_links = [[] for _ in active]
+        cur_links = [[] for _ in runs]
+        k = m = 0
+        while k < len(active) and m < len(runs):
+            pa, pb = active[k][1]
+            a, b = runs[m]
+            if max(a, pa) <= min(b, pb):
+                prev_links[k].append(m)
+                cur_links[m].append(k)
+            if pb < b:
+                k += 1
+            else:
+                m += 1
+
+        next_active = []
+        for m, (a, b) in enumerate(runs):
+            links = cur_links[m]
+            if len(links) == 1 and len(prev_links[links[0]]) == 1:
+                index = active[links[0]][0]
+            else:
+                index = len(cells)
+                cells.append([])
+            cells[index].append((y, a, b))
+            next_active.append((index, (a, b)))
+        active = next_active
+    return cells
+
+
+def _cell_serpentine(cell: List[tuple]) -> List[tuple]:
+    """
+    The cell's bottom-up serpentine starting left→right, as runs
+    (y, first, last) in travel order.
+    """
+    return [
+        (y, a, b) if i % 2 == 0 else (y, b, a)
+        for i, (y, a, b) in enumerate(cell)
+    ]
+
+
+def _serpentine_variants(runs: List[tuple]) -> List[List[tuple]]:
+    """The serpentine started from each of the cell's four corners."""
+    mirrored = [(y, last, first) for y, first, last in runs]
+    top_down = [(y, a, b) for y, a, b in reversed(runs)]
+    # Start top-left/top-right: reverse the row order, re-alternate directions.
+    top_first = [
+        (y, min(a, b), max(a, b)) if i % 2 == 0 else (y, max(a, b), min(a, b))
+        for i, (y, a, b) in enumerate(top_down)
+    ]
+    top_mirrored = [(y, last, first) for y, first, last in top_first]
+    return [runs, mirrored, top_first, top_mirrored]
+
+
+def _endpoints(runs: List[tuple], cols: List[float]) -> tuple:
+    y0, first, _ = runs[0]
+    y1, _, last = runs[-1]
+    return (cols[first], y0), (cols[last], y1)
+
+
+def _order_cells(serpentines: List[List[tuple]], cols: List[float], max_passes: int = 50) -> List[List[tuple]]:
+    """
+    Orders the cells (choosing each one's start corner) to shorten the
+    transit between them: nearest neighbour from the origin, then 2-opt.
+    Returns the runs of each cell in tour order.
+    """
+    if not serpentines:
+        return []
+
+    def dist(p, q):
+        return math.hypot(p[0] - q[0], p[1] - q[1])
+
+    # Nearest neighbour over every cell's four start corners
+    remaining = set(range(len(serpentines)))
+    variants = {i: _serpentine_variants(runs) for i, runs in enumerate(serpentines)}
+    tour = []
+    position = (0.0, 0.0)
+    while remaining:
+        best = None
+        for i in remaining:
+            for runs in variants[i]:
+                entry, exit_ = _endpoints(runs, cols)
+                d = dist(position, entry)
+                if best is None or d < best[0]:
+                    best = (d, i, runs, entry, exit_)
+        _, i, runs, entry, exit_ = best
+        remaining.discard(i)
+        tour.append([runs, entry, exit_])
+        position = exit_
+
+    # 2-opt: reversing tour[i..j] also traverses each of those cells backwards
+    n = len(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                before = dist(tour[i - 1][2], tour[i][1]) if i > 0 else 0.0
+                after = dist(tour[j][2], tour[j + 1][1]) if j < n - 1 else 0.0
+                new_before = dist(tour[i - 1][2], tour[j][2]) if i > 0 else 0.0
+                new_after = dist(tour[i][1], tour[j + 1][1]) if j < n - 1 else 0.0
+                if new_before + new_after < before + after - 1e-9:
+                    tour[i:j + 1] = [
+                        [[(y, last, first) for y, first, last in reversed(runs)], exit_, entry]
+                        for runs, entry, exit_ in reversed(tour[i:j + 1])
+                    ]
+                    improved = True
+        if not improved:
+            break
+    return [runs for runs, _, _ in tour]
+
+
+def path_metrics(segments: List[Dict[str, float]], step: float) -> Dict[str, float]:
+    """
+    Total travel length of a segment path and the part of it that is
+    transit: any move between consecutive points longer than 1.5 steps
+    (crossing an obstacle, or a jump between rows or cells).
+    """
+    length = transit = 0.0
+    previous = None
+    for seg in segments:
+        length += abs(seg["x_end"] - seg["x_start"])
+        if previous is not None:
+            hop = math.hypot(seg["x_start"] - previous[0], seg["y"] - previous[1])
+            length += hop
+            if hop > 1.5 * step:
+                transit += hop
+        previous = (seg["x_end"], seg["y"])
+    return {"path_length": round(length, 3), "transit_length": round(transit, 3)}
+
+
+def plan_packed(
+    wall_width: float,
+    wall_height: float,
+    obstacles: List[Dict[str, float]],
+    step: float,
+    dtype: str = "f8",
+    compression: Optional[str] = "zlib",
+) -> PackedColumns:
+    """
+    Plans a wall and returns it packed, for running in a worker process:
+    a few compressed buffers cross the process boundary instead of one
+    pickled dict per point.
+    """
+    points = generate_coverage_path(wall_width, wall_height, obstacles, step)["points"]
+    return pack_columns(
+        (p["x"] for p in points),
+        (p["y"] for p in points),
+        (p["timestamp"] for p in points),
+        dtype=dtype,
+        compression=compression,
+    )
+
+
+def replan_columns(
+    wall_width: float,
+    wall_height: float,
+    step: float,
+    obstacles: List[Dict[str, float]],
+    changed: List[Dict[str, float]],
+    xs,
+    ys,
+    start_time: Optional[float] = None,
+) -> Dict[str, any]:
+    """
+    Updates a stored plan (columns xs, ys in path order) after its obstacles
+    changed to `obstacles`. Only rows whose y lies within one of the
+    `changed` obstacles (added, removed or the old and new extents of a
+    resized one) are replanned; the others are copied. Timestamps are
+    regenerated from start_time like a fresh plan, so the result is exactly
+    what generate_coverage_path would produce for the new obstacles.
+    Returns { xs, ys, ts, rows } where rows lists the replanned rows whose
+    points changed: {y, direction, old_start, old_count, new_start, new_count}.
+    """
+    def is_inside_obstacle(x, y):
+        for obs in obstacles:
+            if (
+                obs["x"] <= x <= obs["x"] + obs["width"]
+                and obs["y"] <= y <= obs["y"] + obs["height"]
+            ):
+                return True
+        return False
+
+    def is_affected(y):
+        return any(o["y"] <= y <= o["y"] + o["height"] for o in changed)
+
+    # ✅ Plans stored as f4 decode to array('f'): back to the planner's f8 values
+    # (every coordinate is rounded to 3 decimals), so copied rows splice into
+    # new_xs and compare equal to freshly planned ones
+    if getattr(xs, "typecode", "d") != "d":
+        xs = array("d", (round(float(x), 3) for x in xs))
+    if getattr(ys, "typecode", "d") != "d":
+        ys = array("d", (round(float(y), 3) for y in ys))
+
+    # Old rows: consecutive points sharing a y (each row has a distinct rounded y)
+    old_rows = {}
+    start = 0
+    for i in range(1, len(ys) + 1):
+        if i == len(ys) or ys[i] != ys[start]:
+            old_rows[round(float(ys[start]), 3)] = (start, i - start)
+            start = i
+
+    cols_fwd = [round(x, 3) for x in frange(0.0, wall_width, step)]
+    cols_rev = [round(x, 3) for x in frange(wall_width, 0.0, -step)]
+
+    new_xs, new_ys = array("d"), array("d")
+    rows = []
+    direction = 1
+    old_end = 0
+    for y in frange(0.0, wall_height, step):
+        row_y = round(y, 3)
+        old_start, old_count = old_rows.get(row_y, (old_end, 0))
+        old_end = old_start + old_count
+        new_start = len(new_xs)
+        if is_affected(y):
+            cols = cols_fwd if direction == 1 else cols_rev
+            row_xs = [x for x in cols if not is_inside_obstacle(x, y)]
+            if row_xs != list(xs[old_start:old_start + old_count]):
+                rows.append({
+                    "y": row_y,
+                    "direction": direction,
+                    "old_start": old_start,
+                    "old_count": old_count,
+                    "new_start": new_start,
+                    "new_count": len(row_xs),
+                })
+            new_xs.extend(row_xs)
+        else:
+            new_xs.extend(xs[old_start:old_start + old_count])
+        new_ys.extend([row_y] * (len(new_xs) - new_start))
+        direction *= -1
+
+    new_ts = array("d")
+    timestamp = time.time() if start_time is None else start_time
+    for _ in range(len(new_xs)):
+        new_ts.append(timestamp)
+        timestamp += 0.01
+
+    return {"xs": new_xs, "ys": new_ys, "ts": new_ts, "rows": rows}
+
+
 def frange(start: float, stop: float, step: float):
     """Floating point range generator."""
     if step == 0:
@@ -0,0 +1,139 @@
+# backend/app/utils/encoding.py
+"""
+Compact response encodings for plan points, selected from the Accept header:
+
+- application/vnd.wallplan.columnar+json: {plan_id, count, xs, ys, ts}
+- application/msgpack: the same columnar map as MessagePack
+- application/octet-stream: raw little-endian float64 columns xs|ys|ts,
+  with the point count and plan id in X-Point-Count / X-Plan-Id headers
+
+Bodies are compressed with br or gzip when Accept-Encoding allows it. None of
+these builds a model or dict per point. Negotiated routes send VARY on every
+response, the plain JSON fallback included, so shared caches key on both.
+"""
+
+import gzip
+import json
+import sys
+from array import array
+from typing import Optional
+
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional, the other encodings still work
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is used instead
+    brotli = None
+
+COLUMNAR_JSON = "application/vnd.wallplan.columnar+json"
+MSGPACK = "application/msgpack"
+RAW_F64 = "application/octet-stream"
+
+_MEDIA_TYPES = {
+    COLUMNAR_JSON: COLUMNAR_JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    RAW_F64: RAW_F64,
+}
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+# Vary header for every response of a route that negotiates its encoding
+VARY = "Accept, Accept-Encoding"
+
+
+def _parse_header(value: Optional[str]) -> list[tuple[str, float]]:
+    """Splits an Accept-style header into (token, q) pairs, highest q first."""
+    items = []
+    for position, part in enumerate((value or "").split(",")):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q, position))
+    items.sort(key=lambda item: (-item[1], item[2]))
+    return [(token, q) for token, q, _ in items if q > 0]
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Returns the compact media type the client prefers, or None for the
+    default JSON response (no Accept, */*, application/json, ...).
+    """
+    for token, _ in _parse_header(accept):
+        media_type = _MEDIA_TYPES.get(token)
+        if media_type == MSGPACK and msgpack is None:
+            continue
+        if media_type:
+            return media_type
+        if token in ("application/json", "*/*", "application/*"):
+            return None
+    return None
+
+
+def _choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    for token, _ in _parse_header(accept_encoding):
+        if token == "br" and brotli is not None:
+            return "br"
+        if token in ("gzip", "*"):
+            return "gzip"
+    return None
+
+
+def _float64_bytes(values) -> bytes:
+    values = values if isinstance(values, array) and values.typecode == "d" else array("d", values)
+    if sys.byteorder == "big":
+        values = array("d", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_columns(media_type: str, plan_id: str, xs, ys, ts) -> bytes:
+    """Encodes plan columns (sequences of floats) as media_type."""
+    if media_type == RAW_F64:
+        return _float64_bytes(xs) + _float64_bytes(ys) + _float64_bytes(ts)
+    body = {
+        "plan_id": plan_id,
+        "count": len(xs),
+        "xs": xs.tolist() if isinstance(xs, array) else list(xs),
+        "ys": ys.tolist() if isinstance(ys, array) else list(ys),
+        "ts": ts.tolist() if isinstance(ts, array) else list(ts),
+    }
+    if media_type == MSGPACK:
+        return msgpack.packb(body)
+    return json.dumps(body).encode()
+
+
+def columns_response(
+    media_type: str,
+    plan_id: str,
+    xs,
+    ys,
+    ts,
+    accept_encoding: Optional[str] = None,
+) -> Response:
+    """Builds the encoded (and, if accepted, compressed) response for a plan."""
+    body = encode_columns(media_type, plan_id, xs, ys, ts)
+    headers = {"Vary": VARY, "X-Point-Count": str(len(xs)), "X-Plan-Id": plan_id}
+
+    content_encoding = _choose_content_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if content_encoding == "br":
+        body = brotli.compress(body, quality=4)
+    elif content_encoding == "gzip":
+        body = gzip.compress(body, compresslevel=5)
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+
+    return Response(content=body, media_type=media_type, headers=headers)
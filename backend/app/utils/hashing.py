@@ -0,0 +1,43 @@
+# backend/app/utils/hashing.py
+import hashlib
+import json
+
+# Bump when the planner's output for the same request changes,
+# so plans stored by an older planner are not reused.
+PLANNER_VERSION = 1
+
+
+def _num(value: float) -> float:
+    """Normalizes a float so 1, 1.0 and 1.0000000000001 hash the same."""
+    return round(float(value), 9) + 0.0  # + 0.0 folds -0.0 into 0.0
+
+
+def canonical_obstacle(obstacle) -> tuple:
+    """(x, y, width, height) of an Obstacle with normalized numbers."""
+    return (_num(obstacle.x), _num(obstacle.y), _num(obstacle.width), _num(obstacle.height))
+
+
+def canonical_request(payload) -> dict:
+    """
+    Canonical form of a CoverageRequest: normalized numbers and obstacles in
+    sorted order (the planner treats obstacles as an unordered set).
+    """
+    obstacles = sorted(canonical_obstacle(o) for o in payload.obstacles)
+    return {
+        "wall_width": _num(payload.wall_width),
+        "wall_height": _num(payload.wall_height),
+        "obstacles": [list(o) for o in obstacles],
+        "step": _num(payload.step),
+    }
+
+
+def canonical_request_hash(payload, mode: str = "zigzag") -> str:
+    """
+    SHA-256 over the canonical request, used to find an identical stored plan.
+    Planner modes other than the default zig-zag hash separately.
+    """
+    body = {"planner": PLANNER_VERSION, "request": canonical_request(payload)}
+    if mode != "zigzag":
+        body["mode"] = mode
+    encoded = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
@@ -0,0 +1,267 @@
+# backend/app/utils/jobs.py
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+from uuid import uuid4
+
+from app.utils.logging import logger
+from app.utils.metrics import observe_planner
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+# Leave one core for the event loop and the request threadpool.
+PLANNER_WORKERS = int(os.getenv("PLANNER_WORKERS", str(max(1, _available_cores() - 1))))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+
+# Coarse progress per stage; the planner itself runs in another process.
+STAGE_PROGRESS = {"queued": 0.0, "running": 0.1, "persisting": 0.8, "done": 1.0}
+FINAL_STATES = ("done", "failed", "cancelled", "timeout")
+
+
+class JobQueueFull(Exception):
+    """Raised when JOB_MAX_PENDING jobs are already queued or running."""
+
+
+class Job:
+    __slots__ = (
+        "job_id", "key", "status", "progress", "plan_id", "point_count",
+        "error", "created_at", "started_at", "finished_at", "task",
+    )
+
+    def __init__(self, key: Optional[str]):
+        self.job_id = str(uuid4())
+        self.key = key
+        self.status = "queued"
+        self.progress = 0.0
+        self.plan_id = None
+        self.point_count = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def set_stage(self, status: str):
+        self.status = status
+        self.progress = STAGE_PROGRESS.get(status, self.progress)
+        if status == "running":
+            self.started_at = time.time()
+        if status in FINAL_STATES:
+            self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "plan_id": self.plan_id,
+            "point_count": self.point_count,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs CPU-heavy work in a bounded ProcessPoolExecutor so large plans do
+    not hold the GIL of the API process, then runs a finish step (e.g. the DB
+    write) on a thread. Jobs with the same key share one execution.
+
+    Work waits for a free worker before it is submitted, so the timeout
+    only counts time spent running, never time queued behind other jobs.
+    Cancelling a job that is still queued drops it; one that is already
+    running (or timed out) finishes in its worker process and keeps that
+    worker's slot until it does, but its result is discarded.
+    """
+    def __init__(
+        self,
+        max_workers: int = PLANNER_WORKERS,
+        timeout: float = JOB_TIMEOUT,
+        max_pending: int = JOB_MAX_PENDING,
+        ttl: float = JOB_TTL,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = None
+        self._executor_lock = Lock()
+        self._slots = None  # asyncio.Semaphore(max_workers), bound to one event loop
+        self._slots_loop = None
+        self._jobs: Dict[str, Job] = {}
+        self._active_by_key: Dict[str, Job] = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a process that runs threads (uvicorn, SQLite pool) is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _slots_for(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_workers)
+            self._slots_loop = loop
+        return self._slots
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def add_completed(self, key: Optional[str], plan_id: str, point_count: int) -> Job:
+        """Records a job that needed no work (its plan was already stored)."""
+        job = Job(key)
+        job.plan_id = plan_id
+        job.point_count = point_count
+        job.set_stage("done")
+        self._jobs[job.job_id] = job
+        return job
+
+    def submit(
+        self,
+        key: Optional[str],
+        work: Callable,
+        args: tuple,
+        finish: Callable[[Any], Dict[str, Any]],
+    ) -> Job:
+        """
+        Schedules work(*args) in the process pool, then finish(result) in a
+        thread; finish returns {"plan_id", "point_count"}. Must be called
+        from the event loop.
+        """
+        self._prune()
+        if key is not None and key in self._active_by_key:
+            return self._active_by_key[key]
+        pending = sum(1 for j in self._jobs.values() if j.status not in FINAL_STATES)
+        if pending >= self.max_pending:
+            raise JobQueueFull(f"{pending} planning jobs already pending")
+
+        job = Job(key)
+        self._jobs[job.job_id] = job
+        if key is not None:
+            self._active_by_key[key] = job
+        job.task = asyncio.get_running_loop().create_task(self._run(job, work, args, finish))
+        return job
+
+    async def run(self, work: Callable, *args, on_start: Optional[Callable[[], None]] = None):
+        """
+        Runs work(*args) in the process pool once a worker is free, with the
+        job timeout counted from then. on_start is called when it starts.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots_for(loop)
+        await slots.acquire()
+        try:
+            future = self.executor.submit(work, *args)
+        except BaseException:
+            slots.release()
+            raise
+
+        def release(_):
+            # ✅ The slot frees when the worker does, even after a timeout or cancel
+            try:
+                loop.call_soon_threadsafe(slots.release)
+            except RuntimeError:  # event loop already closed (shutdown)
+                pass
+
+        future.add_done_callback(release)
+        if on_start is not None:
+            on_start()
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            observe_planner("worker", time.perf_counter() - start, getattr(result, "count", None))
+            return result
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+
+    async def _run(self, job: Job, work: Callable, args: tuple, finish: Callable):
+        try:
+            result = await self.run(work, *args, on_start=lambda: job.set_stage("running"))
+            job.set_stage("persisting")
+            outcome = await asyncio.to_thread(finish, result)
+            job.plan_id = outcome["plan_id"]
+            job.point_count = outcome.get("point_count")
+            job.set_stage("done")
+            logger.info(f"✅ Job {job.job_id} finished: plan {job.plan_id}")
+        except asyncio.TimeoutError:
+            job.error = f"Planning exceeded {self.timeout}s"
+            job.set_stage("timeout")
+            logger.warning(f"⏱️ Job {job.job_id} timed out")
+        except asyncio.CancelledError:
+            job.set_stage("cancelled")
+            logger.info(f"🛑 Job {job.job_id} cancelled")
+        except Exception as e:
+            job.error = str(e)
+            job.set_stage("failed")
+            logger.error(f"🔥 Job {job.job_id} failed: {e}")
+        finally:
+            if job.key is not None and self._active_by_key.get(job.key) is job:
+                del self._active_by_key[job.key]
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancels a queued or running job. Once its result is being persisted
+        the job can no longer be cancelled: the plan is (being) stored, so
+        the job is left to finish and returned as "done" (or "failed").
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.task is None or job.status in FINAL_STATES:
+            return job
+        if job.status == "persisting":
+            await asyncio.wait([job.task])
+            return job
+        job.task.cancel()
+        await asyncio.wait([job.task], timeout=1.0)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.max_workers, "jobs": counts}
+
+    def shutdown(self):
+        for job in self._jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# ✅ Global job manager instance
+job_manager = JobManager()
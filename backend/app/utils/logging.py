@@ -1,22 +1,102 @@
 # backend/app/utils/logging.py
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import random
 
-# Ensure logs directory exists
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../logs")
 LOG_DIR = os.path.normpath(LOG_DIR)
-os.makedirs(LOG_DIR, exist_ok=True)
 
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
-# Create a logger
+# ✅ Rotation: "size" (LOG_MAX_BYTES × LOG_BACKUP_COUNT), "time" (LOG_ROTATE_WHEN) or "none".
+# With several worker processes writing one file, prefer "none" plus external rotation.
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+
+# ✅ Records waiting for the writer thread; when full, new records are dropped, never waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# ✅ Access-line sampling: default rate plus per-route overrides, e.g.
+# LOG_ACCESS_SAMPLE_ROUTES="/api/trajectory/{plan_id}=0.1,/metrics=0"
+LOG_ACCESS_SAMPLE = float(os.getenv("LOG_ACCESS_SAMPLE", "1.0"))
+
+
+def _parse_route_rates(value: str) -> dict:
+    rates = {}
+    for item in value.split(","):
+        route, sep, rate = item.strip().rpartition("=")
+        if sep and route:
+            try:
+                rates[route] = float(rate)
+            except ValueError:
+                pass
+    return rates
+
+
+LOG_ACCESS_SAMPLE_ROUTES = _parse_route_rates(os.getenv("LOG_ACCESS_SAMPLE_ROUTES", ""))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _file_handler() -> logging.Handler:
+    if LOG_ROTATE == "size":
+        return logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    if LOG_ROTATE == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    return logging.FileHandler(LOG_FILE, mode="a", encoding="utf-8")
+
+
+def should_log_access(route: str, status_code: int) -> bool:
+    """Sampling decision for one access-log line; errors are always logged."""
+    if status_code >= 400:
+        return True
+    rate = LOG_ACCESS_SAMPLE_ROUTES.get(route, LOG_ACCESS_SAMPLE)
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+# Create a logger; handlers are attached by setup_logging() at startup
 logger = logging.getLogger("wall_finishing_planner")
 logger.setLevel(logging.INFO)
+listener = None
+
+
+def setup_logging():
+    """
+    Creates the logs directory and starts the queue listener. Idempotent;
+    called from the app lifespan and by scripts. Until then, records of
+    WARNING and above still reach stderr through logging's last resort.
+    """
+    global listener
+    # Prevent duplicate handlers during reloads
+    if logger.handlers:
+        return
+
+    # Ensure logs directory exists
+    os.makedirs(LOG_DIR, exist_ok=True)
 
-# Prevent duplicate handlers during reloads
-if not logger.handlers:
     # File handler
-    file_handler = logging.FileHandler(LOG_FILE, mode="a", encoding="utf-8")
+    file_handler = _file_handler()
     file_handler.setLevel(logging.INFO)
 
     # Console handler
@@ -30,6 +110,12 @@ if not logger.handlers:
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Add handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # ✅ Callers only enqueue; a background thread formats and writes (and rotates)
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)  # flushes queued records on exit
+
+    logger.addHandler(queue_handler)
@@ -0,0 +1,152 @@
+# backend/app/utils/metrics.py
+"""
+Prometheus metrics, served at GET /metrics.
+
+Hot paths only touch pre-bound metric children (a lock-protected add, no
+label lookup). With several worker processes, set PROMETHEUS_MULTIPROC_DIR
+to a directory shared by the workers and emptied before they start
+(e.g. in the container entrypoint): each process then records into
+its own memory-mapped files and /metrics aggregates all of them, with
+gauges summed over live processes.
+"""
+
+import os
+import weakref
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+PLANNER_DURATION = Histogram(
+    "planner_duration_seconds",
+    "Coverage planning time by planner mode",
+    ["mode"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+PLANNER_POINTS = Histogram(
+    "planner_points",
+    "Points per generated plan by planner mode",
+    ["mode"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+TRAJECTORY_ROWS = Counter(
+    "trajectory_rows_inserted",
+    "Plan points written, by storage layout (rows, packed)",
+    ["storage"],
+)
+TRAJECTORY_INSERT_RATE = Histogram(
+    "trajectory_insert_rows_per_second",
+    "Plan write throughput (points/s) per call, by storage layout",
+    ["storage"],
+    buckets=(1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000, 25_000_000),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups",
+    "SimpleCache lookups by cache and result",
+    ["cache", "result"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_in_use",
+    "Checked-out connections beyond pool_size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+RETENTION_PLANS = Counter(
+    "retention_plans",
+    "Plans handled by retention by action (purged, archived, restored)",
+    ["action"],
+)
+WS_PLAYBACK = Gauge(
+    "ws_playback_connections",
+    "Open playback WebSockets (play: own stream, watch: shared broadcast)",
+    ["kind"],
+    multiprocess_mode="livesum",
+)
+
+
+def observe_planner(mode: str, seconds: float, points: Optional[int] = None):
+    PLANNER_DURATION.labels(mode).observe(seconds)
+    if points is not None:
+        PLANNER_POINTS.labels(mode).observe(points)
+
+
+_INSERT_METRICS = {
+    storage: (TRAJECTORY_ROWS.labels(storage), TRAJECTORY_INSERT_RATE.labels(storage))
+    for storage in ("rows", "packed")
+}
+
+# ✅ Engines whose pool already has listeners; startup may run more than once
+_instrumented_engines = weakref.WeakSet()
+
+
+def observe_insert(rows: int, rows_per_sec: float, storage: str = "rows"):
+    counter, rate = _INSERT_METRICS[storage]
+    counter.inc(rows)
+    rate.observe(rows_per_sec)
+
+
+def instrument_pool(engine: Engine, name: str):
+    """
+    Tracks checked-out and overflow connections of an engine's QueuePool.
+    Idempotent per engine, so the gauges count each checkout once.
+    """
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+    overflow = DB_POOL_OVERFLOW.labels(name)
+    pool = engine.pool
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+        size = pool.size() if hasattr(pool, "size") else None
+        if size is not None and pool.checkedout() > size:
+            connection_record.info["overflow"] = True
+            overflow.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+        if connection_record.info.pop("overflow", False):
+            overflow.dec()
+
+
+def render() -> tuple:
+    """(body, content type) of the current metrics, across workers when multiprocess."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drops this worker's live gauges on shutdown (multiprocess mode)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
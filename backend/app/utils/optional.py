@@ -0,0 +1,43 @@
+# backend/app/utils/optional.py
+"""
+Optional heavy dependencies, imported on first use rather than at startup.
+numpy alone costs ~0.1 s of import time, which every cold start would pay
+before serving its first request; see app.utils.boot for measurements.
+"""
+
+import importlib.util
+import os
+from threading import Lock
+
+# Import the optional modules in a background thread once the app serves
+PRELOAD_OPTIONAL_IMPORTS = os.getenv("PRELOAD_OPTIONAL_IMPORTS", "1").lower() not in ("0", "false", "no")
+
+_lock = Lock()
+_numpy = None
+_numpy_loaded = False
+
+
+def numpy():
+    """The numpy module, imported on first call; None when it is not installed."""
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        with _lock:
+            if not _numpy_loaded:
+                try:
+                    import numpy as np
+                except ImportError:  # numpy is optional, callers fall back to pure Python
+                    np = None
+                _numpy, _numpy_loaded = np, True
+    return _numpy
+
+
+def numpy_installed() -> bool:
+    """Whether numpy is available, without importing it."""
+    if _numpy_loaded:
+        return _numpy is not None
+    return importlib.util.find_spec("numpy") is not None
+
+
+def preload():
+    """Imports the optional modules now, e.g. from a thread once the app serves."""
+    numpy()
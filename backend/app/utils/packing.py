@@ -0,0 +1,165 @@
+# backend/app/utils/packing.py
+import sys
+import zlib
+from array import array
+from typing import Iterable, NamedTuple, Optional
+
+# array typecodes for the supported on-disk dtypes (always stored little-endian)
+DTYPES = {"f8": "d", "f4": "f"}
+COMPRESSIONS = (None, "zlib")
+
+
+class PackedColumns(NamedTuple):
+    """Coordinate columns of a plan, ready for LargeBinary columns."""
+    xs: bytes
+    ys: bytes
+    ts: bytes
+    dtype: str
+    compression: Optional[str]
+    count: int
+
+
+class PlanColumns(NamedTuple):
+    """Decoded coordinate columns of a plan as flat float buffers."""
+    xs: array
+    ys: array
+    ts: array
+
+    def __len__(self):
+        return len(self.xs)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the buffers (for cache accounting)."""
+        return sum(len(a) * a.itemsize for a in self)
+
+
+def _encode(values: array, compression: Optional[str]) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    data = values.tobytes()
+    return zlib.compress(data, 1) if compression == "zlib" else data
+
+
+def _decode(data: bytes, typecode: str, compression: Optional[str]) -> array:
+    if compression == "zlib":
+        data = zlib.decompress(data)
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def pack_columns(
+    xs: Iterable[float],
+    ys: Iterable[float],
+    ts: Iterable[float],
+    dtype: str = "f8",
+    compression: Optional[str] = "zlib",
+) -> PackedColumns:
+    """
+    Packs x/y/timestamp columns into little-endian binary blobs.
+    dtype only applies to x and y; timestamps are epoch seconds and always
+    stay float64 (float32 would round them to minutes).
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    x_arr = array(DTYPES[dtype], xs)
+    y_arr = array(DTYPES[dtype], ys)
+    t_arr = array("d", ts)
+    if not len(x_arr) == len(y_arr) == len(t_arr):
+        raise ValueError("Coordinate columns must have the same length")
+
+    return PackedColumns(
+        xs=_encode(x_arr, compression),
+        ys=_encode(y_arr, compression),
+        ts=_encode(t_arr, compression),
+        dtype=dtype,
+        compression=compression,
+        count=len(x_arr),
+    )
+
+
+def unpack_columns(
+    xs: bytes,
+    ys: bytes,
+    ts: bytes,
+    dtype: str = "f8",
+    compression: Optional[str] = None,
+) -> PlanColumns:
+    """Decodes packed blobs back into float buffers without per-point objects."""
+    typecode = DTYPES[dtype]
+    return PlanColumns(
+        xs=_decode(xs, typecode, compression),
+        ys=_decode(ys, typecode, compression),
+        ts=_decode(ts, "d", compression),
+    )
+
+
+class ColumnReader:
+    """
+    Sequential reader over one packed column.
+    Decompresses only as far as the requested slice, so a consumer walking a
+    plan front to back never holds the decoded column in memory. Reading
+    behind the current position restarts from the beginning.
+    """
+    def __init__(self, data: bytes, typecode: str, compression: Optional[str] = None):
+        self._data = data
+        self._typecode = typecode
+        self._itemsize = array(typecode).itemsize
+        self._compression = compression
+        self._reset()
+
+    def _reset(self):
+        self._position = 0
+        self._offset = 0
+        self._pending = b""
+        if self._compression == "zlib":
+            self._inflate = zlib.decompressobj()
+            self._input = self._data
+
+    def _take(self, nbytes: int) -> bytes:
+        if self._compression != "zlib":
+            chunk = self._data[self._offset:self._offset + nbytes]
+            self._offset += len(chunk)
+            return bytes(chunk)
+
+        out = bytearray(self._pending[:nbytes])
+        self._pending = self._pending[nbytes:]
+        while len(out) < nbytes:
+            if self._input:
+                chunk = self._inflate.decompress(self._input, nbytes - len(out))
+                self._input = self._inflate.unconsumed_tail
+            else:
+                chunk = self._inflate.flush()
+                self._pending = chunk[nbytes - len(out):]
+                chunk = chunk[:nbytes - len(out)]
+                out += chunk
+                break
+            out += chunk
+        return bytes(out)
+
+    def read(self, start: int, count: int) -> array:
+        """Returns up to `count` values starting at item index `start`."""
+        if start < self._position:
+            self._reset()
+        skip = start - self._position
+        while skip > 0:
+            step = min(skip, 65536)
+            taken = len(self._take(step * self._itemsize)) // self._itemsize
+            self._position += taken
+            skip -= step
+            if taken < step:
+                return array(self._typecode)
+
+        values = array(self._typecode)
+        values.frombytes(self._take(count * self._itemsize))
+        if sys.byteorder == "big":
+            values.byteswap()
+        self._position += len(values)
+        return values
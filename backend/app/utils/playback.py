@@ -0,0 +1,133 @@
+# backend/app/utils/playback.py
+
+import asyncio
+import json
+import struct
+import sys
+from array import array
+from typing import Optional, Tuple
+
+from app import crud
+from app.database import AsyncSessionLocal
+from app.utils.packing import DTYPES, ColumnReader
+
+# Seconds per point at speed 1.0 (the original fixed playback rate)
+POINT_INTERVAL = 0.05
+MAX_BATCH = 5000
+MAX_SPEED = 1000.0
+
+# Binary frame: little-endian header (start index, point count, total points)
+# followed by count interleaved float64 triples x, y, timestamp.
+BINARY_HEADER = struct.Struct("<III")
+
+
+class PlanStream:
+    """
+    Reads a stored plan for playback one slice at a time.
+    Packed plans keep only their compressed blobs and decode each slice on
+    demand; row-stored plans are paged from the DB by id (keyset), with a
+    short-lived session per page so no connection is held between frames.
+    """
+    def __init__(self, plan_id: str):
+        self.plan_id = plan_id
+        self.total = 0
+        self._readers = None
+        self._next_index = 0
+        self._last_id = None
+
+    async def open(self) -> bool:
+        """Loads plan metadata. Returns False when the plan does not exist."""
+        async with AsyncSessionLocal() as db:
+            plan = await crud.get_plan_async(db, self.plan_id)
+            if plan is not None and plan.storage == "packed":
+                typecode = DTYPES[plan.dtype]
+                self._readers = (
+                    ColumnReader(plan.xs, typecode, plan.compression),
+                    ColumnReader(plan.ys, typecode, plan.compression),
+                    ColumnReader(plan.ts, "d", plan.compression),
+                )
+                self.total = plan.point_count
+            else:
+                self.total = await crud.count_plan_rows_async(db, self.plan_id)
+        return self.total > 0
+
+    async def read(self, start: int, count: int) -> Tuple[array, array, array]:
+        """Returns the (xs, ys, ts) slice [start, start + count)."""
+        if self._readers is not None:
+            xs, ys, ts = (r.read(start, count) for r in self._readers)
+            return xs, ys, ts
+
+        async with AsyncSessionLocal() as db:
+            if start == self._next_index and self._last_id is not None:
+                rows = await crud.get_plan_rows_page_async(db, self.plan_id, count, after_id=self._last_id)
+            else:
+                rows = await crud.get_plan_rows_page_async(db, self.plan_id, count, offset=start)
+        xs, ys, ts = array("d"), array("d"), array("d")
+        for _, x, y, t in rows:
+            xs.append(x)
+            ys.append(y)
+            ts.append(t)
+        if rows:
+            self._last_id = rows[-1][0]
+            self._next_index = start + len(rows)
+        return xs, ys, ts
+
+
+def encode_json_frame(start: int, total: int, xs, ys, ts, batch: int) -> str:
+    """
+    batch == 1 keeps the original one-point frame {x, y, index, total, timestamp};
+    larger batches send {index, total, points: [[x, y, timestamp], ...]}.
+    """
+    if batch == 1:
+        return json.dumps({"x": xs[0], "y": ys[0], "index": start, "total": total, "timestamp": ts[0]})
+    return json.dumps({
+        "index": start,
+        "total": total,
+        "points": [[x, y, t] for x, y, t in zip(xs, ys, ts)],
+    })
+
+
+def encode_binary_frame(start: int, total: int, xs, ys, ts) -> bytes:
+    values = array("d", [0.0]) * (3 * len(xs))
+    values[0::3] = array("d", xs)
+    values[1::3] = array("d", ys)
+    values[2::3] = array("d", ts)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return BINARY_HEADER.pack(start, len(xs), total) + values.tobytes()
+
+
+class PlaybackState:
+    """Playback controls shared between the sender loop and the control reader."""
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.running = asyncio.Event()
+        self.running.set()
+        self.seek_to: Optional[int] = None
+        self.changed = asyncio.Event()
+        self.closed = False
+
+    def apply(self, message: dict, total: int) -> Optional[str]:
+        """Applies a client control message. Returns an error string if invalid."""
+        action = message.get("action")
+        if action == "pause":
+            self.running.clear()
+        elif action == "resume":
+            self.running.set()
+        elif action == "speed":
+            try:
+                speed = float(message.get("value"))
+            except (TypeError, ValueError):
+                return "speed value must be a number"
+            if not 0 < speed <= MAX_SPEED:
+                return f"speed must be in (0, {MAX_SPEED}]"
+            self.speed = speed
+        elif action == "seek":
+            index = message.get("index")
+            if not isinstance(index, int) or not 0 <= index < total:
+                return f"seek index must be an integer in [0, {total})"
+            self.seek_to = index
+        else:
+            return f"unknown action: {action}"
+        self.changed.set()
+        return None
@@ -0,0 +1,519 @@
+# backend/app/utils/retention.py
+"""
+Plan retention: last-access tracking, TTL expiry, archival and compaction.
+
+- Readers call touch(plan_id); accesses are kept in memory and written to
+  plans.last_accessed_at / expires_at in one batch every
+  RETENTION_FLUSH_INTERVAL seconds, so reads never wait on a write.
+- A plan expires PLAN_TTL seconds (or its own ttl_seconds; 0 = never) after
+  its last access. Expired plans are deleted RETENTION_BATCH plans per
+  transaction, and row-stored points RETENTION_ROW_BATCH rows per
+  transaction, with a short pause in between so other writers get the
+  SQLite write lock.
+- With PLAN_ARCHIVE_AFTER set, plans idle that long have their coordinates
+  moved to an xz-compressed file in PLAN_ARCHIVE_DIR; the next read loads
+  them back into the plans row (see crud._load_plan). Archived row-stored
+  plans come back packed, so their point ids become 1-based indexes.
+- After each pass the SQLite file is compacted: incremental_vacuum frees
+  pages (databases created with auto_vacuum=INCREMENTAL, or converted once
+  with `python -m app.utils.retention --vacuum`) and a WAL checkpoint keeps
+  the -wal file from growing.
+
+`python -m app.utils.retention` runs one pass by hand.
+"""
+
+import argparse
+import json
+import lzma
+import os
+import time
+from array import array
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from typing import Optional
+
+from sqlalchemy import bindparam, delete, select, update
+
+from app import models
+from app.database import DATABASE_URL, PLAN_COMPRESSION, SessionLocal, get_engine
+from app.utils.cache import cache, columns_cache, lod_cache, spatial_cache
+from app.utils.logging import logger, setup_logging
+from app.utils.metrics import RETENTION_PLANS
+from app.utils.packing import PackedColumns, PlanColumns, pack_columns, unpack_columns
+
+PLAN_TTL = float(os.getenv("PLAN_TTL", str(30 * 24 * 3600)))  # seconds after last access; 0 = keep
+PLAN_ARCHIVE_AFTER = float(os.getenv("PLAN_ARCHIVE_AFTER", "0"))  # seconds idle; 0 = never archive
+PLAN_ARCHIVE_DIR = os.path.normpath(os.getenv(
+    "PLAN_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../archive")
+))
+
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))  # 0 disables the background worker
+RETENTION_FLUSH_INTERVAL = float(os.getenv("RETENTION_FLUSH_INTERVAL", "30"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "20"))
+RETENTION_ROW_BATCH = int(os.getenv("RETENTION_ROW_BATCH", "5000"))
+RETENTION_PAUSE = float(os.getenv("RETENTION_PAUSE", "0.05"))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))
+RETENTION_CHECKPOINT = os.getenv("RETENTION_CHECKPOINT", "TRUNCATE").upper()  # PASSIVE | FULL | RESTART | TRUNCATE
+
+# expires_at of plans pinned with ttl_seconds=0 (NULL means "not assigned yet")
+NEVER = datetime(9999, 12, 31)
+
+_IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def expiry(last_access: datetime, ttl_seconds: Optional[int]) -> Optional[datetime]:
+    """expires_at for a plan last read at last_access, or None without a TTL."""
+    if ttl_seconds == 0:
+        return NEVER
+    ttl = PLAN_TTL if ttl_seconds is None else ttl_seconds
+    return last_access + timedelta(seconds=ttl) if ttl > 0 else None
+
+
+# ---------- Access tracking ----------
+
+class AccessTracker:
+    """Collects plan reads in memory; flush() writes them in one batch."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._pending = {}  # plan_id -> last access (naive UTC)
+
+    def touch(self, plan_id: str):
+        with self._lock:
+            self._pending[plan_id] = datetime.utcnow()
+
+    def flush(self, db) -> int:
+        """Updates last_accessed_at and expires_at of the touched plans."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        table = models.Plan.__table__
+        plan_ids = list(pending)
+        ttls = {}
+        for i in range(0, len(plan_ids), 500):
+            ttls.update(db.execute(
+                select(table.c.plan_id, table.c.ttl_seconds).where(table.c.plan_id.in_(plan_ids[i:i + 500]))
+            ).all())
+        params = [
+            {"b_plan_id": plan_id, "b_last": at, "b_expires": expiry(at, ttls[plan_id])}
+            for plan_id, at in pending.items()
+            if plan_id in ttls
+        ]
+        if params:
+            db.connection().execute(_set_access_stmt(), params)
+        db.commit()
+        return len(params)
+
+
+def _set_access_stmt():
+    table = models.Plan.__table__
+    return (
+        update(table)
+        .where(table.c.plan_id == bindparam("b_plan_id"))
+        .values(last_accessed_at=bindparam("b_last"), expires_at=bindparam("b_expires"))
+    )
+
+
+tracker = AccessTracker()
+touch = tracker.touch
+
+
+def set_ttl(db, plan_id: str, ttl_seconds: Optional[int]) -> Optional[models.Plan]:
+    """Sets a plan's TTL override (None: PLAN_TTL, 0: keep) and recomputes its expiry."""
+    plan = db.get(models.Plan, plan_id)
+    if plan is None:
+        return None
+    plan.ttl_seconds = ttl_seconds
+    plan.expires_at = expiry(plan.last_accessed_at or plan.created_at, ttl_seconds)
+    db.commit()
+    return plan
+
+
+# ---------- Archive files ----------
+
+def _archive_path(name: str) -> str:
+    return os.path.join(PLAN_ARCHIVE_DIR, os.path.basename(name))
+
+
+def write_archive(plan_id: str, xs, ys, ts, dtype: str) -> str:
+    """
+    Writes the columns as one xz stream: a JSON header line, then the raw
+    little-endian xs, ys and ts. Returns the file name.
+    """
+    raw = pack_columns(xs, ys, ts, dtype=dtype, compression=None)
+    header = json.dumps({"plan_id": plan_id, "dtype": raw.dtype, "count": raw.count}).encode()
+    name = f"{os.path.basename(plan_id)}.plan.xz"
+    path = _archive_path(name)
+    os.makedirs(PLAN_ARCHIVE_DIR, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with lzma.open(tmp, "wb", preset=6) as f:
+        f.write(header + b"\n")
+        f.write(raw.xs)
+        f.write(raw.ys)
+        f.write(raw.ts)
+    os.replace(tmp, path)  # never leave a half-written archive under the real name
+    return name
+
+
+def read_archive(name: str, compression: Optional[str]) -> PackedColumns:
+    """Reads an archive file back into blobs packed with `compression`."""
+    with lzma.open(_archive_path(name), "rb") as f:
+        data = f.read()
+    header, _, body = data.partition(b"\n")
+    meta = json.loads(header)
+    count = meta["count"]
+    size = 4 if meta["dtype"] == "f4" else 8
+    xs, ys, ts = body[:count * size], body[count * size:2 * count * size], body[2 * count * size:]
+    if len(ts) != count * 8:
+        raise ValueError(f"truncated archive {name}")
+    cols = unpack_columns(xs, ys, ts, meta["dtype"], None)
+    return pack_columns(cols.xs, cols.ys, cols.ts, dtype=meta["dtype"], compression=compression)
+
+
+def remove_archive(name: Optional[str]):
+    if name:
+        try:
+            os.remove(_archive_path(name))
+        except FileNotFoundError:
+            pass
+
+
+def apply_restore(plan: models.Plan, packed: PackedColumns) -> str:
+    """Puts archived columns back into the plans row; the caller commits. Returns the file name."""
+    name = plan.archive_file
+    plan.xs, plan.ys, plan.ts = packed.xs, packed.ys, packed.ts
+    plan.archive_file = None
+    return name
+
+
+def restored_elsewhere(plan: models.Plan) -> bool:
+    """After a failed restore: True when a concurrent reader restored the plan first."""
+    return plan.archive_file is None and plan.xs is not None
+
+
+def finish_restore(plan_id: str, name: str):
+    remove_archive(name)
+    RETENTION_PLANS.labels("restored").inc()
+    logger.info(f"📂 Restored archived plan {plan_id}")
+
+
+def restore_plan(db, plan: models.Plan) -> bool:
+    """
+    Loads an archived plan's columns back into the DB and removes its file.
+    A reader that loses the race against a concurrent restore finds the
+    plan already restored.
+    """
+    try:
+        name = apply_restore(plan, read_archive(plan.archive_file, plan.compression))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        db.refresh(plan)
+        if restored_elsewhere(plan):
+            return True
+        logger.error(f"🔥 Could not restore archived plan {plan.plan_id}: {e}")
+        return False
+    finish_restore(plan.plan_id, name)
+    return True
+
+
+# ---------- Batched maintenance ----------
+
+def _pause(stop: Optional[Event]) -> bool:
+    """Yields the write lock between batches. Returns True when asked to stop."""
+    if stop is None:
+        time.sleep(RETENTION_PAUSE)
+        return False
+    return stop.wait(RETENTION_PAUSE)
+
+
+def _delete_rows(db, plan_id: str, stop: Optional[Event] = None) -> bool:
+    """Deletes a plan's trajectory rows in short transactions. False if interrupted."""
+    t = models.Trajectory
+    while True:
+        result = db.execute(
+            delete(t).where(t.id.in_(
+                select(t.id).where(t.plan_id == plan_id).limit(RETENTION_ROW_BATCH).scalar_subquery()
+            ))
+        )
+        db.commit()
+        if result.rowcount < RETENTION_ROW_BATCH:
+            return True
+        if _pause(stop):
+            return False
+
+
+def assign_expiry(db, stop: Optional[Event] = None) -> int:
+    """Gives new and pre-retention plans a last access and an expiry."""
+    p = models.Plan
+    batch = RETENTION_BATCH * 50  # metadata only, so much larger batches than deletes
+    assigned = 0
+    conditions = [p.last_accessed_at.is_(None)]
+    if PLAN_TTL > 0:
+        conditions.append(p.expires_at.is_(None))  # with a default TTL every plan gets an expiry
+    for condition in conditions:
+        while True:
+            rows = db.execute(
+                select(p.plan_id, p.created_at, p.last_accessed_at, p.ttl_seconds, p.expires_at)
+                .where(condition)
+                .limit(batch)
+            ).all()
+            if not rows:
+                break
+            params = []
+            for plan_id, created_at, last_access, ttl_seconds, expires_at in rows:
+                last_access = last_access or created_at or datetime.utcnow()
+                params.append({
+                    "b_plan_id": plan_id,
+                    "b_last": last_access,
+                    "b_expires": expires_at or expiry(last_access, ttl_seconds),
+                })
+            db.connection().execute(_set_access_stmt(), params)
+            db.commit()
+            assigned += len(rows)
+            if len(rows) < batch or _pause(stop):
+                break
+    return assigned
+
+
+def _forget(plan_id: str, request_hash: Optional[str]):
+    """
+    Drops this process's cached copies of a removed plan. Other workers
+    keep theirs, but every cache hit is checked against the plans table
+    (crud.plan_exists), so they never serve a purged plan.
+    """
+    if request_hash:
+        cache.delete(request_hash)
+    lod_cache.delete(plan_id)
+    spatial_cache.delete(plan_id)
+    columns_cache.delete(plan_id)
+
+
+def purge_expired(db, now: Optional[datetime] = None, stop: Optional[Event] = None) -> int:
+    """Deletes plans whose expires_at has passed, RETENTION_BATCH at a time."""
+    p = models.Plan
+    now = now or datetime.utcnow()
+    purged = 0
+    while True:
+        batch = db.execute(
+            select(p.plan_id, p.storage, p.request_hash, p.archive_file)
+            .where(p.expires_at < now)
+            .limit(RETENTION_BATCH)
+        ).all()
+        if not batch:
+            break
+        for plan in batch:
+            if plan.storage == "rows" and not _delete_rows(db, plan.plan_id, stop):
+                return purged
+        db.execute(delete(p).where(p.plan_id.in_([plan.plan_id for plan in batch])))
+        db.commit()
+        for plan in batch:
+            remove_archive(plan.archive_file)
+            _forget(plan.plan_id, plan.request_hash)
+        purged += len(batch)
+        RETENTION_PLANS.labels("purged").inc(len(batch))
+        if len(batch) < RETENTION_BATCH or _pause(stop):
+            break
+    if purged:
+        logger.info(f"🗑️ Purged {purged} expired plans")
+    return purged
+
+
+def archive_plan(db, plan_id: str, stop: Optional[Event] = None) -> bool:
+    """Moves one plan's coordinates to an archive file."""
+    plan = db.get(models.Plan, plan_id)
+    if plan is None or plan.archive_file:
+        return False
+
+    if plan.storage == "packed":
+        cols = unpack_columns(plan.xs, plan.ys, plan.ts, plan.dtype, plan.compression)
+        dtype = plan.dtype
+    else:
+        t = models.Trajectory
+        cols = PlanColumns(array("d"), array("d"), array("d"))
+        for x, y, ts in db.execute(
+            select(t.x, t.y, t.timestamp).where(t.plan_id == plan_id).order_by(t.id.asc())
+        ):
+            cols.xs.append(x)
+            cols.ys.append(y)
+            cols.ts.append(ts.timestamp() if hasattr(ts, "timestamp") else float(ts))
+        dtype = "f8"
+
+    name = write_archive(plan_id, cols.xs, cols.ys, cols.ts, dtype)
+    was_rows = plan.storage == "rows"
+    try:
+        plan.storage = "packed"
+        plan.dtype = dtype
+        plan.point_count = len(cols)
+        if was_rows:
+            plan.compression = PLAN_COMPRESSION
+        plan.xs = plan.ys = plan.ts = None
+        plan.archive_file = name
+        db.commit()
+    except Exception:
+        db.rollback()
+        remove_archive(name)
+        raise
+    if was_rows:
+        _delete_rows(db, plan_id, stop)  # readers already use the archive
+    lod_cache.delete(plan_id)
+    spatial_cache.delete(plan_id)
+    columns_cache.delete(plan_id)
+    RETENTION_PLANS.labels("archived").inc()
+    return True
+
+
+def archive_idle(db, now: Optional[datetime] = None, stop: Optional[Event] = None) -> int:
+    """Archives plans not read for PLAN_ARCHIVE_AFTER seconds."""
+    if PLAN_ARCHIVE_AFTER <= 0:
+        return 0
+    p = models.Plan
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=PLAN_ARCHIVE_AFTER)
+    archived = 0
+    while True:
+        plan_ids = db.execute(
+            select(p.plan_id)
+            .where(p.last_accessed_at < cutoff, p.archive_file.is_(None))
+            .limit(RETENTION_BATCH)
+        ).scalars().all()
+        for plan_id in plan_ids:
+            try:
+                archived += archive_plan(db, plan_id, stop)
+            except Exception as e:
+                logger.error(f"🔥 Could not archive plan {plan_id}: {e}")
+                return archived
+        if len(plan_ids) < RETENTION_BATCH or _pause(stop):
+            break
+    if archived:
+        logger.info(f"📦 Archived {archived} idle plans to {PLAN_ARCHIVE_DIR}")
+    return archived
+
+
+def compact(bind=None) -> dict:
+    """Incremental vacuum plus WAL checkpoint (SQLite only)."""
+    if not _IS_SQLITE:
+        return {}
+    result = {}
+    with (bind or get_engine()).connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2 and RETENTION_VACUUM_PAGES > 0:
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES})")
+            result["pages_freed"] = before - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        busy, log_pages, checkpointed = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({RETENTION_CHECKPOINT})").one()
+        result.update({"checkpoint_busy": bool(busy), "wal_pages": log_pages, "checkpointed": checkpointed})
+    return result
+
+
+def enable_incremental_vacuum(bind=None):
+    """
+    Switches an existing SQLite database to auto_vacuum=INCREMENTAL. This
+    rewrites the whole file (VACUUM) under an exclusive lock, so run it
+    during maintenance, not while serving.
+    """
+    with (bind or get_engine()).connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+        logger.info(f"🧹 auto_vacuum is now {conn.exec_driver_sql('PRAGMA auto_vacuum').scalar()}")
+
+
+# ---------- Background worker ----------
+
+class RetentionWorker:
+    """
+    Daemon thread that flushes plan accesses every RETENTION_FLUSH_INTERVAL
+    seconds and runs a full pass every RETENTION_INTERVAL seconds. With
+    several worker processes each runs its own; passes are idempotent and
+    work in small batches, so they only share the work.
+    """
+
+    def __init__(self, interval: float = RETENTION_INTERVAL, flush_interval: float = RETENTION_FLUSH_INTERVAL):
+        self.interval = interval
+        self.flush_interval = max(0.1, min(flush_interval, interval or flush_interval))
+        self._stop = Event()
+        self._thread = None
+        self._totals = {"passes": 0, "flushed": 0, "purged": 0, "archived": 0, "errors": 0}
+        self._last = None
+
+    def run_once(self) -> dict:
+        """One full pass: flush, assign expiries, purge, archive, compact."""
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            summary = {
+                "flushed": tracker.flush(db),
+                "assigned": assign_expiry(db, self._stop),
+                "purged": purge_expired(db, stop=self._stop),
+                "archived": archive_idle(db, stop=self._stop),
+            }
+        finally:
+            db.close()
+        summary["compaction"] = compact()
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        self._totals["passes"] += 1
+        for key in ("flushed", "purged", "archived"):
+            self._totals[key] += summary[key]
+        self._last = summary
+        return summary
+
+    def _flush(self):
+        db = SessionLocal()
+        try:
+            self._totals["flushed"] += tracker.flush(db)
+        finally:
+            db.close()
+
+    def _loop(self):
+        next_pass = time.monotonic()
+        while not self._stop.wait(self.flush_interval):
+            try:
+                if time.monotonic() >= next_pass:
+                    self.run_once()
+                    next_pass = time.monotonic() + self.interval
+                else:
+                    self._flush()
+            except Exception as e:
+                self._totals["errors"] += 1
+                logger.error(f"🔥 Retention pass failed: {e}")
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+        logger.info(f"♻️ Retention worker started (TTL {PLAN_TTL:g}s, pass every {self.interval:g}s)")
+
+    def stop(self):
+        """Stops the thread and writes the accesses recorded since the last flush."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        try:
+            self._flush()
+        except Exception as e:
+            logger.error(f"🔥 Could not flush plan accesses: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._thread is not None,
+            "plan_ttl": PLAN_TTL,
+            "archive_after": PLAN_ARCHIVE_AFTER,
+            **self._totals,
+            "last_pass": self._last,
+        }
+
+
+retention_worker = RetentionWorker()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one retention pass.")
+    parser.add_argument("--vacuum", action="store_true", help="convert to auto_vacuum=INCREMENTAL first (full VACUUM)")
+    args = parser.parse_args()
+    setup_logging()
+    if args.vacuum:
+        enable_incremental_vacuum()
+    print(json.dumps(retention_worker.run_once(), indent=2, default=str))
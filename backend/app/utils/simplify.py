@@ -0,0 +1,146 @@
+# backend/app/utils/simplify.py
+"""
+Level-of-detail simplification of plan paths for visualization.
+
+A plan is reduced in two steps:
+1. collinear runs collapse to their end points (a serpentine row of
+   evenly spaced samples becomes one segment per free run);
+2. Ramer–Douglas–Peucker ranks the remaining points. Segments are split
+   in order of decreasing deviation (a max-heap), so the split order is a
+   ranking: the first N points are the best N-point simplification, and
+   the points ranked before the first split below ε are exactly the RDP
+   result for tolerance ε.
+
+The ranking is computed once per plan (LodPyramid); every level, tolerance
+or target count is then just a prefix of it.
+"""
+
+import heapq
+import math
+from array import array
+from typing import List, Optional
+
+from app.utils.optional import numpy
+
+# Point counts of the precomputed pyramid levels, coarsest first
+LOD_LEVELS = (500, 2000, 8000, 32000)
+
+
+def collinear_keep(xs, ys, eps: float = 1e-9) -> array:
+    """
+    Indices of the points that are not interior to a straight run: the end
+    points, every turn and every reversal of direction.
+    """
+    n = len(xs)
+    if n <= 2:
+        return array("q", range(n))
+    np = numpy()
+    if np is not None:
+        x = np.frombuffer(xs, dtype=np.float64) if isinstance(xs, array) and xs.typecode == "d" else np.asarray(xs, dtype=np.float64)
+        y = np.frombuffer(ys, dtype=np.float64) if isinstance(ys, array) and ys.typecode == "d" else np.asarray(ys, dtype=np.float64)
+        dx0, dy0 = x[1:-1] - x[:-2], y[1:-1] - y[:-2]
+        dx1, dy1 = x[2:] - x[1:-1], y[2:] - y[1:-1]
+        interior = (np.abs(dx0 * dy1 - dy0 * dx1) <= eps) & (dx0 * dx1 + dy0 * dy1 > 0)
+        keep = np.ones(n, dtype=bool)
+        keep[1:-1] = ~interior
+        return array("q", np.nonzero(keep)[0].tolist())
+
+    keep = array("q", [0])
+    for i in range(1, n - 1):
+        dx0, dy0 = xs[i] - xs[i - 1], ys[i] - ys[i - 1]
+        dx1, dy1 = xs[i + 1] - xs[i], ys[i + 1] - ys[i]
+        if abs(dx0 * dy1 - dy0 * dx1) > eps or dx0 * dx1 + dy0 * dy1 <= 0:
+            keep.append(i)
+    keep.append(n - 1)
+    return keep
+
+
+def _farthest(xs, ys, idx, lo: int, hi: int):
+    """(distance, position) of the point of idx[lo+1:hi] farthest from segment idx[lo]–idx[hi]."""
+    ax, ay = xs[idx[lo]], ys[idx[lo]]
+    bx, by = xs[idx[hi]], ys[idx[hi]]
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    best, best_pos = -1.0, lo
+    for pos in range(lo + 1, hi):
+        px, py = xs[idx[pos]] - ax, ys[idx[pos]] - ay
+        if length_sq == 0.0:
+            d = math.hypot(px, py)
+        else:
+            t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq))
+            d = math.hypot(px - t * dx, py - t * dy)
+        if d > best:
+            best, best_pos = d, pos
+    return best, best_pos
+
+
+def rdp_rank(xs, ys, idx) -> tuple:
+    """
+    Ranks the candidate points idx (ascending indices into xs/ys) by RDP
+    split order. Returns (order, deviations): order lists the indices, the
+    two end points first, and deviations[k] is the distance at which
+    order[k] was added (inf for the end points).
+    """
+    n = len(idx)
+    order = array("q", [idx[0]] + ([idx[-1]] if n > 1 else []))
+    deviations = array("d", [math.inf] * len(order))
+    heap = []
+    if n > 2:
+        d, pos = _farthest(xs, ys, idx, 0, n - 1)
+        heap.append((-d, 0, n - 1, pos))
+    while heap:
+        neg_d, lo, hi, pos = heapq.heappop(heap)
+        order.append(idx[pos])
+        deviations.append(-neg_d)
+        for a, b in ((lo, pos), (pos, hi)):
+            if b - a > 1:
+                d, p = _farthest(xs, ys, idx, a, b)
+                heapq.heappush(heap, (-d, a, b, p))
+    return order, deviations
+
+
+class LodPyramid:
+    """Simplification ranking of one plan, from which any detail level is cut."""
+
+    def __init__(self, plan_id: str, xs, ys, ts):
+        self.plan_id = plan_id
+        self.xs, self.ys, self.ts = xs, ys, ts
+        self.total = len(xs)
+        self.order, self.deviations = rdp_rank(xs, ys, collinear_keep(xs, ys)) if self.total else (array("q"), array("d"))
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held (for cache accounting)."""
+        return sum(len(a) * a.itemsize for a in (self.xs, self.ys, self.ts, self.order, self.deviations))
+
+    @property
+    def max_points(self) -> int:
+        """Point count after collinear collapse (the lossless simplification)."""
+        return len(self.order)
+
+    def levels(self) -> List[dict]:
+        """The pyramid: LOD_LEVELS below max_points plus the lossless level."""
+        counts = [c for c in LOD_LEVELS if c < self.max_points] + [self.max_points]
+        return [
+            {"level": i, "points": count, "tolerance": self._tolerance_at(count)}
+            for i, count in enumerate(counts)
+        ]
+
+    def _tolerance_at(self, count: int) -> float:
+        """Largest deviation dropped when keeping `count` points (0 when lossless)."""
+        return max(self.deviations[count:], default=0.0) if count < self.max_points else 0.0
+
+    def count_for_tolerance(self, tolerance: float) -> int:
+        for k, d in enumerate(self.deviations):
+            if d <= tolerance:
+                return k
+        return self.max_points
+
+    def select(self, points: Optional[int] = None, tolerance: Optional[float] = None) -> array:
+        """Indices (in path order) of the simplification with `points` points or `tolerance`."""
+        count = self.max_points
+        if tolerance is not None:
+            count = self.count_for_tolerance(tolerance)
+        if points is not None:
+            count = min(count, max(2, points))
+        return array("q", sorted(self.order[:count]))
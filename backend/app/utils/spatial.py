@@ -0,0 +1,97 @@
+# backend/app/utils/spatial.py
+"""
+In-memory spatial index over a plan's points for bounding-box queries.
+
+GridIndex buckets point indices into a uniform grid sized for about
+POINTS_PER_CELL points per cell and stores them cell by cell (a CSR layout:
+one sorted index array plus per-cell offsets), so a query only touches the
+cells overlapping the box.
+"""
+
+import math
+from array import array
+from typing import Tuple
+
+from app.utils.optional import numpy
+
+POINTS_PER_CELL = 64
+MAX_CELLS = 1 << 20
+
+
+class GridIndex:
+    def __init__(self, plan_id: str, xs, ys, ts):
+        self.plan_id = plan_id
+        self.xs, self.ys, self.ts = xs, ys, ts
+        self.total = n = len(xs)
+        if n == 0:
+            self.min_x = self.min_y = 0.0
+            self.cell = 1.0
+            self.nx = self.ny = 1
+            self.order = array("q")
+            self.offsets = array("q", [0, 0])
+            return
+
+        self.min_x, max_x = min(xs), max(xs)
+        self.min_y, max_y = min(ys), max(ys)
+        width = max(max_x - self.min_x, 1e-9)
+        height = max(max_y - self.min_y, 1e-9)
+        cells = min(MAX_CELLS, max(1, n // POINTS_PER_CELL))
+        self.cell = max(math.sqrt(width * height / cells), max(width, height) / MAX_CELLS)
+        self.nx = int(width / self.cell) + 1
+        self.ny = int(height / self.cell) + 1
+
+        np = numpy()
+        if np is not None:
+            x = np.asarray(xs, dtype=np.float64)
+            y = np.asarray(ys, dtype=np.float64)
+            keys = self._cell_of(x, y)
+            order = np.argsort(keys, kind="stable")
+            counts = np.bincount(keys, minlength=self.nx * self.ny)
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self.order = array("q", order.tolist())
+            self.offsets = array("q", offsets.tolist())
+        else:
+            keys = [self._cell_of(xs[i], ys[i]) for i in range(n)]
+            self.order = array("q", sorted(range(n), key=keys.__getitem__))
+            counts = [0] * (self.nx * self.ny + 1)
+            for k in keys:
+                counts[k + 1] += 1
+            for k in range(1, len(counts)):
+                counts[k] += counts[k - 1]
+            self.offsets = array("q", counts)
+
+    def _cell_of(self, x, y):
+        if not isinstance(x, (int, float)):  # numpy arrays from __init__
+            np = numpy()
+            cx = ((x - self.min_x) / self.cell).astype(np.int64)
+            cy = ((y - self.min_y) / self.cell).astype(np.int64)
+            return np.clip(cy, 0, self.ny - 1) * self.nx + np.clip(cx, 0, self.nx - 1)
+        cx = min(self.nx - 1, max(0, int((x - self.min_x) / self.cell)))
+        cy = min(self.ny - 1, max(0, int((y - self.min_y) / self.cell)))
+        return cy * self.nx + cx
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held (for cache accounting)."""
+        return sum(len(a) * a.itemsize for a in (self.xs, self.ys, self.ts, self.order, self.offsets))
+
+    def _cell_range(self, lo: float, hi: float, origin: float, size: int) -> Tuple[int, int]:
+        first = max(0, int(math.floor((lo - origin) / self.cell)))
+        last = min(size - 1, int(math.floor((hi - origin) / self.cell)))
+        return first, last
+
+    def query(self, min_x: float, min_y: float, max_x: float, max_y: float) -> array:
+        """Indices (in path order) of the points inside the closed box."""
+        found = array("q")
+        if self.total == 0 or min_x > max_x or min_y > max_y:
+            return found
+        cx0, cx1 = self._cell_range(min_x, max_x, self.min_x, self.nx)
+        cy0, cy1 = self._cell_range(min_y, max_y, self.min_y, self.ny)
+        xs, ys, order, offsets = self.xs, self.ys, self.order, self.offsets
+        for cy in range(cy0, cy1 + 1):
+            row = cy * self.nx
+            # Cells of one grid row are contiguous in `order`
+            for i in order[offsets[row + cx0]:offsets[row + cx1 + 1]]:
+                if min_x <= xs[i] <= max_x and min_y <= ys[i] <= max_y:
+                    found.append(i)
+        return array("q", sorted(found))
@@ -0,0 +1,404 @@
+# backend/benchmarks/load.py
+"""
+Load generator for the HTTP and WebSocket API.
+
+    cd backend
+    pip install -r requirements-dev.txt                      # httpx, websockets
+    python -m benchmarks.load                                # in-process app, temp DB
+    python -m benchmarks.load --url http://127.0.0.1:8000    # a running uvicorn
+    python -m benchmarks.load --users 32 --duration 60 \\
+        --mix coverage_hit=5,coverage_miss=1,trajectory_read=4,ws_play=1
+
+Virtual users (threads) loop for --duration seconds, each picking a
+scenario by weight from --mix:
+
+    coverage_hit     POST /api/coverage/ with a request planned during warm-up
+    coverage_miss    POST /api/coverage/ with a never-seen wall size
+    trajectory_read  GET /api/trajectory/{plan_id} for a warm-up plan
+    ws_play          /api/player/ws/play/{plan_id} until the plan ends
+                     or --ws-frames frames arrived
+
+Per scenario it reports throughput, p50/p95/p99 latency and errors; for
+ws_play the latency is time to first frame and the frame rate is reported
+per session and in total. DB pool saturation comes from sampling the
+db_pool_* gauges of GET /metrics every --sample-interval seconds, so it
+works the same in-process and against a server (with several workers,
+set PROMETHEUS_MULTIPROC_DIR so /metrics covers all of them).
+
+In-process runs use a temporary SQLite file, never the app database.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ORIGIN = "http://localhost:5173"  # must be in the player's ALLOWED_ORIGINS
+SCENARIOS = ("coverage_hit", "coverage_miss", "trajectory_read", "ws_play")
+DEFAULT_MIX = "coverage_hit=5,coverage_miss=1,trajectory_read=4,ws_play=1"
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(","):
+        name, sep, weight = item.strip().partition("=")
+        if not sep or name not in SCENARIOS:
+            raise ValueError(f"invalid mix entry {item!r}; scenarios: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+# ---------- Transports ----------
+
+class InProcessTransport:
+    """Drives the ASGI app through Starlette's TestClient (one shared event loop)."""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        self._client = TestClient(app)
+        self._client.__enter__()
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        response = self._client.request(method, path, json=body)
+        return response.status_code, response.content
+
+    def play(self, path: str, max_frames: int) -> tuple:
+        """Returns (frames, seconds to first frame, seconds of streaming)."""
+        frames, first, start = 0, None, time.perf_counter()
+        with self._client.websocket_connect(path, headers={"origin": ORIGIN}) as ws:
+            while frames < max_frames:
+                message = ws.receive()
+                if message["type"] != "websocket.send":
+                    break
+                if "text" in message and message["text"] and '"error"' in message["text"][:16]:
+                    raise RuntimeError(message["text"])
+                frames += 1
+                if first is None:
+                    first = time.perf_counter() - start
+        return frames, first, time.perf_counter() - start
+
+    def close(self):
+        self._client.__exit__(None, None, None)
+
+
+class HttpTransport:
+    """Talks to a running server over HTTP (httpx) and WebSocket (websockets)."""
+
+    def __init__(self, url: str, users: int):
+        import httpx
+        from websockets.sync.client import connect
+
+        self._url = url.rstrip("/")
+        self._ws_url = "ws" + self._url[len("http"):]
+        self._connect = connect
+        self._client = httpx.Client(
+            base_url=self._url,
+            timeout=120.0,
+            limits=httpx.Limits(max_connections=users + 2, max_keepalive_connections=users + 2),
+        )
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        response = self._client.request(method, path, json=body)
+        return response.status_code, response.content
+
+    def play(self, path: str, max_frames: int) -> tuple:
+        from websockets.exceptions import ConnectionClosed
+
+        frames, first, start = 0, None, time.perf_counter()
+        with self._connect(self._ws_url + path, origin=ORIGIN, max_size=None) as ws:
+            try:
+                while frames < max_frames:
+                    message = ws.recv()
+                    if isinstance(message, str) and '"error"' in message[:16]:
+                        raise RuntimeError(message)
+                    frames += 1
+                    if first is None:
+                        first = time.perf_counter() - start
+            except ConnectionClosed:
+                pass
+        return frames, first, time.perf_counter() - start
+
+    def close(self):
+        self._client.close()
+
+
+# ---------- Recording ----------
+
+class Recorder:
+    """Thread-safe per-scenario samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.frames = defaultdict(int)
+        self.session_rates = defaultdict(list)
+        self.pool_samples = defaultdict(list)  # engine -> [(checked_out, overflow)]
+
+    def ok(self, scenario: str, seconds: float):
+        with self._lock:
+            self.latencies[scenario].append(seconds)
+
+    def error(self, scenario: str):
+        with self._lock:
+            self.errors[scenario] += 1
+
+    def session(self, frames: int, first: float, seconds: float):
+        with self._lock:
+            self.latencies["ws_play"].append(first if first is not None else seconds)
+            self.frames["ws_play"] += frames
+            if seconds > 0:
+                self.session_rates["ws_play"].append(frames / seconds)
+
+    def pool(self, current: dict):
+        with self._lock:
+            for name, values in current.items():
+                self.pool_samples[name].append(tuple(values))
+
+
+def sample_pool(transport, recorder: Recorder, stop: threading.Event, interval: float):
+    """Polls the db_pool_* gauges from /metrics until stop is set."""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    while not stop.wait(interval):
+        try:
+            status, body = transport.request("GET", "/metrics")
+        except Exception:
+            continue
+        if status != 200:
+            continue
+        current = defaultdict(lambda: [0.0, 0.0])
+        for family in text_string_to_metric_families(body.decode()):
+            if family.name not in ("db_pool_checked_out", "db_pool_overflow_in_use"):
+                continue
+            slot = 0 if family.name == "db_pool_checked_out" else 1
+            for sample in family.samples:
+                current[sample.labels.get("engine", "?")][slot] += sample.value
+        recorder.pool(current)
+
+
+# ---------- Scenarios ----------
+
+def _wall_request(width: float, height: float, step: float, obstacles: int, rng: random.Random) -> dict:
+    return {
+        "wall_width": width,
+        "wall_height": height,
+        "step": step,
+        "obstacles": [
+            {
+                "x": round(rng.uniform(0, width * 0.8), 2),
+                "y": round(rng.uniform(0, height * 0.8), 2),
+                "width": round(rng.uniform(0.1, width * 0.15), 2),
+                "height": round(rng.uniform(0.1, height * 0.15), 2),
+            }
+            for _ in range(obstacles)
+        ],
+    }
+
+
+def warm_up(transport, args) -> tuple:
+    """Plans the cache-hit request set; returns (requests, plan_ids)."""
+    rng = random.Random(args.seed)
+    requests, plan_ids = [], []
+    for i in range(args.warm_plans):
+        body = _wall_request(4.0 + i, 2.0 + (i % 3), args.step, args.obstacles, rng)
+        status, content = transport.request("POST", "/api/coverage/", body)
+        if status != 200:
+            raise RuntimeError(f"warm-up plan failed with {status}: {content[:200]!r}")
+        requests.append(body)
+        plan_ids.append(json.loads(content)["plan_id"])
+    return requests, plan_ids
+
+
+def run_user(transport, recorder: Recorder, mix: dict, warm: tuple, args, user: int, deadline: float):
+    rng = random.Random(args.seed * 1000 + user)
+    requests, plan_ids = warm
+    names = [n for n in mix if mix[n] > 0]
+    weights = [mix[n] for n in names]
+    miss = 0
+
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            if scenario == "ws_play":
+                path = (
+                    f"/api/player/ws/play/{rng.choice(plan_ids)}"
+                    f"?batch={args.ws_batch}&speed={args.ws_speed}&encoding={args.ws_encoding}"
+                )
+                frames, first, seconds = transport.play(path, args.ws_frames)
+                recorder.session(frames, first, seconds)
+                continue
+
+            if scenario == "coverage_hit":
+                status, _ = transport.request("POST", "/api/coverage/", rng.choice(requests))
+            elif scenario == "coverage_miss":
+                # ✅ Unique per user and iteration, so it never hits the cache or stored plans
+                miss += 1
+                width = 3.0 + user * 0.001 + miss * 0.000001 + rng.random()
+                body = _wall_request(round(width, 6), 2.0, args.step, args.obstacles, rng)
+                status, _ = transport.request("POST", "/api/coverage/", body)
+            else:
+                status, _ = transport.request("GET", f"/api/trajectory/{rng.choice(plan_ids)}")
+        except Exception:
+            recorder.error(scenario)
+            continue
+
+        if status == 200:
+            recorder.ok(scenario, time.perf_counter() - start)
+        else:
+            recorder.error(scenario)
+
+
+# ---------- Report ----------
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    report = {"seconds": round(elapsed, 3), "scenarios": {}, "db_pool": {}}
+    for scenario in SCENARIOS:
+        latencies = sorted(recorder.latencies.get(scenario, []))
+        errors = recorder.errors.get(scenario, 0)
+        if not latencies and not errors:
+            continue
+        entry = {
+            "count": len(latencies),
+            "errors": errors,
+            "throughput": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+        if scenario == "ws_play":
+            rates = sorted(recorder.session_rates.get(scenario, []))
+            entry["frames"] = recorder.frames.get(scenario, 0)
+            entry["frames_per_second"] = round(entry["frames"] / elapsed, 2)
+            entry["session_fps_p50"] = round(percentile(rates, 50), 2)
+            entry["session_fps_p5"] = round(percentile(rates, 5), 2)
+        report["scenarios"][scenario] = entry
+
+    for name, samples in recorder.pool_samples.items():
+        checked_out = [s[0] for s in samples]
+        report["db_pool"][name] = {
+            "samples": len(samples),
+            "checked_out_max": max(checked_out),
+            "checked_out_mean": round(sum(checked_out) / len(checked_out), 2),
+            # share of samples where pool_size was exhausted and overflow was in use
+            "overflow_share": round(sum(1 for s in samples if s[1] > 0) / len(samples), 3),
+            "overflow_max": max(s[1] for s in samples),
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n{'scenario':<16}{'count':>8}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in report["scenarios"].items():
+        print(
+            f"{name:<16}{s['count']:>8}{s['errors']:>6}{s['throughput']:>9.2f}"
+            f"{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+        )
+    ws = report["scenarios"].get("ws_play")
+    if ws:
+        print(
+            f"\nws_play: {ws['frames']} frames, {ws['frames_per_second']:.1f} frames/s total, "
+            f"per session p50 {ws['session_fps_p50']:.1f} / p5 {ws['session_fps_p5']:.1f} frames/s "
+            f"(latency above = time to first frame)"
+        )
+    for name, p in report["db_pool"].items():
+        print(
+            f"db pool [{name}]: checked out max {p['checked_out_max']:.0f}, mean {p['checked_out_mean']}, "
+            f"overflow in use in {p['overflow_share']:.1%} of {p['samples']} samples (max {p['overflow_max']:.0f})"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="server base URL; omit to drive the app in-process")
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load after warm-up")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--step", type=float, default=0.05, help="planner step for generated requests")
+    parser.add_argument("--obstacles", type=int, default=3, help="obstacles per generated request")
+    parser.add_argument("--warm-plans", type=int, default=8, help="plans created for hits, reads and playback")
+    parser.add_argument("--ws-batch", type=int, default=50, help="points per playback frame")
+    parser.add_argument("--ws-speed", type=float, default=100.0, help="playback speed")
+    parser.add_argument("--ws-encoding", choices=("json", "binary"), default="json")
+    parser.add_argument("--ws-frames", type=int, default=200, help="frames per session before disconnecting")
+    parser.add_argument("--sample-interval", type=float, default=0.25, help="seconds between /metrics samples")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_out", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.url:
+        transport = HttpTransport(args.url, args.users)
+        target = args.url
+    else:
+        # ✅ Point the app at a throwaway database before it is imported
+        os.environ["DATABASE_URL"] = (
+            f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='wall-load-'), 'load.db')}"
+        )
+        from app.utils.logging import logger
+
+        logger.setLevel("WARNING")
+        transport = InProcessTransport()
+        target = "in-process"
+
+    recorder = Recorder()
+    stop = threading.Event()
+    try:
+        print(f"Warming up {args.warm_plans} plans on {target} ...")
+        warm = warm_up(transport, args)
+
+        print(f"Running {args.users} users for {args.duration:g}s, mix {mix}")
+        sampler = threading.Thread(
+            target=sample_pool, args=(transport, recorder, stop, args.sample_interval), daemon=True
+        )
+        sampler.start()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        users = [
+            threading.Thread(target=run_user, args=(transport, recorder, mix, warm, args, i, deadline))
+            for i in range(args.users)
+        ]
+        for t in users:
+            t.start()
+        for t in users:
+            t.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        sampler.join()
+    finally:
+        stop.set()
+        transport.close()
+
+    report = summarize(recorder, elapsed)
+    report.update({"target": target, "users": args.users, "mix": mix})
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if not any(s["errors"] for s in report["scenarios"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# backend/benchmarks/run.py
+"""
+Benchmarks for the planner, persistence and serialization hot paths.
+
+    cd backend
+    python -m benchmarks.run                 # run, compare with the baseline if one exists
+    python -m benchmarks.run --save          # run and store the results as the new baseline
+    python -m benchmarks.run --quick         # smaller grid of cases
+    python -m benchmarks.run --threshold 0.2 --only planner
+
+Each case is parametrized by wall size, step and obstacle count and records
+the best wall time over --repeat runs plus peak traced memory (tracemalloc,
+measured in a separate run so it does not skew the timings). Compared with
+the baseline file, a case whose time or peak memory grew by more than
+--threshold (a fraction, default 0.25) is a regression and the exit status
+is 1; changes smaller than --noise-ms / 64 KB are ignored so sub-millisecond
+cases do not flap. Baselines are machine-specific; keep them out of version control.
+
+Persistence cases use a temporary SQLite file, never the app database.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# ✅ Point the app at a throwaway database before any app module is imported
+_TMP_DIR = tempfile.mkdtemp(prefix="wall-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'bench.db')}"
+
+from app import crud, schemas  # noqa: E402
+from app.database import Base, SessionLocal, get_engine  # noqa: E402
+from app.utils.coverage_planner import frange, generate_coverage_path  # noqa: E402
+from app.utils.logging import logger  # noqa: E402
+
+logger.setLevel("WARNING")
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# (wall_width, wall_height), step, obstacle count
+FULL_CASES = [
+    (size, step, obstacles)
+    for size in ((2.0, 1.0), (10.0, 3.0), (20.0, 6.0))
+    for step in (0.25, 0.05, 0.02)
+    for obstacles in (0, 5, 25)
+]
+QUICK_CASES = [
+    ((2.0, 1.0), 0.05, 0),
+    ((10.0, 3.0), 0.05, 5),
+    ((10.0, 3.0), 0.02, 25),
+]
+# Absolute growth below this is treated as noise whatever the ratio
+NOISE_BYTES = 64 * 1024
+# Persistence and serialization cost scales with points; skip cases above this
+MAX_IO_POINTS = 400_000
+
+
+def _obstacles(count: int, width: float, height: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "x": rng.uniform(0, width * 0.9),
+            "y": rng.uniform(0, height * 0.9),
+            "width": rng.uniform(0.05, width * 0.1),
+            "height": rng.uniform(0.05, height * 0.2),
+        }
+        for _ in range(count)
+    ]
+
+
+def _measure(fn, setup, repeat: int) -> dict:
+    """Best time over `repeat` runs, then peak traced memory of one more run."""
+    best = None
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    fn(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_bytes": peak}
+
+
+def _fresh_db():
+    Base.metadata.drop_all(bind=get_engine())
+    Base.metadata.create_all(bind=get_engine())
+
+
+def bench_planner(width, height, step, obstacles, repeat):
+    return _measure(
+        lambda _: generate_coverage_path(width, height, obstacles, step),
+        lambda: None,
+        repeat,
+    )
+
+
+def bench_frange(width, height, step, obstacles, repeat):
+    rows = int(height / step) + 1
+    return _measure(
+        lambda _: [sum(1 for _ in frange(0.0, width, step)) for _ in range(rows)],
+        lambda: None,
+        repeat,
+    )
+
+
+def bench_create_trajectories(points, repeat):
+    def setup():
+        _fresh_db()
+        return SessionLocal()
+
+    def run(db):
+        try:
+            crud.create_trajectories(db, "bench-plan", points)
+        finally:
+            db.close()
+
+    return _measure(run, setup, repeat)
+
+
+def bench_get_trajectories(points, repeat):
+    _fresh_db()
+    db = SessionLocal()
+    try:
+        crud.create_trajectories(db, "bench-plan", points)
+    finally:
+        db.close()
+
+    def run(db):
+        try:
+            crud.get_trajectories_by_plan(db, "bench-plan")
+        finally:
+            db.close()
+
+    return _measure(run, SessionLocal, repeat)
+
+
+def bench_json_response(result, repeat):
+    return _measure(
+        lambda _: schemas.CoverageResponse(**result).model_dump_json(),
+        lambda: None,
+        repeat,
+    )
+
+
+BENCHMARKS = ("planner", "frange", "create_trajectories", "get_trajectories", "json_response")
+
+
+def run_cases(cases, only, repeat) -> dict:
+    results = {}
+    for (width, height), step, count in cases:
+        obstacles = _obstacles(count, width, height)
+        label = f"{width:g}x{height:g}/step={step:g}/obstacles={count}"
+        result = generate_coverage_path(width, height, obstacles, step)
+        n = len(result["points"])
+        io_ok = n <= MAX_IO_POINTS
+
+        for name in BENCHMARKS:
+            if only and name not in only:
+                continue
+            if name in ("create_trajectories", "get_trajectories", "json_response") and not io_ok:
+                continue
+            if name == "planner":
+                measured = bench_planner(width, height, step, obstacles, repeat)
+            elif name == "frange":
+                measured = bench_frange(width, height, step, obstacles, repeat)
+            elif name == "create_trajectories":
+                measured = bench_create_trajectories(result["points"], repeat)
+            elif name == "get_trajectories":
+                measured = bench_get_trajectories(result["points"], repeat)
+            else:
+                measured = bench_json_response(result, repeat)
+            measured["points"] = n
+            key = f"{name}:{label}"
+            results[key] = measured
+            print(f"  {key:<62} {measured['seconds'] * 1000:10.2f} ms {measured['peak_bytes'] / 1e6:9.2f} MB")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, noise_seconds: float) -> list:
+    """Returns (key, metric, old, new) for every regression beyond threshold."""
+    regressions = []
+    noise = {"seconds": noise_seconds, "peak_bytes": NOISE_BYTES}
+    for key, new in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if new[metric] - old[metric] <= noise[metric]:
+                continue
+            if new[metric] > old[metric] * (1 + threshold):
+                regressions.append((key, metric, old[metric], new[metric]))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file (default: benchmarks/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed growth as a fraction (default 0.25)")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="ignore time growth below this (default 2 ms)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the best is kept")
+    parser.add_argument("--quick", action="store_true", help="run the small case grid")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="benchmarks to run")
+    args = parser.parse_args(argv)
+    if args.threshold < 0:
+        parser.error("--threshold must be >= 0")
+
+    cases = QUICK_CASES if args.quick else FULL_CASES
+    print(f"Running {len(cases)} cases (repeat={args.repeat}) on Python {platform.python_version()}")
+    results = run_cases(cases, set(args.only or ()), max(1, args.repeat))
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save to create one.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold, args.noise_ms / 1000)
+    if not regressions:
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+        return 0
+    print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+    for key, metric, old, new in regressions:
+        print(f"  {key} {metric}: {old} → {new} ({new / old - 1:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())